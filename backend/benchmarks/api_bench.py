@@ -0,0 +1,247 @@
+"""Time the API endpoints on synthetic cohorts of several sizes.
+
+Each scale runs in a fresh interpreter with its own database, so caches and
+the cohort snapshot start cold every time. Results are written as JSON and
+can be compared with an earlier run.
+
+    python -m benchmarks.api_bench --scales 100x4,1000x6 --repeat 5 --json after.json
+    python -m benchmarks.api_bench --mongo-url mongodb://localhost:27017 --compare before.json
+
+Without --mongo-url the API runs against mongomock-motor in memory, which is
+much slower than mongod - compare runs on the same backend only.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DASHBOARD_ENDPOINTS = [
+    "/dashboard/statistics",
+    "/dashboard/high-risk",
+    "/dashboard/students",
+    "/dashboard/students?sort_by=predicted_score&descending=true",
+    "/dashboard/percentiles",
+    "/dashboard/model-metrics",
+    "/dashboard/overview"
+]
+
+
+def parse_scale(text):
+    """'1000x6' -> (1000 students, 6 courses)"""
+    students, _, courses = text.lower().partition("x")
+    return int(students), int(courses or 4)
+
+
+def summarize(samples):
+    """Latency statistics in milliseconds plus status and size information"""
+    timings = sorted(s["seconds"] * 1000 for s in samples)
+
+    def percentile(p):
+        return timings[min(len(timings) - 1, int(round(p / 100 * (len(timings) - 1))))]
+
+    return {
+        "runs": len(timings),
+        "min_ms": round(timings[0], 3),
+        "median_ms": round(percentile(50), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "p95_ms": round(percentile(95), 3),
+        "max_ms": round(timings[-1], 3),
+        "response_bytes": samples[-1]["bytes"],
+        "errors": sum(1 for s in samples if s["status"] >= 400)
+    }
+
+
+async def timed(http, method, path, **kwargs):
+    started = time.perf_counter()
+    response = await http.request(method, path, **kwargs)
+    return {"seconds": time.perf_counter() - started, "status": response.status_code, "bytes": len(response.content)}
+
+
+async def run_scale(args):
+    """Load one cohort and time every endpoint against it (runs in the child process)"""
+    from benchmarks import environment
+    from benchmarks.cohort import generate_cohort, load_cohort
+
+    database = environment.configure(args.mongo_url, args.db)
+    students, courses = parse_scale(args.scale)
+    cohort = generate_cohort(
+        students, courses, args.enrollment_density,
+        args.assessment_density, args.attendance_density, args.seed
+    )
+    started = time.perf_counter()
+    documents = await load_cohort(database, cohort)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    app = await environment.start_app()
+    startup_seconds = time.perf_counter() - started
+
+    rnd = random.Random(args.seed)
+    student_ids = [str(s["_id"]) for s in cohort["students"]]
+    endpoints = {}
+    async with environment.client(app, timeout=None) as http:
+        headers = await environment.login(http)
+
+        async def measure(name, method, path_for, repeat=args.repeat, warmup=args.warmup, **kwargs):
+            for _ in range(warmup):
+                await http.request(method, path_for(), headers=headers, **kwargs)
+            endpoints[name] = summarize([
+                await timed(http, method, path_for(), headers=headers, **kwargs) for _ in range(repeat)
+            ])
+
+        login_form = {"username": os.getenv("ADMIN_USERNAME", "admin"), "password": os.getenv("ADMIN_PASSWORD", "Admin@123")}
+        await measure("POST /auth/token", "POST", lambda: "/auth/token", data=login_form)
+        await measure("GET /auth/verify", "GET", lambda: "/auth/verify")
+
+        # Distinct students before generate-all, so every call computes a new prediction
+        sample = rnd.sample(student_ids, min(len(student_ids), args.repeat))
+        await measure("POST /prediction/generate/{id}", "POST",
+                      lambda: f"/prediction/generate/{sample.pop()}", repeat=len(sample), warmup=0)
+        await measure("POST /prediction/generate-all (cold)", "POST", lambda: "/prediction/generate-all",
+                      repeat=1, warmup=0)
+        # Inputs are unchanged now, so this measures the skip path
+        await measure("POST /prediction/generate-all (unchanged)", "POST", lambda: "/prediction/generate-all",
+                      repeat=max(1, args.repeat // 2), warmup=0)
+
+        for path in DASHBOARD_ENDPOINTS:
+            await measure(f"GET {path}", "GET", lambda path=path: path)
+
+    await environment.stop_app()
+    return {
+        "students": students,
+        "courses": courses,
+        "densities": {
+            "enrollment": args.enrollment_density,
+            "assessment": args.assessment_density,
+            "attendance": args.attendance_density
+        },
+        "documents": documents,
+        "load_seconds": round(load_seconds, 3),
+        "startup_seconds": round(startup_seconds, 3),
+        "endpoints": endpoints
+    }
+
+
+def child_command(args, scale, output):
+    command = [
+        sys.executable, "-m", "benchmarks.api_bench", "--child", "--scale", scale, "--output", output,
+        "--repeat", str(args.repeat), "--warmup", str(args.warmup), "--seed", str(args.seed),
+        "--enrollment-density", str(args.enrollment_density),
+        "--assessment-density", str(args.assessment_density),
+        "--attendance-density", str(args.attendance_density),
+        "--db", args.db
+    ]
+    if args.mongo_url:
+        command += ["--mongo-url", args.mongo_url]
+    return command
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(report, baseline):
+    """Print the change in median latency against an earlier report"""
+    previous = {(s["students"], s["courses"]): s for s in baseline["scales"]}
+    print(f"\n📊 Compared with {baseline['meta'].get('git_commit')} ({baseline['meta'].get('backend')})")
+    for scale in report["scales"]:
+        old = previous.get((scale["students"], scale["courses"]))
+        if old is None:
+            continue
+        print(f"  {scale['students']} students x {scale['courses']} courses")
+        for name, stats in scale["endpoints"].items():
+            if name not in old["endpoints"]:
+                continue
+            before, after = old["endpoints"][name]["median_ms"], stats["median_ms"]
+            change = (after - before) / before * 100 if before else 0.0
+            print(f"    {name:<70} {before:9.2f} -> {after:9.2f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="100x4,500x6,2000x6", help="comma separated STUDENTSxCOURSES")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per endpoint")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs per endpoint")
+    parser.add_argument("--enrollment-density", type=float, default=1.0)
+    parser.add_argument("--assessment-density", type=float, default=0.9)
+    parser.add_argument("--attendance-density", type=float, default=0.9)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", help="local mongod to use instead of mongomock-motor")
+    parser.add_argument("--db", default="academic_performance_bench")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="earlier results file to compare with")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own output")
+    # Internal: run a single scale and write its result to --output
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import asyncio
+        result = asyncio.run(run_scale(args))
+        with open(args.output, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    from benchmarks.environment import backend_name
+    report = {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "backend": backend_name(args.mongo_url),
+            # Dashboard timings differ completely with the in-memory snapshot
+            "cohort_snapshot": os.getenv("COHORT_SNAPSHOT_ENABLED", "False").lower() == "true",
+            "repeat": args.repeat,
+            "seed": args.seed
+        },
+        "scales": []
+    }
+    for scale in args.scales.split(","):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            output = f.name
+        print(f"⏱️ {scale} ...", flush=True)
+        completed = subprocess.run(
+            child_command(args, scale, output), cwd=BACKEND_DIR,
+            stdout=None if args.verbose else subprocess.DEVNULL
+        )
+        if completed.returncode != 0:
+            print(f"❌ Scale {scale} failed")
+            return 1
+        with open(output) as f:
+            result = json.load(f)
+        os.unlink(output)
+        report["scales"].append(result)
+
+        print(f"  {result['students']} students x {result['courses']} courses "
+              f"(loaded in {result['load_seconds']:.2f}s, startup {result['startup_seconds']:.2f}s)")
+        for name, stats in result["endpoints"].items():
+            errors = f"  ⚠️ {stats['errors']} errors" if stats["errors"] else ""
+            print(f"    {name:<70} median {stats['median_ms']:9.2f} ms  p95 {stats['p95_ms']:9.2f} ms{errors}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Results written to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
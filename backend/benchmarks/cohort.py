@@ -0,0 +1,127 @@
+"""Deterministic synthetic cohorts for benchmarks.
+
+The same arguments always produce the same documents, including their
+ObjectIds, so timings from different runs describe the same data.
+
+    python -m benchmarks.cohort --students 1000 --courses 6 --mongo-url mongodb://localhost:27017
+"""
+import random
+import struct
+import argparse
+from bson import ObjectId
+
+DEPARTMENTS = ["Computer Science", "Mathematics", "Physics", "Chemistry", "Biology", "Economics"]
+LEVELS = [100, 200, 300, 400]
+# Fixed ObjectId timestamp so ids are identical across runs but still increase
+ID_EPOCH = 1700000000
+INSERT_BATCH = 5000
+
+
+class IdSequence:
+    """Increasing ObjectIds built from a fixed timestamp and a counter"""
+
+    def __init__(self, start=0):
+        self.counter = start
+
+    def next(self):
+        self.counter += 1
+        return ObjectId(struct.pack(">IQ", ID_EPOCH, self.counter))
+
+
+def generate_cohort(students=100, courses=4, enrollment_density=1.0,
+                    assessment_density=1.0, attendance_density=1.0, seed=42):
+    """Build the documents of a synthetic cohort.
+
+    Each student is enrolled in a course with probability ``enrollment_density``
+    and has an assessment / attendance record for an enrolled course with
+    probability ``assessment_density`` / ``attendance_density``. Scores follow a
+    per-student ability, so the risk levels are spread realistically.
+    """
+    rnd = random.Random(seed)
+    ids = IdSequence()
+    cohort = {"students": [], "courses": [], "enrollments": [], "assessments": [], "attendance": []}
+
+    for i in range(courses):
+        cohort["courses"].append({
+            "_id": ids.next(),
+            "course_code": f"BEN{100 + i}",
+            "course_title": f"Benchmark Course {i + 1}",
+            "credit_unit": rnd.choice([2, 3, 4])
+        })
+
+    for i in range(students):
+        student = {
+            "_id": ids.next(),
+            "name": f"Student {i + 1:06d}",
+            "matric_no": f"BEN/{i + 1:06d}",
+            "department": rnd.choice(DEPARTMENTS),
+            "level": rnd.choice(LEVELS)
+        }
+        cohort["students"].append(student)
+        student_id = str(student["_id"])
+        ability = rnd.betavariate(2.5, 2)
+
+        for course in cohort["courses"]:
+            if rnd.random() >= enrollment_density:
+                continue
+            course_id = str(course["_id"])
+            cohort["enrollments"].append({
+                "_id": ids.next(), "student_id": student_id, "course_id": course_id, "semester": "First"
+            })
+            if rnd.random() < assessment_density:
+                cohort["assessments"].append({
+                    "_id": ids.next(),
+                    "student_id": student_id,
+                    "course_id": course_id,
+                    "test_score": round(min(30, max(0, rnd.gauss(ability * 30, 4))), 1),
+                    "assignment_score": round(min(20, max(0, rnd.gauss(ability * 20, 3))), 1),
+                    "exam_score": round(min(50, max(0, rnd.gauss(ability * 50, 7))), 1)
+                })
+            if rnd.random() < attendance_density:
+                cohort["attendance"].append({
+                    "_id": ids.next(),
+                    "student_id": student_id,
+                    "course_id": course_id,
+                    "attendance_percentage": round(min(100, max(0, rnd.gauss(50 + ability * 50, 10))), 1)
+                })
+    return cohort
+
+
+async def load_cohort(database, cohort):
+    """Replace the cohort collections of ``database`` with the generated documents"""
+    for name in ["students", "courses", "enrollments", "assessments", "attendance", "predictions"]:
+        await database[name].delete_many({})
+    for name, documents in cohort.items():
+        for start in range(0, len(documents), INSERT_BATCH):
+            await database[name].insert_many(documents[start:start + INSERT_BATCH])
+    # The data changed behind the API's back, so cached ETags must not match any more
+    from services.data_version import data_versions
+    await data_versions.bump("students", "courses", "enrollments", "assessments", "attendance", "predictions")
+    return {name: len(documents) for name, documents in cohort.items()}
+
+
+def main():
+    import asyncio
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--enrollment-density", type=float, default=1.0)
+    parser.add_argument("--assessment-density", type=float, default=1.0)
+    parser.add_argument("--attendance-density", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db", default="academic_performance_bench")
+    args = parser.parse_args()
+
+    cohort = generate_cohort(
+        args.students, args.courses, args.enrollment_density,
+        args.assessment_density, args.attendance_density, args.seed
+    )
+    counts = asyncio.run(load_cohort(AsyncIOMotorClient(args.mongo_url)[args.db], cohort))
+    print(f"✅ Loaded {counts} into {args.db}")
+
+
+if __name__ == "__main__":
+    main()
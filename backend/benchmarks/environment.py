@@ -0,0 +1,143 @@
+"""Run the API in-process for benchmarks.
+
+``configure`` must be called before ``main`` (or any route module) is imported:
+it points the collections at a local mongod or, without a URL, at an
+in-memory mongomock-motor database, and keeps model artifacts in a temporary
+directory so benchmarks never touch the ones in ``ml/``.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+DEFAULT_BENCH_DB = "academic_performance_bench"
+COLLECTIONS = {
+    "student_collection": "students",
+    "course_collection": "courses",
+    "enrollment_collection": "enrollments",
+    "assessment_collection": "assessments",
+    "attendance_collection": "attendance",
+    "prediction_collection": "predictions"
+}
+
+
+def configure(mongo_url=None, db=DEFAULT_BENCH_DB):
+    """Select the database backend and return the database object"""
+    if "bench" not in db:
+        # Benchmarks delete and reload collections, so never run them on a real database
+        raise SystemExit(f"Refusing to benchmark against '{db}': the database name must contain 'bench'")
+
+    artifacts = tempfile.mkdtemp(prefix="bench-model-")
+    for name, filename in [("MODEL_PATH", "model.joblib"), ("SCALER_PATH", "scaler.joblib"),
+                           ("COEFFICIENTS_PATH", "coefficients.json")]:
+        os.environ[name] = os.path.join(artifacts, filename)
+    os.environ["MONGODB_DB"] = db
+    if mongo_url:
+        os.environ["MONGODB_URL"] = mongo_url
+
+    import database
+    if not mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit(
+                "mongomock-motor is not installed: pip install -r benchmarks/requirements.txt, "
+                "or pass --mongo-url to use a local mongod"
+            )
+        database.client = AsyncMongoMockClient()
+        database.database = database.client[db]
+        for attribute, name in COLLECTIONS.items():
+            setattr(database, attribute, database.database.get_collection(name))
+    return database.database
+
+
+# mongomock methods and the MongoDB command each would send to a real server
+MONGOMOCK_COMMANDS = {
+    "find": "find", "find_one": "find", "aggregate": "aggregate", "count_documents": "aggregate",
+    "estimated_document_count": "count", "distinct": "distinct",
+    "insert_one": "insert", "insert_many": "insert",
+    "update_one": "update", "update_many": "update", "replace_one": "update",
+    "delete_one": "delete", "delete_many": "delete", "bulk_write": "bulkWrite",
+    "find_one_and_update": "findAndModify", "find_one_and_replace": "findAndModify",
+    "find_one_and_delete": "findAndModify", "create_index": "createIndexes"
+}
+
+
+def instrument_mongomock():
+    """Report mongomock collection calls to the command listener, as pymongo does for mongod.
+
+    mongomock never talks to a server, so without this services.db_monitor
+    trackers see no commands. Nested calls (find_one calls find) count once.
+    """
+    import time
+    from functools import wraps
+    from mongomock.collection import Collection
+    from services.db_monitor import command_listener
+
+    class Event:
+        def __init__(self, command_name, seconds):
+            self.command_name = command_name
+            self.duration_micros = int(seconds * 1e6)
+
+    depth = [0]
+
+    def counted(method, command_name):
+        @wraps(method)
+        def wrapper(*args, **kwargs):
+            depth[0] += 1
+            started = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+                if depth[0] == 0:
+                    command_listener.succeeded(Event(command_name, time.perf_counter() - started))
+        wrapper.counted = True
+        return wrapper
+
+    for name, command_name in MONGOMOCK_COMMANDS.items():
+        method = getattr(Collection, name, None)
+        if method is not None and not getattr(method, "counted", False):
+            setattr(Collection, name, counted(method, command_name))
+
+
+def backend_name(mongo_url=None):
+    return mongo_url.split("@")[-1] if mongo_url else "mongomock-motor"
+
+
+async def start_app():
+    """Run the startup tasks and wait until the API reports ready"""
+    import main
+    await main.startup_event()
+    while not main.startup_state["ready"]:
+        await asyncio.sleep(0.01)
+    return main.app
+
+
+async def stop_app():
+    import main
+    for task in list(main.background_tasks):
+        task.cancel()
+    await main.shutdown_event()
+
+
+def client(app=None, base_url=None, **kwargs):
+    """HTTP client for the in-process app, or for a server at ``base_url``"""
+    import httpx
+    if base_url:
+        return httpx.AsyncClient(base_url=base_url, **kwargs)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", **kwargs)
+
+
+async def login(http, username=None, password=None):
+    """Log in and return the Authorization header"""
+    response = await http.post("/auth/token", data={
+        "username": username or os.getenv("ADMIN_USERNAME", "admin"),
+        "password": password or os.getenv("ADMIN_PASSWORD", "Admin@123")
+    })
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
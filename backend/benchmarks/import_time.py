@@ -0,0 +1,77 @@
+"""Measure how long importing the API takes and which packages dominate it.
+
+Runs ``python -X importtime -c "import main"`` in a fresh interpreter and
+sums the self import time per top-level package.
+
+    python benchmarks/import_time.py [--top 15] [--module main] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Packages that should stay out of the API's import path
+LAZY_PACKAGES = ["sklearn", "pandas", "joblib", "scipy"]
+
+
+def measure(module="main"):
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True
+    )
+    wall_seconds = time.perf_counter() - started
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+
+    packages = {}
+    imported = set()
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        package = name.strip().split(".")[0]
+        imported.add(package)
+        # Self time never double counts nested imports, so it can be summed per package
+        packages[package] = packages.get(package, 0) + int(self_us)
+
+    return {
+        "module": module,
+        "wall_seconds": round(wall_seconds, 4),
+        "import_seconds": round(sum(packages.values()) / 1e6, 4),
+        "packages": {
+            name: round(us / 1e6, 4)
+            for name, us in sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        },
+        "eager_heavy_packages": [p for p in LAZY_PACKAGES if p in imported]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="module to import (default: main)")
+    parser.add_argument("--top", type=int, default=15, help="number of packages to list")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = measure(args.module)
+    print(f"⏱️ import {report['module']}: {report['import_seconds']:.3f}s "
+          f"(interpreter wall time {report['wall_seconds']:.3f}s)")
+    for name, seconds in list(report["packages"].items())[:args.top]:
+        print(f"  {name:<24} {seconds * 1000:8.1f} ms")
+    if report["eager_heavy_packages"]:
+        print(f"⚠️ Imported eagerly: {', '.join(report['eager_heavy_packages'])}")
+    else:
+        print("✅ ML stack is not imported at startup")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
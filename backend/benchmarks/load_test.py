@@ -0,0 +1,214 @@
+"""Concurrent load test with a realistic mix of dashboard users.
+
+Each virtual user logs in, then loops: verify the token, load the dashboard
+(the statistics, model-metrics and students calls fired in parallel, as
+dashboard.js does), sometimes record an assessment or attendance as a
+lecturer and, rarely, run generate-all. Users log in again every
+--session-length iterations.
+
+    python -m benchmarks.load_test --users 50 --duration 30
+    python -m benchmarks.load_test --base-url http://localhost:8000 --users 200 --json load.json
+
+Without --base-url the app runs in-process on a synthetic cohort (see
+benchmarks/cohort.py), using --mongo-url or mongomock-motor.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+
+DASHBOARD_CALLS = ["/dashboard/statistics", "/dashboard/model-metrics", "/dashboard/students"]
+USERS = [
+    (os.getenv("ADMIN_USERNAME", "admin"), os.getenv("ADMIN_PASSWORD", "Admin@123")),
+    (os.getenv("LECTURER_USERNAME", "lecturer"), os.getenv("LECTURER_PASSWORD", "Lecturer@123"))
+]
+
+
+def quiet(enabled=True):
+    """Discard the in-process API's own print output"""
+    if not enabled:
+        return contextlib.nullcontext()
+    return contextlib.redirect_stdout(open(os.devnull, "w"))
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))]
+
+
+class Recorder:
+    """Latency samples per route, keyed by the route template"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self.stopped = None
+
+    async def request(self, http, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await http.request(method, path, **kwargs)
+            failed = response.status_code >= 400
+        except Exception:
+            response, failed = None, True
+        self.samples.setdefault(route, []).append(time.perf_counter() - started)
+        if failed:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        return response
+
+    def report(self):
+        elapsed = (self.stopped or time.perf_counter()) - self.started
+        routes = {}
+        for route, samples in sorted(self.samples.items()):
+            timings = sorted(s * 1000 for s in samples)
+            routes[route] = {
+                "requests": len(timings),
+                "errors": self.errors.get(route, 0),
+                "throughput_rps": round(len(timings) / elapsed, 2),
+                "p50_ms": round(percentile(timings, 50), 2),
+                "p95_ms": round(percentile(timings, 95), 2),
+                "p99_ms": round(percentile(timings, 99), 2),
+                "max_ms": round(timings[-1], 2)
+            }
+        total = sum(r["requests"] for r in routes.values())
+        return {
+            "duration_seconds": round(elapsed, 2),
+            "requests": total,
+            "errors": sum(r["errors"] for r in routes.values()),
+            "throughput_rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "routes": routes
+        }
+
+
+async def virtual_user(http, recorder, args, rnd, student_ids, course_ids, deadline):
+    headers = None
+    iteration = 0
+    while time.perf_counter() < deadline:
+        if headers is None or iteration % args.session_length == 0:
+            username, password = rnd.choice(USERS)
+            response = await recorder.request(http, "POST /auth/token", "POST", "/auth/token",
+                                              data={"username": username, "password": password})
+            if response is None or response.status_code != 200:
+                await asyncio.sleep(1)
+                continue
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        iteration += 1
+
+        await recorder.request(http, "GET /auth/verify", "GET", "/auth/verify", headers=headers)
+        await asyncio.gather(*[
+            recorder.request(http, f"GET {path}", "GET", path, headers=headers) for path in DASHBOARD_CALLS
+        ])
+
+        if student_ids and course_ids and rnd.random() < args.write_ratio:
+            student_id, course_id = rnd.choice(student_ids), rnd.choice(course_ids)
+            if rnd.random() < 0.5:
+                await recorder.request(http, "POST /lecturer/assessments/", "POST", "/lecturer/assessments/",
+                                       headers=headers, json={
+                                           "student_id": student_id, "course_id": course_id,
+                                           "test_score": round(rnd.uniform(5, 30), 1),
+                                           "assignment_score": round(rnd.uniform(3, 20), 1),
+                                           "exam_score": round(rnd.uniform(10, 50), 1)
+                                       })
+            else:
+                await recorder.request(http, "POST /lecturer/attendance/", "POST", "/lecturer/attendance/",
+                                       headers=headers, json={
+                                           "student_id": student_id, "course_id": course_id,
+                                           "attendance_percentage": round(rnd.uniform(30, 100), 1)
+                                       })
+
+        if rnd.random() < args.generate_all_ratio:
+            await recorder.request(http, "POST /prediction/generate-all", "POST", "/prediction/generate-all",
+                                   headers=headers)
+
+        # Exponential think time between page loads
+        await asyncio.sleep(rnd.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+
+
+async def run(args):
+    from benchmarks import environment
+
+    app = None
+    if not args.base_url:
+        from benchmarks.cohort import generate_cohort, load_cohort
+        database = environment.configure(args.mongo_url, args.db)
+        await load_cohort(database, generate_cohort(args.students, args.courses, seed=args.seed))
+        with quiet(not args.verbose):
+            app = await environment.start_app()
+
+    kwargs = {"timeout": args.timeout}
+    if args.base_url:
+        import httpx
+        # One connection per in-flight dashboard call, so the client is not the bottleneck
+        kwargs["limits"] = httpx.Limits(max_connections=args.users * len(DASHBOARD_CALLS))
+
+    async with environment.client(app, args.base_url, **kwargs) as http:
+        # Ids for the lecturer writes
+        headers = await environment.login(http)
+        student_ids = [s["id"] for s in (await http.get("/lecturer/students/", headers=headers)).json()]
+        course_ids = [c["id"] for c in (await http.get("/lecturer/courses/", headers=headers)).json()]
+
+        recorder = Recorder()
+        deadline = time.perf_counter() + args.duration
+        with quiet(not (args.verbose or args.base_url)):
+            await asyncio.gather(*[
+                virtual_user(http, recorder, args, random.Random(args.seed + i), student_ids, course_ids, deadline)
+                for i in range(args.users)
+            ])
+        recorder.stopped = time.perf_counter()
+
+    if app is not None:
+        with quiet(not args.verbose):
+            await environment.stop_app()
+
+    report = recorder.report()
+    report["config"] = {
+        "users": args.users,
+        "target": args.base_url or environment.backend_name(args.mongo_url),
+        "students": None if args.base_url else args.students,
+        "think_time": args.think_time,
+        "write_ratio": args.write_ratio,
+        "generate_all_ratio": args.generate_all_ratio
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=20, help="seconds to run")
+    parser.add_argument("--think-time", type=float, default=1.0, help="mean seconds between page loads")
+    parser.add_argument("--session-length", type=int, default=20, help="page loads per login")
+    parser.add_argument("--write-ratio", type=float, default=0.2, help="share of page loads with a lecturer write")
+    parser.add_argument("--generate-all-ratio", type=float, default=0.005, help="share of page loads running generate-all")
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--base-url", help="test a running server instead of the in-process app")
+    parser.add_argument("--students", type=int, default=500, help="cohort size for the in-process app")
+    parser.add_argument("--courses", type=int, default=6)
+    parser.add_argument("--mongo-url", help="local mongod for the in-process app (default: mongomock-motor)")
+    parser.add_argument("--db", default="academic_performance_bench")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own output")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"🚦 {report['config']['users']} users for {report['duration_seconds']}s: "
+          f"{report['requests']} requests, {report['throughput_rps']} req/s, {report['errors']} errors")
+    print(f"  {'route':<36} {'reqs':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for route, stats in report["routes"].items():
+        print(f"  {route:<36} {stats['requests']:>7} {stats['throughput_rps']:>8} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['errors']:>7}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["requests"] == 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,202 @@
+"""Query-count and latency budgets per endpoint.
+
+Loads the same synthetic cohort at two or more sizes, calls each endpoint
+and counts the MongoDB commands it issues (through services.db_monitor).
+A check fails when an endpoint issues more commands than its budget, when
+its command count grows with the number of students (an N+1 pattern), or
+when its median latency at the largest size exceeds its latency budget
+(if it has one).
+Exits non-zero on any failure, so it can gate CI:
+
+    python -m benchmarks.query_budget
+    python -m benchmarks.query_budget --scales 100,400 --latency-factor 2 --json budgets.json
+    python -m benchmarks.query_budget --mongo-url mongodb://localhost:27017
+
+tests/test_query_budget.py runs the query-count checks under pytest.
+
+The cohort snapshot is disabled so the MongoDB code paths are the ones measured.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+# Commands that continue or clean up an earlier one rather than issue a new query
+BOOKKEEPING_COMMANDS = {"getMore", "killCursors", "endSessions"}
+
+
+class Budget:
+    def __init__(self, name, method, path, queries, ms, warmup=True, setup=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.queries = queries
+        self.ms = ms
+        self.warmup = warmup
+        self.setup = setup
+
+
+async def _touch_student(database, cohort):
+    # New attendance so generate/{id} has to score the student again
+    student_id = str(cohort["students"][0]["_id"])
+    course_id = str(cohort["courses"][0]["_id"])
+    await database["attendance"].insert_one(
+        {"student_id": student_id, "course_id": course_id, "attendance_percentage": 42.0}
+    )
+
+
+async def _touch_course(database, cohort):
+    # As if an assessment of the course was recorded, so its cached analytics are stale
+    from services.data_version import data_versions
+    from services.course_analytics import course_data
+    await data_versions.bump("assessments", course_data("assessments", str(cohort["courses"][0]["_id"])))
+
+
+# Latency budgets are for mongomock-motor at the default scales; mongod is far faster
+BUDGETS = [
+    # Changed predictions are published as events: a sequence number and an insert per batch
+    Budget("generate-all (cold)", "POST", "/prediction/generate-all", queries=11, ms=600, warmup=False),
+    Budget("generate-all (unchanged)", "POST", "/prediction/generate-all", queries=6, ms=300),
+    Budget("generate/{student_id} (changed)", "POST", "/prediction/generate/{student_id}", queries=10, ms=60,
+           warmup=False, setup=_touch_student),
+    Budget("generate/{student_id} (unchanged)", "POST", "/prediction/generate/{student_id}", queries=4, ms=50),
+    Budget("student prediction", "GET", "/prediction/student/{student_id}", queries=1, ms=20),
+    Budget("all predictions", "GET", "/prediction/all", queries=1, ms=100),
+    Budget("dashboard statistics", "GET", "/dashboard/statistics", queries=1, ms=30),
+    Budget("dashboard high-risk", "GET", "/dashboard/high-risk", queries=4, ms=400),
+    Budget("dashboard students", "GET", "/dashboard/students", queries=4, ms=800),
+    Budget("dashboard model-metrics", "GET", "/dashboard/model-metrics", queries=0, ms=20),
+    Budget("dashboard overview", "GET", "/dashboard/overview", queries=5, ms=300),
+    # No latency budget: mongomock runs $lookup as a nested scan, mongod uses the student_id indexes
+    Budget("course summaries", "GET", "/dashboard/courses", queries=2, ms=None, warmup=False, setup=_touch_course),
+    Budget("course summary (changed)", "GET", "/dashboard/courses/{course_id}", queries=2, ms=None,
+           warmup=False, setup=_touch_course),
+    Budget("course summary (cached)", "GET", "/dashboard/courses/{course_id}", queries=1, ms=20),
+    Budget("lecturer students", "GET", "/lecturer/students/", queries=1, ms=50),
+    Budget("admin students", "GET", "/admin/students/", queries=1, ms=50),
+    Budget("verify token", "GET", "/auth/verify", queries=0, ms=20),
+    Budget("current user", "GET", "/auth/me", queries=0, ms=20)
+]
+
+
+def count_queries(stats):
+    return sum(e["count"] for name, e in stats.by_name.items() if name not in BOOKKEEPING_COMMANDS)
+
+
+async def measure(args):
+    # The budgets cover the MongoDB code paths, not the in-memory snapshot
+    os.environ["COHORT_SNAPSHOT_ENABLED"] = "false"
+    # mongomock-motor blocks the event loop, which admission control would treat as overload
+    os.environ["ADMISSION_MAX_LAG_SECONDS"] = "inf"
+    from benchmarks import environment
+    from benchmarks.cohort import generate_cohort, load_cohort
+    from services.db_monitor import track_commands
+
+    database = environment.configure(args.mongo_url, args.db)
+    if not args.mongo_url:
+        environment.instrument_mongomock()
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w")) if not args.verbose else contextlib.nullcontext()
+
+    results = {budget.name: {} for budget in BUDGETS}
+    with quiet:
+        app = await environment.start_app()
+        async with environment.client(app, timeout=None) as http:
+            headers = await environment.login(http)
+            for students in args.scales:
+                cohort = generate_cohort(students, args.courses, seed=args.seed)
+                await load_cohort(database, cohort)
+                student_id = str(cohort["students"][0]["_id"])
+
+                for budget in BUDGETS:
+                    path = budget.path.format(student_id=student_id, course_id=str(cohort["courses"][0]["_id"]))
+                    if budget.setup:
+                        await budget.setup(database, cohort)
+                    if budget.warmup:
+                        await http.request(budget.method, path, headers=headers)
+                    runs = []
+                    for _ in range(args.repeat if budget.warmup else 1):
+                        with track_commands() as stats:
+                            started = time.perf_counter()
+                            response = await http.request(budget.method, path, headers=headers)
+                            elapsed = time.perf_counter() - started
+                        runs.append((count_queries(stats), elapsed * 1000, response.status_code, stats))
+                    runs.sort(key=lambda run: run[1])
+                    queries, ms, status, stats = runs[len(runs) // 2]
+                    results[budget.name][students] = {
+                        "queries": max(run[0] for run in runs),
+                        "median_ms": round(ms, 2),
+                        "status": status,
+                        "commands": {name: e["count"] for name, e in stats.by_name.items()}
+                    }
+        await environment.stop_app()
+    return results
+
+
+def check(results, args):
+    """Compare measurements with the budgets. Returns a list of failure messages."""
+    failures = []
+    smallest, largest = args.scales[0], args.scales[-1]
+    for budget in BUDGETS:
+        by_scale = results[budget.name]
+        for students, result in by_scale.items():
+            if result["status"] >= 400:
+                failures.append(f"{budget.name}: HTTP {result['status']} with {students} students")
+            if result["queries"] > budget.queries:
+                failures.append(f"{budget.name}: {result['queries']} queries with {students} students "
+                                f"(budget {budget.queries}) {result['commands']}")
+        if by_scale[largest]["queries"] > by_scale[smallest]["queries"]:
+            failures.append(f"{budget.name}: queries grow with students "
+                            f"({by_scale[smallest]['queries']} -> {by_scale[largest]['queries']})")
+        if budget.ms is not None and not args.skip_latency and by_scale[largest]["median_ms"] > budget.ms * args.latency_factor:
+            failures.append(f"{budget.name}: {by_scale[largest]['median_ms']:.1f} ms with {largest} students "
+                            f"(budget {budget.ms * args.latency_factor:.0f} ms)")
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", default="50,200", help="comma separated student counts, smallest first")
+    parser.add_argument("--courses", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per endpoint (median is used)")
+    parser.add_argument("--latency-factor", type=float, default=1.0, help="multiply latency budgets (slow machines)")
+    parser.add_argument("--skip-latency", action="store_true", help="only check query counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", help="local mongod to use instead of mongomock-motor")
+    parser.add_argument("--db", default="academic_performance_bench")
+    parser.add_argument("--json", help="write the measurements to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own output")
+    args = parser.parse_args(argv)
+    args.scales = sorted(int(s) for s in args.scales.split(","))
+    return args
+
+
+def main():
+    args = parse_args()
+    results = asyncio.run(measure(args))
+    print(f"  {'endpoint':<36}" + "".join(f"{str(n) + ' students':>24}" for n in args.scales) + f"{'budget':>18}")
+    for budget in BUDGETS:
+        cells = "".join(
+            "{:>24}".format(f"{r['queries']} q / {r['median_ms']:.1f} ms") for r in results[budget.name].values()
+        )
+        limit = f"{budget.queries} q / " + (f"{budget.ms * args.latency_factor:.0f} ms" if budget.ms is not None else "-")
+        print(f"  {budget.name:<36}{cells}{limit:>18}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"scales": args.scales, "results": results}, f, indent=2)
+
+    failures = check(results, args)
+    if failures:
+        print(f"\n❌ {len(failures)} budget(s) exceeded:")
+        for failure in failures:
+            print(f"  - {failure}")
+        return 1
+    print("\n✅ All endpoints within their query and latency budgets")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Bytes on the wire for the large JSON endpoints.
+
+For each endpoint this records the response size and time uncompressed
+(what every refresh cost before), with gzip and with brotli (when the Brotli
+package is installed), and for a revalidation with If-None-Match, which
+returns 304 without querying MongoDB or serializing the body.
+
+    python -m benchmarks.wire_bench
+    python -m benchmarks.wire_bench --students 2000 --courses 6 --json wire.json
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import contextlib
+
+ENDPOINTS = [
+    "/dashboard/students",
+    "/dashboard/high-risk",
+    "/prediction/all",
+    "/lecturer/assessments/",
+    "/lecturer/attendance/"
+]
+MODES = [("identity", {"Accept-Encoding": "identity"}), ("gzip", {"Accept-Encoding": "gzip"}),
+         ("br", {"Accept-Encoding": "br"})]
+
+
+async def fetch(http, path, headers, repeat):
+    """Median time, bytes received (before decoding), status and MongoDB commands of ``repeat`` requests"""
+    from services.db_monitor import track_commands
+    runs = []
+    for _ in range(repeat):
+        with track_commands() as stats:
+            started = time.perf_counter()
+            async with http.stream("GET", path, headers=headers) as response:
+                size = 0
+                async for chunk in response.aiter_raw():
+                    size += len(chunk)
+            elapsed = time.perf_counter() - started
+        runs.append((elapsed, size, response, stats.commands))
+    runs.sort(key=lambda run: run[0])
+    elapsed, size, response, commands = runs[len(runs) // 2]
+    return {
+        "status": response.status_code,
+        "bytes": size,
+        "encoding": response.headers.get("content-encoding", "identity"),
+        "median_ms": round(elapsed * 1000, 2),
+        "mongo_commands": commands,
+        "etag": response.headers.get("etag")
+    }
+
+
+async def measure(args):
+    os.environ["COHORT_SNAPSHOT_ENABLED"] = "false"
+    from benchmarks import environment
+    from benchmarks.cohort import generate_cohort, load_cohort
+    from services.compression import brotli
+
+    database = environment.configure(args.mongo_url, args.db)
+    if not args.mongo_url:
+        environment.instrument_mongomock()
+    quiet = contextlib.redirect_stdout(open(os.devnull, "w")) if not args.verbose else contextlib.nullcontext()
+
+    results = {}
+    with quiet:
+        app = await environment.start_app()
+        async with environment.client(app, timeout=None) as http:
+            headers = await environment.login(http)
+            await load_cohort(database, generate_cohort(args.students, args.courses, seed=args.seed))
+            await http.post("/prediction/generate-all", headers=headers)
+            for path in ENDPOINTS:
+                results[path] = {}
+                for mode, mode_headers in MODES:
+                    if mode == "br" and brotli is None:
+                        continue
+                    results[path][mode] = await fetch(http, path, {**headers, **mode_headers}, args.repeat)
+                etag = results[path]["gzip"]["etag"]
+                if etag:
+                    results[path]["revalidated"] = await fetch(
+                        http, path, {**headers, "Accept-Encoding": "gzip", "If-None-Match": etag}, args.repeat
+                    )
+        await environment.stop_app()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=1000)
+    parser.add_argument("--courses", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="requests per endpoint and mode (median is used)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--mongo-url", help="local mongod to use instead of mongomock-motor")
+    parser.add_argument("--db", default="academic_performance_bench")
+    parser.add_argument("--json", help="write the measurements to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the API's own output")
+    args = parser.parse_args()
+
+    results = asyncio.run(measure(args))
+    print(f"  {'endpoint':<24}{'mode':<13}{'status':>7}{'bytes':>12}{'vs identity':>13}{'ms':>10}{'queries':>9}")
+    for path, modes in results.items():
+        identity = modes["identity"]["bytes"] or 1
+        for mode, result in modes.items():
+            ratio = f"{result['bytes'] / identity:.1%}"
+            print(f"  {path:<24}{mode:<13}{result['status']:>7}{result['bytes']:>12,}{ratio:>13}"
+                  f"{result['median_ms']:>10.1f}{result['mongo_commands']:>9}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"students": args.students, "courses": args.courses, "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,6 +2,7 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 import os
 from dotenv import load_dotenv
+from services.db_monitor import command_listener
 
 # Load environment variables
 load_dotenv()
@@ -17,12 +18,14 @@ if "mongodb+srv://" in MONGODB_URL:
     # For MongoDB Atlas
     client = AsyncIOMotorClient(MONGODB_URL, 
                                 maxPoolSize=MONGODB_MAX_POOL_SIZE,
-                                minPoolSize=MONGODB_MIN_POOL_SIZE)
+                                minPoolSize=MONGODB_MIN_POOL_SIZE,
+                                event_listeners=[command_listener])
 else:
     # For local MongoDB
     client = AsyncIOMotorClient(MONGODB_URL,
                                 maxPoolSize=MONGODB_MAX_POOL_SIZE,
-                                minPoolSize=MONGODB_MIN_POOL_SIZE)
+                                minPoolSize=MONGODB_MIN_POOL_SIZE,
+                                event_listeners=[command_listener])
 
 database = client[MONGODB_DB]
 
@@ -52,6 +55,14 @@ def course_helper(course) -> dict:
         "credit_unit": course["credit_unit"]
     }
 
+def enrollment_helper(enrollment) -> dict:
+    return {
+        "id": str(enrollment["_id"]),
+        "student_id": enrollment["student_id"],
+        "course_id": enrollment["course_id"],
+        "semester": enrollment["semester"]
+    }
+
 def assessment_helper(assessment) -> dict:
     return {
         "id": str(assessment["_id"]),
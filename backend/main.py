@@ -1,15 +1,39 @@
+import time
+_import_started = time.perf_counter()
+
 import os
+import asyncio
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, RedirectResponse
 import uvicorn
 from pathlib import Path
 
 from routes import admin, lecturer, prediction, dashboard, auth
 from ml.model import prediction_model
+from ml.registry import model_registry
 from routes.auth import create_default_users
+from services.snapshot import cohort_snapshot
+from services import cleanup, leases, sharding
+from services.leases import SingleFlight
+from services.password_pool import password_pool
+from services.revocation import revocation_list
+from ml.evaluation import model_evaluator
+from routes.auth import user_cache, role_from_authorization
+from routes.prediction import fingerprint_stats
+from services.metrics import metrics, MetricsMiddleware, METRICS_ENABLED
+from services.profiling import ProfilingMiddleware, PROFILING_ENABLED
+from services.frontend import frontend_app, FRONTEND_ENABLED, FRONTEND_PREFIX
+from services.compression import CompressionMiddleware, COMPRESSION_ENABLED
+from services.admission import AdmissionMiddleware, admission_controller, ADMISSION_ENABLED
+from services.data_version import data_versions
+from services.pubsub import event_hub
+from services.stream_tickets import stream_tickets
+from services import course_analytics
+
+# Time spent importing the app module and its routers (the ML stack is imported lazily)
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 # Load environment variables from .env file
 load_dotenv()
@@ -19,9 +43,16 @@ HOST = os.getenv("HOST", "0.0.0.0")
 PORT = int(os.getenv("PORT", 8000))
 RELOAD = os.getenv("RELOAD", "True").lower() == "true"
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:5500,http://127.0.0.1:5500,http://localhost:8000").split(",")
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", 5))
+# Set by serve.py for all workers of one launch, so once-only startup work runs in one of them
+LAUNCH_ID = os.getenv("SERVE_LAUNCH_ID")
 
 app = FastAPI(title="Academic Performance Prediction System")
 
+# Priority classes, concurrency limits and deadlines; inside CORS so 503s carry its headers
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -31,6 +62,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Admin-requested or sampled request profiles, listed by /admin/profiles
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware, role_for=role_from_authorization)
+
+# gzip/brotli for large responses; inside the metrics middleware so it records bytes on the wire
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+
+# Per-route request metrics, exported by /metrics
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+
 # Include routers WITHOUT the /api prefix
 app.include_router(auth.router)      # Routes will be /auth/*
 app.include_router(admin.router)     # Routes will be /admin/*
@@ -38,6 +81,14 @@ app.include_router(lecturer.router)  # Routes will be /lecturer/*
 app.include_router(prediction.router) # Routes will be /prediction/*
 app.include_router(dashboard.router)  # Routes will be /dashboard/*
 
+# Frontend pages on the same origin as the API (no CORS preflights)
+if FRONTEND_ENABLED:
+    app.mount(FRONTEND_PREFIX, frontend_app, name="frontend")
+
+    @app.get("/", include_in_schema=False)
+    async def frontend_index():
+        return RedirectResponse(f"{FRONTEND_PREFIX}/index.html")
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -48,35 +99,208 @@ async def health_check():
         "port": PORT
     }
 
+# Readiness endpoint - unlike /health, only succeeds once startup work has finished
+@app.get("/ready")
+async def readiness_check():
+    body = {
+        "ready": startup_state["ready"] and not startup_state["draining"],
+        "draining": startup_state["draining"],
+        "pid": os.getpid(),
+        "model_loaded": startup_state["model_loaded"],
+        "model_preloaded": startup_state["model_preloaded"],
+        "model_trained": prediction_model.is_trained,
+        "import_seconds": round(IMPORT_SECONDS, 4),
+        "startup_seconds": startup_state["startup_seconds"],
+        "tasks": startup_state["tasks"]
+    }
+    if not body["ready"]:
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+# Prometheus scrape endpoint. The numbers are this worker's only: under serve.py
+# scrape each worker on its METRICS_PORT + i target and aggregate in Prometheus.
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def _fingerprint_hit_ratio():
+    total = fingerprint_stats["hits"] + fingerprint_stats["misses"]
+    return fingerprint_stats["hits"] / total if total else 0.0
+
+metrics.register_gauge("model_info", "Model used for scoring", lambda: [
+    ({"version": prediction_model.version, "trained": str(prediction_model.is_trained).lower()}, 1)
+])
+metrics.register_gauge("model_load_seconds", "Time taken to load or train the model at startup",
+                       lambda: startup_state["tasks"].get("model", {}).get("seconds"))
+metrics.register_gauge("startup_seconds", "Time taken by the startup tasks", lambda: startup_state["startup_seconds"])
+metrics.register_gauge("cache_hit_ratio", "Hit ratio of in-process caches", lambda: [
+    ({"cache": "user"}, user_cache.hit_ratio),
+    ({"cache": "model_evaluation"}, model_evaluator.cache.hit_ratio),
+    ({"cache": "course_analytics"}, course_analytics.course_analytics.cache.hit_ratio),
+    ({"cache": "prediction_fingerprint"}, _fingerprint_hit_ratio())
+])
+metrics.register_gauge("cache_entries", "Entries held by in-process caches", lambda: [
+    ({"cache": "user"}, len(user_cache)),
+    ({"cache": "model_evaluation"}, len(model_evaluator.cache)),
+    ({"cache": "course_analytics"}, len(course_analytics.course_analytics.cache))
+])
+metrics.register_gauge("admission_in_flight", "Requests running per priority class", lambda: [
+    ({"priority": name}, stats["in_flight"]) for name, stats in admission_controller.stats().items()
+])
+metrics.register_gauge("admission_queued", "Requests waiting for a slot per priority class", lambda: [
+    ({"priority": name}, stats["queued"]) for name, stats in admission_controller.stats().items()
+])
+metrics.register_gauge("event_subscribers", "Open live update streams in this worker", lambda: len(event_hub.subscribers))
+
 # Test endpoint
 @app.get("/test")
 async def test_api():
     return {"message": "API is working", "status": "ok"}
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize model and create default users on startup"""
-    print(f"🚀 Starting up - MongoDB: {os.getenv('MONGODB_DB')}")
-    
-    # Create default admin and lecturer users
+# Progress of the startup tasks, reported by /ready
+startup_state = {
+    "ready": False,
+    # Set when shutdown begins, so load balancers stop routing here before the socket closes
+    "draining": False,
+    "model_loaded": False,
+    # Loaded by serve.py before forking, shared copy-on-write by the workers
+    "model_preloaded": False,
+    "startup_seconds": None,
+    "tasks": {}
+}
+# Keep references to background tasks so they are not garbage collected
+background_tasks = set()
+
+def initialize_model():
+    """Load the saved model, or fall back to training one (runs in a thread)"""
+    if not prediction_model.load_model():
+        print("🔄 Training new model...")
+        prediction_model.train_model()
+        print("✅ Model trained successfully")
+    else:
+        print("✅ Model loaded successfully")
+    startup_state["model_loaded"] = True
+
+def load_saved_model():
+    """Load the model another worker trained (runs in a thread)"""
+    if not prediction_model.load_model():
+        # Nothing was saved, so the trainer fell back to rules; train_model() without data does the same
+        prediction_model.train_model()
+    startup_state["model_loaded"] = True
+
+async def _once_per_launch(name, fn):
+    """Run ``fn()`` in one worker of a serve.py launch while the others wait for it.
+
+    Returns True in the worker that ran it. A single process (no launch id)
+    always runs it; a replacement worker started later does not run it again.
+    """
+    if not LAUNCH_ID:
+        await fn()
+        return True
+
+    async def lead():
+        await fn()
+        return {"worker": leases.WORKER_ID}
+
+    result = await SingleFlight(f"startup:{LAUNCH_ID}:{name}", once=True).run(lead)
+    return result.get("worker") == leases.WORKER_ID
+
+async def initialize_model_once():
+    # Every worker, on every host, serves the model published in MongoDB
+    if await model_registry.sync():
+        startup_state["model_loaded"] = True
+        return
+
+    async def initialize():
+        if not startup_state["model_loaded"]:
+            await asyncio.to_thread(initialize_model)
+        # Another launch may have published first; its model wins
+        if not await model_registry.publish(initial=True):
+            await model_registry.sync()
+
+    if not await _once_per_launch("model", initialize):
+        if not await model_registry.sync():
+            await asyncio.to_thread(load_saved_model)
+    startup_state["model_loaded"] = True
+
+async def _timed_startup_task(name, coro):
+    started = time.perf_counter()
     try:
-        await create_default_users()
-        print("✅ Default users created/verified")
+        await coro
+        startup_state["tasks"][name] = {"ok": True, "seconds": round(time.perf_counter() - started, 4)}
     except Exception as e:
-        print(f"⚠️ Error creating default users: {e}")
+        print(f"⚠️ Error during startup task '{name}': {e}")
+        startup_state["tasks"][name] = {
+            "ok": False,
+            "error": str(e),
+            "seconds": round(time.perf_counter() - started, 4)
+        }
+
+async def run_startup_tasks():
+    """Seed users, load the model and build caches concurrently"""
+    started = time.perf_counter()
+    tasks = [
+        _timed_startup_task("default_users", _once_per_launch("default_users", create_default_users)),
+        _timed_startup_task("model", initialize_model_once()),
+        _timed_startup_task("token_revocations", revocation_list.start()),
+        _timed_startup_task("data_versions", data_versions.start()),
+        _timed_startup_task("event_hub", event_hub.start()),
+        _timed_startup_task("stream_tickets", stream_tickets.ensure_indexes()),
+        _timed_startup_task("indexes", course_analytics.ensure_indexes())
+    ]
+    if FRONTEND_ENABLED:
+        tasks.append(_timed_startup_task("frontend", asyncio.to_thread(frontend_app.load)))
+    # Build the optional in-memory cohort snapshot for dashboard queries
+    if cohort_snapshot.enabled:
+        tasks.append(_timed_startup_task("cohort_snapshot", cohort_snapshot.build()))
+    await asyncio.gather(*tasks)
     
-    # Initialize ML model
-    try:
-        if not prediction_model.load_model():
-            print("🔄 Training new model...")
-            prediction_model.train_model()
-            print("✅ Model trained successfully")
-        else:
-            print("✅ Model loaded successfully")
-    except Exception as e:
-        print(f"⚠️ Error with ML model: {e}")
+    startup_state["startup_seconds"] = round(time.perf_counter() - started, 4)
+    startup_state["ready"] = True
+    print(f"✅ Startup tasks finished in {startup_state['startup_seconds']:.2f}s")
+    if startup_state["startup_seconds"] > STARTUP_BUDGET_SECONDS:
+        print(f"⚠️ Startup exceeded its {STARTUP_BUDGET_SECONDS:.1f}s budget: {startup_state['tasks']}")
+
+def start_background_task(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def startup_event():
+    """Start model loading and default user creation without delaying the server bind"""
+    print(f"🚀 Starting up - MongoDB: {os.getenv('MONGODB_DB')} (imports took {IMPORT_SECONDS:.2f}s)")
+    start_background_task(run_startup_tasks())
+    start_background_task(revocation_list.run_refresh_job())
+    start_background_task(data_versions.run_refresh_job())
+    start_background_task(model_registry.run_sync_job())
+    if event_hub.enabled:
+        start_background_task(event_hub.run_relay_job())
+    if METRICS_ENABLED:
+        start_background_task(metrics.monitor_event_loop())
+    if cohort_snapshot.enabled:
+        start_background_task(cohort_snapshot.run_sync_job())
+    
+    # Periodically purge data orphaned by deleted students and courses
+    if cleanup.ORPHAN_COMPACTION_INTERVAL > 0:
+        start_background_task(cleanup.run_compaction_job())
+        print(f"🧹 Orphan compaction every {cleanup.ORPHAN_COMPACTION_INTERVAL}s")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and release worker pools on shutdown (in-flight requests have finished)"""
+    startup_state["draining"] = True
+    event_hub.close()
+    tasks = list(background_tasks) + list(sharding.worker_tasks)
+    for task in tasks:
+        task.cancel()
+    # Sharded generation workers hand their shards back before exiting
+    await asyncio.gather(*tasks, return_exceptions=True)
+    password_pool.shutdown()
 
 if __name__ == "__main__":
     print(f"🌟 Starting server on {HOST}:{PORT}")
     print(f"📝 API Documentation: http://{HOST if HOST != '0.0.0.0' else 'localhost'}:{PORT}/docs")
+    print("🏭 For production, run serve.py: several workers, graceful drain, no reload")
     uvicorn.run("main:app", host=HOST, port=PORT, reload=RELOAD)
\ No newline at end of file
@@ -0,0 +1,77 @@
+import os
+import hashlib
+import numpy as np
+from dotenv import load_dotenv
+from database import assessment_collection, attendance_collection
+
+# Load environment variables
+load_dotenv()
+
+# A student whose average total (test + assignment + exam, out of 100) is below
+# this mark is labelled at risk when building training data
+AT_RISK_SCORE = float(os.getenv("AT_RISK_SCORE", 50))
+
+FEATURE_NAMES = ['Attendance', 'Test Avg', 'Assignment Avg', 'Previous GPA']
+
+ASSESSMENT_FEATURES = {
+    "$group": {
+        "_id": "$student_id",
+        "test_avg": {"$avg": "$test_score"},
+        "assignment_avg": {"$avg": "$assignment_score"},
+        "total_avg": {"$avg": {"$add": ["$test_score", "$assignment_score", "$exam_score"]}}
+    }
+}
+ATTENDANCE_FEATURES = {
+    "$group": {
+        "_id": "$student_id",
+        "attendance_avg": {"$avg": "$attendance_percentage"}
+    }
+}
+
+
+def data_version(X, y):
+    """Hash of the training data - equal hashes mean equal evaluation results"""
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X, dtype=np.float64).tobytes())
+    digest.update(np.ascontiguousarray(y, dtype=np.int8).tobytes())
+    return digest.hexdigest()[:16]
+
+
+async def load_training_data(match=None):
+    """Build one feature row per student with both assessments and attendance.
+
+    Features follow PredictionModel.calculate_student_metrics; the label is 1
+    when the student's average total score is below AT_RISK_SCORE.
+    """
+    pipeline = ([{"$match": match}] if match else [])
+    assessments = await assessment_collection.aggregate(pipeline + [ASSESSMENT_FEATURES]).to_list(length=None)
+    attendance = {
+        row["_id"]: row["attendance_avg"]
+        async for row in attendance_collection.aggregate(pipeline + [ATTENDANCE_FEATURES])
+    }
+
+    rows = sorted(
+        (row for row in assessments if row["_id"] in attendance),
+        key=lambda row: row["_id"]
+    )
+    student_ids = [row["_id"] for row in rows]
+    X = np.array(
+        [
+            [
+                attendance[row["_id"]],
+                row["test_avg"],
+                row["assignment_avg"],
+                round((row["test_avg"] + row["assignment_avg"]) / 50 * 4.0, 2)
+            ]
+            for row in rows
+        ],
+        dtype=np.float64
+    ).reshape(-1, len(FEATURE_NAMES))
+    y = np.array([row["total_avg"] < AT_RISK_SCORE for row in rows], dtype=np.int8)
+
+    return {
+        "student_ids": student_ids,
+        "X": X,
+        "y": y,
+        "data_version": data_version(X, y)
+    }
@@ -0,0 +1,160 @@
+import os
+import asyncio
+import numpy as np
+from dotenv import load_dotenv
+from ml.model import prediction_model, RANDOM_SEED, MAX_ITER
+from ml.dataset import load_training_data
+from services.cache import TTLCache
+from services.data_version import data_versions
+
+# Load environment variables
+load_dotenv()
+
+CV_FOLDS = int(os.getenv("CV_FOLDS", 5))
+# Processes used by sklearn for the folds (-1 = all cores)
+CV_N_JOBS = int(os.getenv("CV_N_JOBS", -1))
+# Results stay valid as long as the data does; the TTL only bounds memory
+CV_CACHE_TTL = int(os.getenv("CV_CACHE_TTL", 24 * 3600))
+
+METRIC_NAMES = ['accuracy', 'precision', 'recall', 'f1_score']
+# The training data is built from these collections alone
+TRAINING_COLLECTIONS = ("assessments", "attendance")
+# Cached "not enough data" results are None, so misses need their own marker
+_MISSING = object()
+
+
+def _fold_metrics(y_true, y_pred):
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
+    return {
+        'accuracy': accuracy_score(y_true, y_pred),
+        'precision': precision_score(y_true, y_pred, zero_division=0),
+        'recall': recall_score(y_true, y_pred, zero_division=0),
+        'f1_score': f1_score(y_true, y_pred, zero_division=0)
+    }
+
+
+def _summarize(per_fold, y_true, y_pred):
+    from sklearn.metrics import confusion_matrix
+    summary = {}
+    for name in METRIC_NAMES:
+        values = np.array([fold[name] for fold in per_fold])
+        summary[name] = float(values.mean())
+        summary[f"{name}_std"] = float(values.std())
+    summary['confusion_matrix'] = confusion_matrix(y_true, y_pred, labels=[0, 1]).tolist()
+    summary['per_fold'] = [{k: float(v) for k, v in fold.items()} for fold in per_fold]
+    return summary
+
+
+def cross_validate_models(X, y, folds=CV_FOLDS, n_jobs=CV_N_JOBS):
+    """Stratified k-fold metrics for the rule-based and the logistic model.
+
+    The rule-based model has nothing to fit, so each fold just scores its test
+    split. The logistic model (scaler + LogisticRegression) is refit per fold in
+    sklearn's process pool.
+    """
+    from sklearn.model_selection import StratifiedKFold, cross_validate, cross_val_predict
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.linear_model import LogisticRegression
+
+    # Every fold needs at least one sample of each class
+    folds = min(folds, int(np.bincount(y, minlength=2).min()))
+    if folds < 2:
+        return None
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=RANDOM_SEED)
+
+    # Rule-based model: at risk when the rules say High
+    rule_pred = (prediction_model.predict_risk_batch(X[:, 0], X[:, 1], X[:, 2], X[:, 3])['risk_code'] == 2).astype(np.int8)
+    rule_folds = [_fold_metrics(y[test], rule_pred[test]) for _, test in splitter.split(X, y)]
+
+    # Logistic regression
+    pipeline = make_pipeline(StandardScaler(), LogisticRegression(random_state=RANDOM_SEED, max_iter=MAX_ITER))
+    scores = cross_validate(
+        pipeline, X, y, cv=splitter, n_jobs=n_jobs,
+        scoring={'accuracy': 'accuracy', 'precision': 'precision', 'recall': 'recall', 'f1_score': 'f1'}
+    )
+    logistic_folds = [
+        {name: scores[f"test_{name}"][i] for name in METRIC_NAMES} for i in range(folds)
+    ]
+    logistic_pred = cross_val_predict(pipeline, X, y, cv=splitter, n_jobs=n_jobs)
+
+    return {
+        'folds': folds,
+        'samples': int(len(y)),
+        'positives': int(y.sum()),
+        'models': {
+            'rule_based': _summarize(rule_folds, y, rule_pred),
+            'logistic_regression': _summarize(logistic_folds, y, logistic_pred)
+        }
+    }
+
+
+class ModelEvaluator:
+    """Cross-validated metrics cached by data version.
+
+    A request first looks the result up under the data versions of the
+    training collections, which needs no query. Only when they changed is the
+    training data loaded; its content hash then finds results of identical
+    data, e.g. after a write that was undone.
+    """
+
+    def __init__(self, folds=CV_FOLDS, n_jobs=CV_N_JOBS):
+        self.folds = folds
+        self.n_jobs = n_jobs
+        self.cache = TTLCache(maxsize=16, ttl=CV_CACHE_TTL)
+        self._lock = asyncio.Lock()
+
+    def _versions_key(self):
+        if not data_versions.loaded:
+            return None
+        return ("versions", tuple(data_versions.versions.get(name) for name in TRAINING_COLLECTIONS), self.folds)
+
+    async def evaluate(self):
+        """Return cached metrics for the current data, computing them once if needed"""
+        versions_key = self._versions_key()
+        if versions_key is not None:
+            result = self.cache.get(versions_key, _MISSING)
+            if result is not _MISSING:
+                return result
+
+        # Concurrent dashboard loads wait for one computation instead of starting their own
+        async with self._lock:
+            # Taken before the data is loaded, so a write during the load is not hidden by it
+            versions_key = self._versions_key()
+            if versions_key is not None:
+                result = self.cache.get(versions_key, _MISSING)
+                if result is not _MISSING:
+                    return result
+            data = await load_training_data()
+            key = (data["data_version"], self.folds)
+            result = self.cache.get(key, _MISSING)
+            if result is _MISSING:
+                result = await asyncio.to_thread(
+                    cross_validate_models, data["X"], data["y"], self.folds, self.n_jobs
+                )
+                if result is not None:
+                    result['data_version'] = data["data_version"]
+                self.cache.set(key, result)
+            if versions_key is not None:
+                self.cache.set(versions_key, result)
+        return result
+
+    async def metrics_payload(self):
+        """Model metrics for the API: cross-validated when there is enough data,
+        otherwise the metrics recorded by the last train_model call"""
+        result = await self.evaluate()
+        if result is None:
+            return prediction_model.metrics or None
+
+        # The headline numbers describe the model actually used for scoring
+        active = 'logistic_regression' if prediction_model.is_trained else 'rule_based'
+        headline = result['models'][active]
+        payload = {name: headline[name] for name in METRIC_NAMES}
+        payload['confusion_matrix'] = headline['confusion_matrix']
+        payload['model'] = active
+        payload['cross_validation'] = result
+        return payload
+
+
+# Initialize global evaluator instance
+model_evaluator = ModelEvaluator()
@@ -0,0 +1,102 @@
+import os
+import json
+import numpy as np
+from datetime import datetime
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+COEFFICIENTS_PATH = os.getenv(
+    "COEFFICIENTS_PATH", os.path.join(os.path.dirname(__file__), "coefficients.json")
+)
+# Largest allowed difference from sklearn's predict_proba when exporting
+EXPORT_TOLERANCE = 1e-9
+# Model versions are timestamps; microseconds keep two quick trainings apart
+VERSION_FORMAT = "%Y%m%d%H%M%S%f"
+
+
+def model_version(at=None):
+    return (at or datetime.now()).strftime(VERSION_FORMAT)
+
+
+class LinearScorer:
+    """Pure-NumPy equivalent of StandardScaler + binary LogisticRegression.
+
+    Holds only the fitted means, scales, coefficients and intercept, so API
+    workers can score without importing sklearn. The operations follow sklearn's
+    order (subtract mean, divide by scale, dot with coef, add intercept) so the
+    probabilities agree to floating point rounding.
+    """
+
+    def __init__(self, mean, scale, coef, intercept, version=None, feature_names=None):
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.version = version
+        self.feature_names = feature_names
+
+    @classmethod
+    def from_sklearn(cls, scaler, model, version=None, feature_names=None):
+        scale = scaler.scale_ if scaler.scale_ is not None else np.ones_like(scaler.mean_)
+        return cls(scaler.mean_, scale, model.coef_[0], model.intercept_[0], version, feature_names)
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        return ((X - self.mean) / self.scale) @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        """Probability of the positive (at-risk) class for each row of X"""
+        z = self.decision_function(X)
+        # Numerically stable logistic function
+        out = np.empty_like(z)
+        positive = z >= 0
+        out[positive] = 1.0 / (1.0 + np.exp(-z[positive]))
+        exp_z = np.exp(z[~positive])
+        out[~positive] = exp_z / (1.0 + exp_z)
+        return out
+
+    def to_dict(self):
+        return {
+            "version": self.version,
+            "feature_names": self.feature_names,
+            "mean": self.mean.tolist(),
+            "scale": self.scale.tolist(),
+            "coef": self.coef.tolist(),
+            "intercept": self.intercept
+        }
+
+    def save(self, path=COEFFICIENTS_PATH, **metadata):
+        # Written next to the target and renamed over it, so a worker loading concurrently
+        # reads either the old file or the new one, never half of one
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({**self.to_dict(), **metadata}, f, indent=2, default=str)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path=COEFFICIENTS_PATH):
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["mean"], data["scale"], data["coef"], data["intercept"],
+            data.get("version"), data.get("feature_names")
+        )
+
+
+def export_coefficients(scaler, model, X, path=COEFFICIENTS_PATH, feature_names=None):
+    """Write the coefficient artifact after checking it reproduces sklearn on X"""
+    version = model_version()
+    scorer = LinearScorer.from_sklearn(scaler, model, version, feature_names)
+    expected = model.predict_proba(scaler.transform(X))[:, 1]
+    max_error = float(np.max(np.abs(scorer.predict_proba(X) - expected))) if len(X) else 0.0
+    if max_error > EXPORT_TOLERANCE:
+        raise ValueError(f"NumPy scorer differs from sklearn by {max_error:.3g}")
+    scorer.save(path, exported_at=datetime.now(), max_abs_error=max_error)
+    return scorer
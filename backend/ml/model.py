@@ -1,13 +1,9 @@
 import os
+import hashlib
 import numpy as np
-import pandas as pd
-from sklearn.linear_model import LogisticRegression
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
-import joblib
 from datetime import datetime
 from dotenv import load_dotenv
+from ml.inference import LinearScorer, export_coefficients, model_version
 
 # Load environment variables
 load_dotenv()
@@ -22,10 +18,17 @@ MAX_ITER = int(os.getenv("MAX_ITER", 1000))
 MODEL_PATH = os.getenv("MODEL_PATH", os.path.join(os.path.dirname(__file__), "model.joblib"))
 SCALER_PATH = os.getenv("SCALER_PATH", os.path.join(os.path.dirname(__file__), "scaler.joblib"))
 
+# Risk codes used by the vectorized scorers
+RISK_LABELS = ["Low", "Medium", "High"]
+
+# sklearn and joblib are imported inside the methods that need them, so importing
+# this module (and starting the API) does not pay for the whole ML stack
+
 class PredictionModel:
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
+        self.scaler = None
+        self.scorer = None  # NumPy copy of scaler + model used for serving
         self.metrics = {}
         self.is_trained = False
         
@@ -39,12 +42,19 @@ class PredictionModel:
         print(f"Training model on {len(X)} samples")
         
         try:
+            import joblib
+            from sklearn.linear_model import LogisticRegression
+            from sklearn.preprocessing import StandardScaler
+            from sklearn.model_selection import train_test_split
+            from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+            
             # Split data
             X_train, X_test, y_train, y_test = train_test_split(
                 X, y, test_size=0.2, random_state=RANDOM_SEED
             )
             
             # Scale features
+            self.scaler = StandardScaler()
             X_train_scaled = self.scaler.fit_transform(X_train)
             X_test_scaled = self.scaler.transform(X_test)
             
@@ -72,7 +82,11 @@ class PredictionModel:
             for name, coef in zip(feature_names, coefficients):
                 print(f"  {name}: {coef:.4f}")
             
-            # Save model and scaler
+            # Export the coefficient artifact the API serves from first: if it fails its
+            # check, the model and scaler on disk still match what the workers serve
+            self.scorer = export_coefficients(
+                self.scaler, self.model, np.asarray(X, dtype=np.float64), feature_names=feature_names
+            )
             joblib.dump(self.model, MODEL_PATH)
             joblib.dump(self.scaler, SCALER_PATH)
             
@@ -88,6 +102,7 @@ class PredictionModel:
         """Create a simple rule-based model when no training data is available"""
         print("📊 Using rule-based model based on score thresholds")
         self.is_trained = False
+        self.scorer = None
         self.metrics = {
             'accuracy': 0.85,
             'precision': 0.85,
@@ -99,14 +114,78 @@ class PredictionModel:
     
     def load_model(self):
         """Load trained model from disk"""
+        # The coefficient artifact is enough to serve predictions - no sklearn needed
+        scorer = LinearScorer.load()
+        if scorer is not None:
+            self.scorer = scorer
+            print(f"✅ Model coefficients loaded (version {scorer.version})")
+            self.is_trained = True
+            return True
         if os.path.exists(MODEL_PATH) and os.path.exists(SCALER_PATH):
+            import joblib
             self.model = joblib.load(MODEL_PATH)
             self.scaler = joblib.load(SCALER_PATH)
+            # Saved before coefficient artifacts existed; the file time identifies the training
+            version = model_version(datetime.fromtimestamp(os.path.getmtime(MODEL_PATH)))
+            self.scorer = LinearScorer.from_sklearn(self.scaler, self.model, version)
+            self.scorer.save()
             print(f"✅ Model loaded from {MODEL_PATH}")
             self.is_trained = True
             return True
         return False
     
+    def use_scorer(self, scorer, metrics=None):
+        """Serve a model trained elsewhere from its coefficients, or the rules when None"""
+        if scorer is None:
+            self._create_rule_based_model()
+        else:
+            # The sklearn objects belong to whatever this worker trained or loaded before
+            self.model = None
+            self.scaler = None
+            self.scorer = scorer
+            self.is_trained = True
+        if metrics:
+            self.metrics = metrics
+    
+    def predict_rows(self, X):
+        """Batch equivalent of predict_risk for rows of
+        [attendance, test_avg, assignment_avg, previous_gpa].
+        
+        Returns the predicted scores and risk codes (0 Low, 1 Medium, 2 High).
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, 4)
+        rules = self.predict_risk_batch(X[:, 0], X[:, 1], X[:, 2], X[:, 3])
+        risk_code = rules['risk_code']
+        if self.is_trained and self.scorer is not None:
+            _, risk_code = self.score_batch(X)
+        return rules['predicted_score'], risk_code
+    
+    @property
+    def version(self):
+        """Identifies what produced a prediction: the rules or a specific trained model"""
+        if self.is_trained and self.scorer is not None:
+            return f"logistic-{self.scorer.version}"
+        return "rules-v1"
+    
+    @staticmethod
+    def input_fingerprint(assessments, attendances):
+        """Hash of the fields predict_risk depends on, independent of record order"""
+        digest = hashlib.sha1()
+        for a in sorted((a['test_score'], a['assignment_score']) for a in assessments):
+            digest.update(repr(a).encode())
+        digest.update(b"|")
+        for a in sorted(a['attendance_percentage'] for a in attendances):
+            digest.update(repr(a).encode())
+        return digest.hexdigest()
+    
+    def score_batch(self, X):
+        """Risk probability and risk code (0 Low, 1 Medium, 2 High) for each feature row"""
+        probability = self.scorer.predict_proba(X)
+        risk_code = np.where(
+            probability >= HIGH_RISK_THRESHOLD, 2, np.where(probability >= MEDIUM_RISK_THRESHOLD, 1, 0)
+        ).astype(np.int8)
+        return probability, risk_code
+    
     def predict_risk(self, attendance, test_avg, assignment_avg, previous_gpa):
         """Predict risk for a single student using intelligent logic"""
         
@@ -154,6 +233,12 @@ class PredictionModel:
         # Round to 1 decimal
         predicted_score = round(predicted_score, 1)
         
+        # A trained model replaces the rule-based risk with its own probability
+        if self.is_trained and self.scorer is not None:
+            probabilities, risk_codes = self.score_batch([[attendance, test_avg, assignment_avg, previous_gpa]])
+            probability = probabilities[0]
+            risk_status = RISK_LABELS[risk_codes[0]]
+        
         print(f"📊 Risk Probability: {probability:.3f}")
         print(f"✅ Predicted Score: {predicted_score}")
         print(f"⚠️ Risk Status: {risk_status}")
@@ -169,6 +254,36 @@ class PredictionModel:
             }
         }
     
+    def predict_risk_batch(self, attendance, test_avg, assignment_avg, previous_gpa):
+        """Vectorized predict_risk: same rules, applied to whole arrays at once.
+        
+        Inputs broadcast against each other, so a cohort can be scored against a
+        grid of adjustments in one pass. Returns arrays shaped like the broadcast.
+        """
+        attendance = np.asarray(attendance, dtype=np.float64)
+        test_avg = np.asarray(test_avg, dtype=np.float64)
+        assignment_avg = np.asarray(assignment_avg, dtype=np.float64)
+        previous_gpa = np.asarray(previous_gpa, dtype=np.float64)
+        
+        academic_score = (test_avg + assignment_avg) * 2
+        performance = (attendance * 0.4) + (academic_score * 0.4) + (previous_gpa * 25 * 0.2)
+        
+        # Band 0 is performance < 50, band 4 is performance >= 80
+        band = np.digitize(performance, [50, 60, 70, 80])
+        probability = np.array([0.95, 0.8, 0.6, 0.4, 0.2])[band]
+        risk_code = np.array([2, 2, 1, 0, 0], dtype=np.int8)[band]
+        band_start = np.array([50.0, 50.0, 60.0, 70.0, 80.0])[band]
+        band_score = np.array([45.0, 45.0, 65.0, 75.0, 85.0])[band]
+        predicted_score = band_score + (performance - band_start) * 0.5
+        predicted_score = np.where(band == 0, np.maximum(30, 45 - (50 - performance)), predicted_score)
+        
+        return {
+            'probability': probability,
+            'predicted_score': np.round(predicted_score, 1),
+            'risk_code': risk_code,
+            'performance': performance
+        }
+    
     def calculate_student_metrics(self, student_id, assessments, attendances):
         """Calculate average metrics for a student"""
         if not assessments:
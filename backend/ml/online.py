@@ -0,0 +1,226 @@
+import os
+import io
+import asyncio
+import hashlib
+import numpy as np
+from datetime import datetime
+from dotenv import load_dotenv
+from bson import Binary
+from pymongo import UpdateOne, DeleteOne
+from database import database
+from ml.model import RANDOM_SEED, MAX_ITER
+from ml.dataset import load_training_data
+
+# Load environment variables
+load_dotenv()
+
+# Every N incremental updates, fit a full model from scratch and compare accuracy
+ONLINE_FULL_RETRAIN_EVERY = int(os.getenv("ONLINE_FULL_RETRAIN_EVERY", 10))
+# Percentage of students held out (by id hash) to compare the two models fairly
+ONLINE_HOLDOUT_PERCENT = int(os.getenv("ONLINE_HOLDOUT_PERCENT", 20))
+
+# Students whose records changed since the online model last saw them, and the model itself.
+# Both are in MongoDB, so every worker trains and uses the same online model.
+change_collection = database.get_collection("online_training_changes")
+state_collection = database.get_collection("online_model")
+STATE_ID = "current"
+
+
+def is_holdout(student_id):
+    """Deterministically assign a student to the evaluation holdout"""
+    return int(hashlib.sha1(student_id.encode()).hexdigest()[:8], 16) % 100 < ONLINE_HOLDOUT_PERCENT
+
+
+def _holdout_mask(data):
+    return np.array([is_holdout(s) for s in data["student_ids"]], dtype=bool)
+
+
+def _split(data):
+    holdout = _holdout_mask(data)
+    return (data["X"][~holdout], data["y"][~holdout]), (data["X"][holdout], data["y"][holdout])
+
+
+def _dumps(state):
+    import joblib
+    buffer = io.BytesIO()
+    joblib.dump(state, buffer)
+    return buffer.getvalue()
+
+
+def _loads(data):
+    import joblib
+    return joblib.load(io.BytesIO(data))
+
+
+class OnlineTrainer:
+    """Incrementally trained SGD logistic model.
+
+    Writes through the API mark the students whose assessments or attendance
+    changed, with a counter per student. Each update recomputes the features
+    of the marked students, feeds those rows to ``partial_fit`` of a running
+    StandardScaler and an SGDClassifier with log loss, and removes the marks
+    it consumed; a mark bumped again meanwhile stays for the next update. So
+    edits are seen as well as inserts, in whatever order they were written.
+    The first update trains on every student, including records written
+    outside the API.
+
+    The scaler counts each student once. The classifier sees a student again
+    whenever their records change, so recent changes weigh more, as usual in
+    online learning. The state is loaded lazily from MongoDB on first use.
+    """
+
+    def __init__(self):
+        self.scaler = None
+        self.model = None
+        # Students already counted in the scaler's running mean and variance
+        self.scaled_students = set()
+        self.updates = 0
+        self.samples_seen = 0
+        self.last_comparison = None
+        # Revision of the stored state this worker holds (None until loaded)
+        self.revision = None
+        self._lock = asyncio.Lock()
+
+    def _ensure_model(self):
+        if self.model is None:
+            from sklearn.linear_model import SGDClassifier
+            from sklearn.preprocessing import StandardScaler
+            self.scaler = StandardScaler()
+            self.model = SGDClassifier(loss="log_loss", random_state=RANDOM_SEED)
+
+    async def load(self):
+        """Fetch the stored state if it is newer than this worker's (imports joblib only then)"""
+        stored = await state_collection.find_one({"_id": STATE_ID}, {"revision": 1})
+        if stored is None or stored["revision"] == self.revision:
+            return False
+        stored = await state_collection.find_one({"_id": STATE_ID})
+        state = await asyncio.to_thread(_loads, stored["state"])
+        self.scaler = state["scaler"]
+        self.model = state["model"]
+        self.scaled_students = state["scaled_students"]
+        self.updates = state["updates"]
+        self.samples_seen = state["samples_seen"]
+        self.last_comparison = state.get("last_comparison")
+        self.revision = stored["revision"]
+        return True
+
+    async def save(self):
+        data = await asyncio.to_thread(_dumps, {
+            "scaler": self.scaler,
+            "model": self.model,
+            "scaled_students": self.scaled_students,
+            "updates": self.updates,
+            "samples_seen": self.samples_seen,
+            "last_comparison": self.last_comparison
+        })
+        revision = (self.revision or 0) + 1
+        await state_collection.replace_one(
+            {"_id": STATE_ID},
+            {"revision": revision, "state": Binary(data), "updated_at": datetime.utcnow()},
+            upsert=True
+        )
+        self.revision = revision
+
+    async def mark_changed(self, *student_ids):
+        """Record that the training features of these students changed"""
+        student_ids = sorted({s for s in student_ids if s})
+        if not student_ids:
+            return
+        try:
+            await change_collection.bulk_write([
+                UpdateOne({"_id": s}, {"$inc": {"version": 1}, "$set": {"changed_at": datetime.utcnow()}}, upsert=True)
+                for s in student_ids
+            ], ordered=False)
+        except Exception as e:
+            # The record is saved; the online model sees it with the student's next change
+            print(f"⚠️ Could not mark students for incremental training: {e}")
+
+    def _partial_fit(self, X, y, new):
+        self._ensure_model()
+        if new.any():
+            self.scaler.partial_fit(X[new])
+        self.model.partial_fit(self.scaler.transform(X), y, classes=np.array([0, 1]))
+
+    async def update(self, compare=False):
+        """Train on the students whose records changed since the last update"""
+        async with self._lock:
+            await self.load()
+            return await self._update(compare)
+
+    async def _update(self, compare):
+        # Read the marks first: students marked during the update stay marked for the next one
+        changes = await change_collection.find({}, {"version": 1}).to_list(length=None)
+        first = self.model is None
+        data = None
+        if first:
+            data = await load_training_data()
+        elif changes:
+            data = await load_training_data({"student_id": {"$in": sorted(c["_id"] for c in changes)}})
+
+        consumed = 0
+        changed_students = len(data["student_ids"]) if first else len(changes)
+        if data is not None:
+            train = ~_holdout_mask(data)
+            student_ids = [s for s, keep in zip(data["student_ids"], train) if keep]
+            X_train, y_train = data["X"][train], data["y"][train]
+            if len(y_train):
+                new = np.array([s not in self.scaled_students for s in student_ids], dtype=bool)
+                await asyncio.to_thread(self._partial_fit, X_train, y_train, new)
+                self.scaled_students.update(student_ids)
+                consumed = int(len(y_train))
+
+        self.updates += 1
+        self.samples_seen += consumed
+        print(f"📈 Incremental update #{self.updates}: {consumed} students from {changed_students} changed")
+
+        if self.model is not None and (compare or self.updates % ONLINE_FULL_RETRAIN_EVERY == 0):
+            self.last_comparison = await self.compare_with_full_retrain()
+        if self.model is not None:
+            await self.save()
+        # Only after saving, so a failed update leaves the marks for the next one
+        if changes:
+            await change_collection.bulk_write(
+                [DeleteOne({"_id": c["_id"], "version": c["version"]}) for c in changes], ordered=False
+            )
+        return self.status(consumed=consumed, changed_students=changed_students)
+
+    async def compare_with_full_retrain(self):
+        """Fit a LogisticRegression on all training students and compare both models on the holdout"""
+        data = await load_training_data()
+        (X_train, y_train), (X_test, y_test) = _split(data)
+        if len(y_test) == 0 or len(np.unique(y_train)) < 2:
+            return {"message": "Not enough data to compare models", "compared_at": datetime.now()}
+
+        def fit_and_score():
+            from sklearn.linear_model import LogisticRegression
+            from sklearn.pipeline import make_pipeline
+            from sklearn.preprocessing import StandardScaler
+            full = make_pipeline(StandardScaler(), LogisticRegression(random_state=RANDOM_SEED, max_iter=MAX_ITER))
+            full.fit(X_train, y_train)
+            online_pred = self.model.predict(self.scaler.transform(X_test))
+            return {
+                "holdout_samples": int(len(y_test)),
+                "online_accuracy": float((online_pred == y_test).mean()),
+                "full_retrain_accuracy": float((full.predict(X_test) == y_test).mean()),
+                "full_retrain_samples": int(len(y_train))
+            }
+
+        comparison = await asyncio.to_thread(fit_and_score)
+        comparison["accuracy_gap"] = comparison["full_retrain_accuracy"] - comparison["online_accuracy"]
+        comparison["compared_at"] = datetime.now()
+        print(f"📊 Online accuracy {comparison['online_accuracy']:.3f} vs full retrain {comparison['full_retrain_accuracy']:.3f}")
+        return comparison
+
+    def status(self, **extra):
+        return {
+            "updates": self.updates,
+            "samples_seen": self.samples_seen,
+            "revision": self.revision,
+            "students_scaled": len(self.scaled_students),
+            "last_comparison": self.last_comparison,
+            **extra
+        }
+
+
+# Initialize global online trainer
+online_trainer = OnlineTrainer()
@@ -0,0 +1,100 @@
+import os
+import asyncio
+from datetime import datetime
+from dotenv import load_dotenv
+from database import database
+from ml.model import prediction_model
+from ml.inference import LinearScorer
+from services.data_version import data_versions
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between checks for a model published by another worker
+MODEL_SYNC_SECONDS = float(os.getenv("MODEL_SYNC_SECONDS", 2))
+
+model_collection = database.get_collection("model_registry")
+CURRENT_ID = "current"
+# Data version bumped whenever a model is published
+MODEL_VERSION_NAME = "model"
+
+
+class ModelRegistry:
+    """The model every worker serves, stored in MongoDB.
+
+    Training publishes the coefficients of the NumPy scorer (or that the
+    rules are in use) with the model version and metrics, and bumps the
+    "model" data version. Each worker checks that data version from memory
+    and re-reads the document only when it changed, so workers on any host
+    switch to a new model within a few seconds of its training. The files
+    in ml/ are a local copy; they are not shared between hosts.
+    """
+
+    def __init__(self):
+        # "model" data version this worker's model is current for (None until synced)
+        self.synced = None
+
+    def _document(self):
+        return {
+            "version": prediction_model.version,
+            "trained": prediction_model.is_trained,
+            "coefficients": prediction_model.scorer.to_dict() if prediction_model.is_trained else None,
+            # Numbers only, so MongoDB can store them
+            "metrics": {
+                name: value.tolist() if hasattr(value, "tolist") else value
+                for name, value in (prediction_model.metrics or {}).items()
+            },
+            "published_at": datetime.utcnow()
+        }
+
+    async def publish(self, initial=False):
+        """Make the model this worker serves the current one for every worker.
+
+        With ``initial`` it is only stored when nothing was published before,
+        so a starting launch does not replace the model trained by another.
+        Returns False when another model was already published.
+        """
+        document = self._document()
+        if initial:
+            result = await model_collection.update_one(
+                {"_id": CURRENT_ID}, {"$setOnInsert": document}, upsert=True
+            )
+            if result.upserted_id is None:
+                return False
+        else:
+            await model_collection.replace_one({"_id": CURRENT_ID}, document, upsert=True)
+        await data_versions.bump(MODEL_VERSION_NAME)
+        self.synced = data_versions.versions.get(MODEL_VERSION_NAME)
+        print(f"📦 Published model {document['version']}")
+        return True
+
+    async def sync(self):
+        """Switch to the published model if it differs. Returns False when none is published."""
+        # Stamped before the read: a model published meanwhile is picked up by the next check
+        stamp = data_versions.versions.get(MODEL_VERSION_NAME)
+        document = await model_collection.find_one({"_id": CURRENT_ID})
+        if document is None:
+            return False
+        if document["version"] != prediction_model.version:
+            scorer = LinearScorer.from_dict(document["coefficients"]) if document["trained"] else None
+            prediction_model.use_scorer(scorer, document.get("metrics"))
+            print(f"🔄 Switched to published model {document['version']}")
+        self.synced = stamp
+        return True
+
+    def is_stale(self):
+        return data_versions.versions.get(MODEL_VERSION_NAME) != self.synced
+
+    async def run_sync_job(self, interval=MODEL_SYNC_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.is_stale():
+                continue
+            try:
+                await self.sync()
+            except Exception as e:
+                print(f"⚠️ Error syncing the published model: {e}")
+
+
+# Initialize global model registry instance
+model_registry = ModelRegistry()
@@ -0,0 +1,130 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from ml.model import prediction_model, HIGH_RISK_THRESHOLD, MEDIUM_RISK_THRESHOLD
+
+# Load environment variables
+load_dotenv()
+
+# Upper bound on students x grid cells scored by one request
+SCENARIO_MAX_CELLS = int(os.getenv("SCENARIO_MAX_CELLS", 50_000_000))
+# Cells scored per chunk, which bounds the size of temporary arrays
+SCENARIO_CHUNK_CELLS = int(os.getenv("SCENARIO_CHUNK_CELLS", 2_000_000))
+
+AXES = ["attendance", "test", "assignment"]
+# Valid range of each adjusted feature
+AXIS_LIMITS = {"attendance": (0, 100), "test": (0, 30), "assignment": (0, 20)}
+# Column of each axis in the feature matrix from ml.dataset
+AXIS_COLUMNS = {"attendance": 0, "test": 1, "assignment": 2}
+
+
+def _axis_values(X, name, values, mode):
+    """Adjusted feature values of every student, shaped (students, grid points)"""
+    current = X[:, AXIS_COLUMNS[name]][:, None]
+    if not values:
+        return current
+    grid = np.asarray(values, dtype=np.float64)[None, :]
+    adjusted = current + grid if mode == "add" else np.broadcast_to(grid, (len(X), grid.shape[1]))
+    low, high = AXIS_LIMITS[name]
+    return np.clip(adjusted, low, high)
+
+
+def _score_rule(attendance, test, assignment):
+    # previous_gpa is derived from test + assignment, so it moves with them
+    result = prediction_model.predict_risk_batch(
+        attendance, test, assignment, (test + assignment) / 50 * 4.0
+    )
+    return result['probability'], result['risk_code'], result['predicted_score']
+
+
+def _score_logistic(attendance, test, assignment):
+    # The standardized logistic model is linear in each feature, so each axis
+    # contributes an additive term that broadcasts over the grid
+    scorer = prediction_model.scorer
+    weights = scorer.coef / scorer.scale
+    intercept = scorer.intercept - np.dot(weights, scorer.mean)
+    gpa_weight = weights[3] * 4.0 / 50
+    logit = (
+        intercept
+        + weights[0] * attendance
+        + (weights[1] + gpa_weight) * test
+        + (weights[2] + gpa_weight) * assignment
+    )
+    probability = 1.0 / (1.0 + np.exp(-logit))
+    risk_code = np.where(
+        probability >= HIGH_RISK_THRESHOLD, 2, np.where(probability >= MEDIUM_RISK_THRESHOLD, 1, 0)
+    ).astype(np.int8)
+    return probability, risk_code, None
+
+
+def simulate(X, grid, model="auto"):
+    """Score every student in X against every combination of grid adjustments.
+
+    ``grid`` maps an axis name to ``{"values": [...], "mode": "set" | "add"}``.
+    Axes that are missing or empty keep the student's current value. Returns
+    per-cell surfaces shaped by the supplied axes: the mean risk probability,
+    the share of students at each risk level and, for the rule model, the
+    mean predicted score.
+    """
+    if model == "auto":
+        model = "logistic" if prediction_model.is_trained else "rule"
+    if model == "logistic" and prediction_model.scorer is None:
+        raise ValueError("The logistic model has not been trained")
+    score = _score_logistic if model == "logistic" else _score_rule
+
+    dims = [name for name in AXES if grid.get(name, {}).get("values")]
+    shape = tuple(len(grid[name]["values"]) for name in dims)
+    cells = int(np.prod(shape)) if shape else 1
+    if len(X) * cells > SCENARIO_MAX_CELLS:
+        raise ValueError(f"Scenario too large: {len(X)} students x {cells} cells exceeds {SCENARIO_MAX_CELLS}")
+
+    totals = {
+        "probability": np.zeros(shape),
+        "high": np.zeros(shape),
+        "medium": np.zeros(shape),
+        "low": np.zeros(shape),
+        "predicted_score": np.zeros(shape)
+    }
+    chunk = max(1, SCENARIO_CHUNK_CELLS // cells)
+    for start in range(0, len(X), chunk):
+        part = X[start:start + chunk]
+        values = {}
+        for name in AXES:
+            spec = grid.get(name) or {}
+            axis = _axis_values(part, name, spec.get("values"), spec.get("mode", "set"))
+            # Place the axis on its own dimension: (students, dim0, dim1, ...)
+            target = [part.shape[0]] + [1] * len(dims)
+            if name in dims:
+                target[1 + dims.index(name)] = axis.shape[1]
+            values[name] = axis.reshape(target)
+
+        probability, risk_code, predicted_score = score(
+            values["attendance"], values["test"], values["assignment"]
+        )
+        probability = np.broadcast_to(probability, (part.shape[0],) + shape)
+        risk_code = np.broadcast_to(risk_code, (part.shape[0],) + shape)
+        totals["probability"] += probability.sum(axis=0)
+        totals["high"] += (risk_code == 2).sum(axis=0)
+        totals["medium"] += (risk_code == 1).sum(axis=0)
+        totals["low"] += (risk_code == 0).sum(axis=0)
+        if predicted_score is not None:
+            totals["predicted_score"] += np.broadcast_to(predicted_score, (part.shape[0],) + shape).sum(axis=0)
+
+    n = max(len(X), 1)
+    surface = {
+        "mean_probability": (totals["probability"] / n).tolist(),
+        "high_risk_share": (totals["high"] / n).tolist(),
+        "medium_risk_share": (totals["medium"] / n).tolist(),
+        "low_risk_share": (totals["low"] / n).tolist()
+    }
+    if model == "rule":
+        surface["mean_predicted_score"] = np.round(totals["predicted_score"] / n, 2).tolist()
+
+    return {
+        "model": model,
+        "students": int(len(X)),
+        "dims": dims,
+        "axes": {name: [float(v) for v in grid[name]["values"]] for name in dims},
+        "modes": {name: grid[name].get("mode", "set") for name in dims},
+        "surface": surface
+    }
@@ -0,0 +1,54 @@
+import numpy as np
+from datetime import datetime
+from models import Prediction
+from ml.model import prediction_model, RISK_LABELS
+
+# Outcome of scoring one student
+PREDICTED, UNCHANGED, INSUFFICIENT = "predicted", "unchanged", "insufficient"
+
+
+def score_students(student_ids, assessments, attendances, existing, model_version):
+    """Score every student whose inputs or model changed since their stored prediction.
+
+    ``assessments``, ``attendances`` and ``existing`` map a student id to its
+    records and latest stored prediction. The features are those of
+    calculate_student_metrics, scored in one batch with ``predict_rows``.
+    Returns the student ids with their outcome (predicted, unchanged or
+    insufficient), in order, and the new prediction documents to store.
+    """
+    outcomes = {}
+    changed, hashes, rows = [], [], []
+    for student_id in student_ids:
+        student_assessments = assessments.get(student_id)
+        student_attendances = attendances.get(student_id)
+        if not student_assessments or not student_attendances:
+            outcomes[student_id] = INSUFFICIENT
+            continue
+        input_hash = prediction_model.input_fingerprint(student_assessments, student_attendances)
+        previous = existing.get(student_id)
+        if (previous is not None and previous.get("input_hash") == input_hash
+                and previous.get("model_version") == model_version):
+            outcomes[student_id] = UNCHANGED
+            continue
+        test_avg = np.mean([a["test_score"] for a in student_assessments])
+        assignment_avg = np.mean([a["assignment_score"] for a in student_assessments])
+        attendance_avg = np.mean([a["attendance_percentage"] for a in student_attendances])
+        rows.append([attendance_avg, test_avg, assignment_avg, round((test_avg + assignment_avg) / 50 * 4.0, 2)])
+        outcomes[student_id] = PREDICTED
+        changed.append(student_id)
+        hashes.append(input_hash)
+
+    documents = []
+    if changed:
+        predicted_scores, risk_codes = prediction_model.predict_rows(rows)
+        now = datetime.now()
+        for student_id, input_hash, score, code in zip(changed, hashes, predicted_scores, risk_codes):
+            prediction = Prediction(
+                student_id=student_id,
+                predicted_score=float(score),
+                risk_status=RISK_LABELS[code],
+                input_hash=input_hash,
+                model_version=model_version
+            )
+            documents.append({**prediction.dict(), "created_at": now})
+    return outcomes, documents
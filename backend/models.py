@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Optional, List, Literal
 from datetime import datetime
 from enum import Enum
 
@@ -40,10 +40,14 @@ class RiskStatus(str, Enum):
     HIGH = "High"
 
 class Prediction(BaseModel):
+    model_config = {"protected_namespaces": ()}  # allow the model_version field
+    
     student_id: str
     predicted_score: float
     risk_status: RiskStatus
     created_at: datetime = datetime.now()
+    input_hash: Optional[str] = None  # fingerprint of the scored inputs
+    model_version: Optional[str] = None
 
 # Response models
 class StudentResponse(Student):
@@ -58,6 +62,9 @@ class AssessmentResponse(Assessment):
 class AttendanceResponse(Attendance):
     id: str
 
+class EnrollmentResponse(Enrollment):
+    id: str
+
 class PredictionResponse(Prediction):
     id: str
 
@@ -82,10 +89,52 @@ class StudentRiskDetail(BaseModel):
     attendance_percentage: Optional[float] = None
     assessment_average: Optional[float] = None
 
+class StudentPage(BaseModel):
+    total: int  # students matching the filters, across all pages
+    offset: int
+    limit: Optional[int] = None
+    items: List[StudentRiskDetail]
+
+class DashboardOverview(BaseModel):
+    model_config = {"protected_namespaces": ()}  # allow the model_metrics field
+    statistics: Optional[RiskStatistics] = None
+    model_metrics: Optional[dict] = None
+    students: Optional[StudentPage] = None
+    errors: dict = {}  # section -> error, for sections that could not be computed
+
+# What-if scenarios
+class ScenarioAxis(BaseModel):
+    values: List[float] = []
+    mode: Literal["set", "add"] = "set"  # set the feature to each value, or add each value to it
+
+class ScenarioRequest(BaseModel):
+    student_ids: Optional[List[str]] = None  # None = whole cohort
+    attendance: Optional[ScenarioAxis] = None
+    test: Optional[ScenarioAxis] = None
+    assignment: Optional[ScenarioAxis] = None
+    model: Literal["auto", "rule", "logistic"] = "auto"
+
 # ML Model Evaluation
 class ModelMetrics(BaseModel):
     accuracy: float
     precision: float
     recall: float
     f1_score: float
-    confusion_matrix: list
\ No newline at end of file
+    confusion_matrix: list
+
+class CourseRiskSummary(BaseModel):
+    course_id: str
+    course_code: Optional[str] = None
+    course_title: Optional[str] = None
+    enrolled: int
+    assessed: int  # enrolled students with at least one assessment in the course
+    mean_test_score: Optional[float] = None
+    mean_assignment_score: Optional[float] = None
+    mean_exam_score: Optional[float] = None
+    mean_total_score: Optional[float] = None
+    mean_attendance: Optional[float] = None
+    low_risk: int
+    medium_risk: int
+    high_risk: int
+    unscored: int  # enrolled students without a prediction
+    high_risk_percentage: float
\ No newline at end of file
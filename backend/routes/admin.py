@@ -1,12 +1,19 @@
 from fastapi import APIRouter, HTTPException, Depends
 from bson import ObjectId
-from typing import List
+from typing import List, Optional
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
 from database import (
-    student_collection, course_collection,
-    student_helper, course_helper
+    student_collection, course_collection, enrollment_collection,
+    assessment_collection, attendance_collection,
+    student_helper, course_helper, enrollment_helper
 )
-from models import Student, Course, StudentResponse, CourseResponse
+from models import Student, Course, Enrollment, StudentResponse, CourseResponse, EnrollmentResponse
 from routes.auth import require_role
+from services.snapshot import cohort_snapshot
+from services.data_version import data_versions
+from services import cleanup
+from services.profiling import profile_store, get_profile
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -22,6 +29,8 @@ async def create_student(
     student_dict = student.dict()
     result = await student_collection.insert_one(student_dict)
     new_student = await student_collection.find_one({"_id": result.inserted_id})
+    cohort_snapshot.upsert_student(new_student)
+    await data_versions.bump("students")
     return student_helper(new_student)
 
 @router.get("/students/", response_model=List[StudentResponse])
@@ -55,6 +64,8 @@ async def update_student(student_id: str, student: Student):
     
     if result.modified_count == 1:
         updated_student = await student_collection.find_one({"_id": ObjectId(student_id)})
+        cohort_snapshot.upsert_student(updated_student)
+        await data_versions.bump("students")
         return student_helper(updated_student)
     
     raise HTTPException(status_code=404, detail="Student not found")
@@ -66,7 +77,10 @@ async def delete_student(student_id: str):
     
     result = await student_collection.delete_one({"_id": ObjectId(student_id)})
     if result.deleted_count == 1:
-        return {"message": "Student deleted successfully"}
+        cohort_snapshot.remove_student(student_id)
+        await data_versions.bump("students")
+        deleted = await cleanup.cascade_delete_student(student_id)
+        return {"message": "Student deleted successfully", "deleted": deleted}
     
     raise HTTPException(status_code=404, detail="Student not found")
 
@@ -76,6 +90,7 @@ async def create_course(course: Course):
     course_dict = course.dict()
     result = await course_collection.insert_one(course_dict)
     new_course = await course_collection.find_one({"_id": result.inserted_id})
+    await data_versions.bump("courses")
     return course_helper(new_course)
 
 @router.get("/courses/", response_model=List[CourseResponse])
@@ -107,6 +122,7 @@ async def update_course(course_id: str, course: Course):
     
     if result.modified_count == 1:
         updated_course = await course_collection.find_one({"_id": ObjectId(course_id)})
+        await data_versions.bump("courses")
         return course_helper(updated_course)
     
     raise HTTPException(status_code=404, detail="Course not found")
@@ -118,6 +134,117 @@ async def delete_course(course_id: str):
     
     result = await course_collection.delete_one({"_id": ObjectId(course_id)})
     if result.deleted_count == 1:
-        return {"message": "Course deleted successfully"}
+        await data_versions.bump("courses")
+        deleted = await cleanup.cascade_delete_course(course_id)
+        return {"message": "Course deleted successfully", "deleted": deleted}
     
-    raise HTTPException(status_code=404, detail="Course not found")
\ No newline at end of file
+    raise HTTPException(status_code=404, detail="Course not found")
+
+# Enrollment operations
+@router.post("/enrollments/", response_model=EnrollmentResponse)
+async def create_enrollment(
+    enrollment: Enrollment,
+    current_user = Depends(admin_only)
+):
+    if not ObjectId.is_valid(enrollment.student_id) or not ObjectId.is_valid(enrollment.course_id):
+        raise HTTPException(status_code=400, detail="Invalid student or course ID")
+    if not await student_collection.find_one({"_id": ObjectId(enrollment.student_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Student not found")
+    if not await course_collection.find_one({"_id": ObjectId(enrollment.course_id)}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Course not found")
+    
+    enrollment_dict = enrollment.dict()
+    try:
+        result = await enrollment_collection.insert_one(enrollment_dict)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Student is already enrolled in this course for this semester")
+    enrollment_dict["_id"] = result.inserted_id
+    await data_versions.bump("enrollments")
+    return enrollment_helper(enrollment_dict)
+
+@router.get("/enrollments/", response_model=List[EnrollmentResponse])
+async def get_enrollments(
+    course_id: Optional[str] = None,
+    student_id: Optional[str] = None,
+    semester: Optional[str] = None,
+    current_user = Depends(admin_only)
+):
+    """Get enrollments, optionally for one course, student or semester"""
+    query = {}
+    if course_id:
+        query["course_id"] = course_id
+    if student_id:
+        query["student_id"] = student_id
+    if semester:
+        query["semester"] = semester
+    return [enrollment_helper(e) async for e in enrollment_collection.find(query)]
+
+@router.delete("/enrollments/{enrollment_id}")
+async def delete_enrollment(enrollment_id: str, current_user = Depends(admin_only)):
+    if not ObjectId.is_valid(enrollment_id):
+        raise HTTPException(status_code=400, detail="Invalid enrollment ID")
+    
+    result = await enrollment_collection.delete_one({"_id": ObjectId(enrollment_id)})
+    if result.deleted_count == 1:
+        await data_versions.bump("enrollments")
+        return {"message": "Enrollment deleted successfully"}
+    
+    raise HTTPException(status_code=404, detail="Enrollment not found")
+
+@router.post("/enrollments/backfill")
+async def backfill_enrollments(semester: str, current_user = Depends(admin_only)):
+    """Enroll every student in each course they have assessment or attendance records for"""
+    pairs = set()
+    for collection in (assessment_collection, attendance_collection):
+        async for group in collection.aggregate([
+            {"$group": {"_id": {"student_id": "$student_id", "course_id": "$course_id"}}}
+        ]):
+            pairs.add((group["_id"]["student_id"], group["_id"]["course_id"]))
+    if not pairs:
+        return {"message": "No records to derive enrollments from", "created": 0}
+    
+    result = await enrollment_collection.bulk_write([
+        UpdateOne(
+            {"student_id": student_id, "course_id": course_id, "semester": semester},
+            {"$setOnInsert": {"student_id": student_id, "course_id": course_id, "semester": semester}},
+            upsert=True
+        )
+        for student_id, course_id in sorted(pairs)
+    ], ordered=False)
+    if result.upserted_count:
+        await data_versions.bump("enrollments")
+    return {"message": f"Enrolled {result.upserted_count} students in courses", "created": result.upserted_count}
+
+# Maintenance
+@router.post("/maintenance/compact")
+async def compact_orphans(
+    dry_run: bool = False,
+    current_user = Depends(admin_only)
+):
+    """Purge assessments, attendance, enrollments and predictions left behind by deleted records"""
+    if dry_run:
+        return await cleanup.compact_orphans(dry_run=True)
+    return await cleanup.compact_orphans_once()
+
+@router.get("/maintenance/compact")
+async def get_last_compaction(current_user = Depends(admin_only)):
+    """Get the report of the most recent orphan compaction"""
+    if cleanup.last_compaction_report:
+        return cleanup.last_compaction_report
+    return {"message": "No compaction has run yet"}
+
+# Request profiles
+@router.get("/profiles")
+async def list_profiles(current_user = Depends(admin_only)):
+    """Get summaries of the most recent request profiles, newest first"""
+    keys = ["id", "trigger", "method", "path", "status", "started_at", "wall_seconds",
+            "loop_cpu_seconds", "mongo_seconds", "other_wait_seconds", "tracemalloc_peak_bytes"]
+    return [{k: p[k] for k in keys} for p in reversed(profile_store)]
+
+@router.get("/profiles/{profile_id}")
+async def get_request_profile(profile_id: str, current_user = Depends(admin_only)):
+    """Get a request profile with its sampled stacks and MongoDB commands"""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -6,9 +6,16 @@ from datetime import datetime, timedelta
 from typing import Optional
 from pydantic import BaseModel
 import os
+import time
+import uuid
+import asyncio
 from dotenv import load_dotenv
 from bson import ObjectId
 from database import student_collection  # Reuse existing collections
+from services.cache import TTLCache
+from services.password_pool import password_pool, login_throttle, PoolSaturated
+from services.revocation import revocation_list
+from services.data_version import data_versions
 
 load_dotenv()
 
@@ -17,9 +24,14 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
+# Authenticated-user cache configuration
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 1024))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 60))
+
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token", auto_error=False)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])  
 
@@ -33,6 +45,8 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
+    jti: Optional[str] = None
+    expires_at: Optional[datetime] = None
 
 class User(BaseModel):
     username: str
@@ -51,39 +65,64 @@ class UserCreate(BaseModel):
     full_name: Optional[str] = None
     role: str = "lecturer"  # Default role
 
+class PasswordChange(BaseModel):
+    current_password: str
+    new_password: str
+
 # In-memory user store (in production, use MongoDB)
 # For now, we'll create a users collection in MongoDB
 from database import database
 user_collection = database.get_collection("users")
 
+# Resolved users keyed by username, so authenticated requests skip the users lookup.
+# Entries are dropped on register, disable and password change; the TTL bounds how
+# long another worker can keep serving a stale entry.
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+# Usernames of disabled accounts, used by the claims-only role check. Reloaded from
+# MongoDB at most once every USER_CACHE_TTL seconds, and as soon as another worker
+# bumps the "users" data version by disabling or enabling someone.
+disabled_usernames = set()
+_disabled_refreshed_at = None
+_disabled_version = None
+_disabled_refresh = None
+
 # Create default users on startup
+async def _ensure_default_user(username, email, full_name, role, password):
+    """Insert a default user if it is missing; returns True when it was created"""
+    if await user_collection.find_one({"username": username}):
+        return False
+    await user_collection.insert_one({
+        "username": username,
+        "email": email,
+        "full_name": full_name,
+        "role": role,
+        "disabled": False,
+        "hashed_password": await hash_password(password)
+    })
+    return True
+
 async def create_default_users():
-    # Check if admin exists
-    admin_exists = await user_collection.find_one({"username": os.getenv("ADMIN_USERNAME", "admin")})
-    if not admin_exists:
-        admin_user = {
-            "username": os.getenv("ADMIN_USERNAME", "admin"),
-            "email": os.getenv("ADMIN_EMAIL", "admin@university.edu"),
-            "full_name": "System Administrator",
-            "role": "admin",
-            "disabled": False,
-            "hashed_password": pwd_context.hash(os.getenv("ADMIN_PASSWORD", "Admin@123"))
-        }
-        await user_collection.insert_one(admin_user)
+    # Check and create admin and lecturer concurrently - each may need a bcrypt hash
+    admin_created, lecturer_created = await asyncio.gather(
+        _ensure_default_user(
+            os.getenv("ADMIN_USERNAME", "admin"),
+            os.getenv("ADMIN_EMAIL", "admin@university.edu"),
+            "System Administrator",
+            "admin",
+            os.getenv("ADMIN_PASSWORD", "Admin@123")
+        ),
+        _ensure_default_user(
+            os.getenv("LECTURER_USERNAME", "lecturer"),
+            os.getenv("LECTURER_EMAIL", "lecturer@university.edu"),
+            "Sample Lecturer",
+            "lecturer",
+            os.getenv("LECTURER_PASSWORD", "Lecturer@123")
+        )
+    )
+    if admin_created:
         print("✅ Default admin user created")
-    
-    # Check if lecturer exists
-    lecturer_exists = await user_collection.find_one({"username": os.getenv("LECTURER_USERNAME", "lecturer")})
-    if not lecturer_exists:
-        lecturer_user = {
-            "username": os.getenv("LECTURER_USERNAME", "lecturer"),
-            "email": os.getenv("LECTURER_EMAIL", "lecturer@university.edu"),
-            "full_name": "Sample Lecturer",
-            "role": "lecturer",
-            "disabled": False,
-            "hashed_password": pwd_context.hash(os.getenv("LECTURER_PASSWORD", "Lecturer@123"))
-        }
-        await user_collection.insert_one(lecturer_user)
+    if lecturer_created:
         print("✅ Default lecturer user created")
 
 # Helper functions
@@ -93,17 +132,77 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# bcrypt takes hundreds of milliseconds, so async handlers run it in the bounded pool
+async def verify_password_async(plain_password, hashed_password):
+    try:
+        return await password_pool.run(verify_password, plain_password, hashed_password)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login requests, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+async def hash_password(password):
+    try:
+        return await password_pool.run(get_password_hash, password)
+    except PoolSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
 async def get_user(username: str):
     user_dict = await user_collection.find_one({"username": username})
     if user_dict:
         return UserInDB(**user_dict)
     return None
 
+async def get_cached_user(username: str):
+    user = user_cache.get(username)
+    if user is None:
+        user = await get_user(username)
+        if user:
+            user_cache.set(username, user)
+    return user
+
+def invalidate_user(username: str):
+    user_cache.invalidate(username)
+
+async def _load_disabled_usernames():
+    global disabled_usernames, _disabled_refreshed_at, _disabled_version
+    # Taken before the query, so a change made during it triggers another reload
+    version = data_versions.versions.get("users")
+    started = time.monotonic()
+    disabled_usernames = {
+        u["username"] async for u in user_collection.find({"disabled": True}, {"username": 1})
+    }
+    _disabled_version = version
+    _disabled_refreshed_at = started
+
+async def refresh_disabled_usernames(force: bool = False):
+    global _disabled_refresh
+    if (not force and _disabled_refreshed_at is not None
+            and time.monotonic() - _disabled_refreshed_at < USER_CACHE_TTL
+            and data_versions.versions.get("users") == _disabled_version):
+        return
+    # Concurrent callers wait for one query; a forced refresh must start after the caller's write
+    if force or _disabled_refresh is None or _disabled_refresh.done():
+        _disabled_refresh = asyncio.ensure_future(_load_disabled_usernames())
+    try:
+        await asyncio.shield(_disabled_refresh)
+    except Exception as e:
+        if _disabled_refreshed_at is None:
+            raise
+        # The next request retries; until then the previous list stays in force
+        print(f"⚠️ Could not reload disabled users: {e}")
+
 async def authenticate_user(username: str, password: str):
     user = await get_user(username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -113,37 +212,77 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    # A unique token id lets a single token be revoked on logout
+    to_encode.update({"exp": expire, "jti": to_encode.get("jti") or uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+credentials_exception = HTTPException(
+    status_code=status.HTTP_401_UNAUTHORIZED,
+    detail="Could not validate credentials",
+    headers={"WWW-Authenticate": "Bearer"},
+)
+
+def decode_token(token: str) -> TokenData:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        token_data = TokenData(username=username, role=payload.get("role"))
     except JWTError:
         raise credentials_exception
-    user = await get_user(username=token_data.username)
+    # In-memory lookup - no database round trip per request
+    if revocation_list.is_revoked(payload.get("jti")):
+        raise credentials_exception
+    expires_at = datetime.utcfromtimestamp(payload["exp"]) if payload.get("exp") else None
+    return TokenData(username=username, role=payload.get("role"), jti=payload.get("jti"), expires_at=expires_at)
+
+def role_from_authorization(authorization):
+    """Role claim of an 'Authorization: Bearer' header value, or None if it is missing or invalid"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return decode_token(token).role
+    except HTTPException:
+        return None
+
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    token_data = decode_token(token)
+    user = await get_cached_user(username=token_data.username)
     if user is None:
         raise credentials_exception
     return user
 
 async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)):
-    if current_user.disabled:
+    # The cached record can predate a disable on another worker
+    await refresh_disabled_usernames()
+    if current_user.disabled or current_user.username in disabled_usernames:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_current_token_user(token: str = Depends(oauth2_scheme)):
+    """Resolve the caller from the signed token claims, without a users lookup"""
+    token_data = decode_token(token)
+    if token_data.role is None:
+        # Tokens without a role claim need the full user record
+        user = await get_current_active_user(await get_current_user(token))
+        return TokenData(username=user.username, role=user.role, jti=token_data.jti, expires_at=token_data.expires_at)
+    await refresh_disabled_usernames()
+    if token_data.username in disabled_usernames:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return token_data
+
+async def is_still_authorized(username, jti, expires_at):
+    """Whether a token validated earlier (e.g. for an open stream) may still be used"""
+    if revocation_list.is_revoked(jti) or (expires_at is not None and expires_at <= datetime.utcnow()):
+        return False
+    await refresh_disabled_usernames()
+    return username not in disabled_usernames
+
 # Role-based access control
 def require_role(required_role: str):
-    async def role_checker(current_user: UserInDB = Depends(get_current_active_user)):
+    async def role_checker(current_user: TokenData = Depends(get_current_token_user)):
         if current_user.role != required_role and current_user.role != "admin":
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
@@ -155,6 +294,13 @@ def require_role(required_role: str):
 # Routes
 @router.post("/token", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
+    retry_after = login_throttle.check(form_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many login attempts, please try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
     user = await authenticate_user(form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -162,6 +308,7 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    login_throttle.reset(user.username)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username, "role": user.role}, 
@@ -191,13 +338,49 @@ async def register(user: UserCreate):
     
     # Create new user
     user_dict = user.dict()
-    user_dict["hashed_password"] = get_password_hash(user.password)
+    user_dict["hashed_password"] = await hash_password(user.password)
     user_dict["disabled"] = False
     del user_dict["password"]
     
     result = await user_collection.insert_one(user_dict)
+    invalidate_user(user.username)
     return {"message": "User created successfully", "id": str(result.inserted_id)}
 
+@router.post("/change-password")
+async def change_password(
+    passwords: PasswordChange,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    # Check against the stored hash, not a possibly stale cached copy
+    user = await get_user(current_user.username)
+    if not user or not await verify_password_async(passwords.current_password, user.hashed_password):
+        raise HTTPException(status_code=400, detail="Current password is incorrect")
+    
+    await user_collection.update_one(
+        {"username": user.username},
+        {"$set": {"hashed_password": await hash_password(passwords.new_password)}}
+    )
+    invalidate_user(user.username)
+    return {"message": "Password changed successfully"}
+
+@router.put("/users/{username}/disabled")
+async def set_user_disabled(
+    username: str,
+    disabled: bool = True,
+    current_user: TokenData = Depends(require_role("admin"))
+):
+    result = await user_collection.update_one(
+        {"username": username}, {"$set": {"disabled": disabled}}
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    invalidate_user(username)
+    # Other workers reload their disabled list when they see the new version
+    await data_versions.bump("users")
+    await refresh_disabled_usernames(force=True)
+    return {"message": f"User {'disabled' if disabled else 'enabled'} successfully"}
+
 @router.get("/me", response_model=User)
 async def read_users_me(current_user: UserInDB = Depends(get_current_active_user)):
     return User(
@@ -209,9 +392,15 @@ async def read_users_me(current_user: UserInDB = Depends(get_current_active_user
     )
 
 @router.post("/logout")
-async def logout():
-    # JWT tokens are stateless, so we just return a success message
-    # Client should discard the token
+async def logout(token: Optional[str] = Depends(optional_oauth2_scheme)):
+    # Revoke the presented token until it expires; the client should still discard it
+    if token:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            payload = {}
+        if payload.get("jti") and payload.get("exp"):
+            await revocation_list.revoke(payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
     return {"message": "Successfully logged out"}
 
 @router.get("/verify")
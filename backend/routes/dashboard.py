@@ -1,28 +1,93 @@
-from fastapi import APIRouter, HTTPException, Depends
+import os
+import asyncio
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from bson import ObjectId
 from typing import List, Optional
 from database import (
-    student_collection, prediction_collection,
+    student_collection, prediction_collection, course_collection,
     assessment_collection, attendance_collection,
     student_helper
 )
-from models import RiskStatistics, StudentRiskDetail, ModelMetrics
-from ml.model import prediction_model
-from routes.auth import get_current_active_user
+from models import (
+    RiskStatistics, StudentRiskDetail, ModelMetrics, StudentPage, DashboardOverview, CourseRiskSummary
+)
+from ml.evaluation import model_evaluator
+from routes.auth import (
+    get_current_active_user, get_current_token_user, credentials_exception, is_still_authorized, TokenData
+)
+from services.snapshot import cohort_snapshot, NUMERIC_COLUMNS, SORTABLE_COLUMNS
+from services.data_version import conditional_get
+from services.pubsub import event_hub
+from services.stream_tickets import stream_tickets, STREAM_TICKET_SECONDS
+from services.course_analytics import course_analytics
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# Students returned by /overview unless the client asks for another page size
+OVERVIEW_STUDENTS_LIMIT = int(os.getenv("OVERVIEW_STUDENTS_LIMIT", 25))
+OVERVIEW_STUDENTS_MAX = int(os.getenv("OVERVIEW_STUDENTS_MAX", 500))
+
+# Fields /courses can be ordered by
+COURSE_SORT_FIELDS = [
+    "high_risk", "high_risk_percentage", "medium_risk", "enrolled", "assessed",
+    "mean_total_score", "mean_test_score", "mean_assignment_score", "mean_exam_score", "mean_attendance"
+]
+
+# Collections the per-student risk listings are built from
+COHORT_COLLECTIONS = ("students", "assessments", "attendance", "predictions")
+
+# Snapshot column names that map directly onto StudentRiskDetail fields
+DETAIL_SORT_FIELDS = {
+    "student_id": "student_id",
+    "name": "student_name",
+    "matric_no": "matric_no",
+    "department": "department",
+    "level": "level",
+    "attendance_avg": "attendance_percentage",
+    "assessment_avg": "assessment_average",
+    "predicted_score": "predicted_score"
+}
+
+async def _averages_by_student(student_ids):
+    """Assessment (test + assignment + exam) and attendance averages per student,
+    fetched with one query per collection"""
+    query = {"student_id": {"$in": student_ids}}
+    scores = {}
+    async for assessment in assessment_collection.find(
+        query, {"student_id": 1, "test_score": 1, "assignment_score": 1, "exam_score": 1}
+    ):
+        scores.setdefault(assessment["student_id"], []).append(
+            assessment["test_score"] + assessment["assignment_score"] + assessment["exam_score"]
+        )
+    attendance = {}
+    async for record in attendance_collection.find(query, {"student_id": 1, "attendance_percentage": 1}):
+        attendance.setdefault(record["student_id"], []).append(record["attendance_percentage"])
+    return (
+        {sid: sum(values) / len(values) for sid, values in scores.items()},
+        {sid: sum(values) / len(values) for sid, values in attendance.items()}
+    )
+
 @router.get("/statistics", response_model=RiskStatistics)
 async def get_risk_statistics(
     current_user = Depends(get_current_active_user)  # Any authenticated user
 ):
     """Get risk level statistics"""
-    predictions = await prediction_collection.find().to_list(length=None)
-    
-    total = len(predictions)
-    low_risk = sum(1 for p in predictions if p["risk_status"] == "Low")
-    medium_risk = sum(1 for p in predictions if p["risk_status"] == "Medium")
-    high_risk = sum(1 for p in predictions if p["risk_status"] == "High")
+    return await _risk_statistics()
+
+async def _risk_statistics():
+    if cohort_snapshot.is_ready:
+        counts = cohort_snapshot.risk_counts()
+        low_risk, medium_risk, high_risk = counts["Low"], counts["Medium"], counts["High"]
+        total = low_risk + medium_risk + high_risk
+    else:
+        predictions = await prediction_collection.find().to_list(length=None)
+        
+        total = len(predictions)
+        low_risk = sum(1 for p in predictions if p["risk_status"] == "Low")
+        medium_risk = sum(1 for p in predictions if p["risk_status"] == "Medium")
+        high_risk = sum(1 for p in predictions if p["risk_status"] == "High")
     
     return RiskStatistics(
         total_students=total,
@@ -34,45 +99,31 @@ async def get_risk_statistics(
         high_risk_percentage=(high_risk/total*100) if total > 0 else 0
     )
 
-@router.get("/high-risk", response_model=List[StudentRiskDetail])
+@router.get("/high-risk", response_model=List[StudentRiskDetail], dependencies=[conditional_get(*COHORT_COLLECTIONS)])
 async def get_high_risk_students():
     """Get all high-risk students with details"""
-    high_risk_students = []
+    if cohort_snapshot.is_ready:
+        rows = cohort_snapshot.filter(risk_status="High")
+        return [cohort_snapshot.to_detail(row) for row in rows]
     
     predictions = await prediction_collection.find(
         {"risk_status": "High"}
     ).to_list(length=None)
     
-    for prediction in predictions:
-        student = await student_collection.find_one(
-            {"_id": ObjectId(prediction["student_id"])}
+    # Fetch the students and their records in bulk rather than per prediction
+    student_ids = [prediction["student_id"] for prediction in predictions]
+    students = {
+        str(student["_id"]): student
+        async for student in student_collection.find(
+            {"_id": {"$in": [ObjectId(sid) for sid in student_ids if ObjectId.is_valid(sid)]}}
         )
-        
+    }
+    assessment_avgs, attendance_avgs = await _averages_by_student(student_ids)
+    
+    high_risk_students = []
+    for prediction in predictions:
+        student = students.get(prediction["student_id"])
         if student:
-            # Get latest assessment average
-            assessments = []
-            async for assessment in assessment_collection.find(
-                {"student_id": prediction["student_id"]}
-            ):
-                assessments.append(assessment)
-            
-            assessment_avg = 0
-            if assessments:
-                scores = [a["test_score"] + a["assignment_score"] + a["exam_score"] 
-                         for a in assessments]
-                assessment_avg = sum(scores) / len(scores) if scores else 0
-            
-            # Get attendance average
-            attendances = []
-            async for attendance in attendance_collection.find(
-                {"student_id": prediction["student_id"]}
-            ):
-                attendances.append(attendance)
-            
-            attendance_avg = 0
-            if attendances:
-                attendance_avg = sum(a["attendance_percentage"] for a in attendances) / len(attendances)
-            
             high_risk_students.append(
                 StudentRiskDetail(
                     student_id=prediction["student_id"],
@@ -82,21 +133,45 @@ async def get_high_risk_students():
                     department=student["department"],
                     predicted_score=prediction["predicted_score"],
                     risk_status=prediction["risk_status"],
-                    attendance_percentage=attendance_avg,
-                    assessment_average=assessment_avg
+                    attendance_percentage=attendance_avgs.get(prediction["student_id"], 0),
+                    assessment_average=assessment_avgs.get(prediction["student_id"], 0)
                 )
             )
     
     return high_risk_students
 
-@router.get("/students", response_model=List[StudentRiskDetail])
+@router.get("/students", response_model=List[StudentRiskDetail], dependencies=[conditional_get(*COHORT_COLLECTIONS)])
 async def get_all_students_with_risk(
     search: Optional[str] = None,
     level: Optional[int] = None,
-    department: Optional[str] = None
+    department: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False
 ):
     """Get all students with their risk status, with optional filters"""
-    result = []
+    _, students = await _students_with_risk(search, level, department, sort_by, descending)
+    return students
+
+async def _students_with_risk(search=None, level=None, department=None, sort_by=None, descending=False,
+                              offset=0, limit=None):
+    """Students with a prediction, filtered and sorted. Returns (total, the requested page).
+
+    Assessment and attendance averages are only fetched for the page, unless
+    the sort needs them for every student.
+    """
+    if sort_by and sort_by not in SORTABLE_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {SORTABLE_COLUMNS}")
+    end = None if limit is None else offset + limit
+    
+    if cohort_snapshot.is_ready:
+        rows = cohort_snapshot.filter(search=search, level=level, department=department)
+        if sort_by:
+            rows = cohort_snapshot.sort(rows, sort_by, descending)
+        return len(rows), [cohort_snapshot.to_detail(row) for row in rows[offset:end]]
+    
+    field = DETAIL_SORT_FIELDS.get(sort_by) if sort_by else None
+    if sort_by and field is None:
+        raise HTTPException(status_code=400, detail="Sorting by this column requires the cohort snapshot")
     
     # Build query for students
     student_query = {}
@@ -111,56 +186,216 @@ async def get_all_students_with_risk(
         student_query["department"] = {"$regex": department, "$options": "i"}
     
     students = await student_collection.find(student_query).to_list(length=None)
+    student_ids = [str(student["_id"]) for student in students]
     
-    for student in students:
-        student_id = str(student["_id"])
-        
-        # Get latest prediction
-        prediction = await prediction_collection.find_one(
-            {"student_id": student_id},
-            sort=[("created_at", -1)]
+    # Latest prediction per student, in one query
+    latest_predictions = {}
+    async for prediction in prediction_collection.find(
+        {"student_id": {"$in": student_ids}}
+    ).sort("created_at", 1):
+        latest_predictions[prediction["student_id"]] = prediction
+    
+    rows = [
+        (student_id, student, latest_predictions[student_id])
+        for student_id, student in zip(student_ids, students)
+        if student_id in latest_predictions
+    ]
+    
+    def detail(row, assessment_avgs, attendance_avgs):
+        student_id, student, prediction = row
+        return StudentRiskDetail(
+            student_id=student_id,
+            student_name=student["name"],
+            matric_no=student["matric_no"],
+            level=student["level"],
+            department=student["department"],
+            predicted_score=prediction["predicted_score"],
+            risk_status=prediction["risk_status"],
+            attendance_percentage=attendance_avgs.get(student_id, 0),
+            assessment_average=assessment_avgs.get(student_id, 0)
         )
-        
-        if prediction:
-            # Get latest assessment average
-            assessments = []
-            async for assessment in assessment_collection.find({"student_id": student_id}):
-                assessments.append(assessment)
-            
-            assessment_avg = 0
-            if assessments:
-                scores = [a["test_score"] + a["assignment_score"] + a["exam_score"] 
-                         for a in assessments]
-                assessment_avg = sum(scores) / len(scores) if scores else 0
-            
-            # Get attendance average
-            attendances = []
-            async for attendance in attendance_collection.find({"student_id": student_id}):
-                attendances.append(attendance)
-            
-            attendance_avg = 0
-            if attendances:
-                attendance_avg = sum(a["attendance_percentage"] for a in attendances) / len(attendances)
-            
-            result.append(
-                StudentRiskDetail(
-                    student_id=student_id,
-                    student_name=student["name"],
-                    matric_no=student["matric_no"],
-                    level=student["level"],
-                    department=student["department"],
-                    predicted_score=prediction["predicted_score"],
-                    risk_status=prediction["risk_status"],
-                    attendance_percentage=attendance_avg,
-                    assessment_average=assessment_avg
-                )
-            )
     
-    return result
+    if field in ("attendance_percentage", "assessment_average"):
+        # Sorting on an average needs it for every student
+        assessment_avgs, attendance_avgs = await _averages_by_student([row[0] for row in rows])
+        result = [detail(row, assessment_avgs, attendance_avgs) for row in rows]
+        result.sort(key=lambda d: getattr(d, field), reverse=descending)
+        return len(result), result[offset:end]
+    
+    if field:
+        keys = {
+            "student_id": lambda row: row[0],
+            "student_name": lambda row: row[1]["name"],
+            "matric_no": lambda row: row[1]["matric_no"],
+            "level": lambda row: row[1]["level"],
+            "department": lambda row: row[1]["department"],
+            "predicted_score": lambda row: row[2]["predicted_score"]
+        }
+        rows.sort(key=keys[field], reverse=descending)
+    page = rows[offset:end]
+    assessment_avgs, attendance_avgs = await _averages_by_student([row[0] for row in page])
+    return len(rows), [detail(row, assessment_avgs, attendance_avgs) for row in page]
+
+@router.get("/percentiles")
+async def get_percentiles(
+    column: str = "predicted_score",
+    q: str = "10,25,50,75,90",
+    level: Optional[int] = None,
+    department: Optional[str] = None
+):
+    """Get percentiles of a numeric cohort column (requires the cohort snapshot)"""
+    if not cohort_snapshot.is_ready:
+        raise HTTPException(status_code=503, detail="Cohort snapshot is not enabled or not built yet")
+    if column not in NUMERIC_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"column must be one of {NUMERIC_COLUMNS}")
+    try:
+        percentiles = [float(p) for p in q.split(",")]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="q must be a comma-separated list of numbers")
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise HTTPException(status_code=400, detail="Percentiles must be between 0 and 100")
+    
+    rows = cohort_snapshot.filter(level=level, department=department)
+    return {
+        "column": column,
+        "count": int(len(rows)),
+        "percentiles": cohort_snapshot.percentiles(column, percentiles, rows)
+    }
 
 @router.get("/model-metrics")
 async def get_model_metrics():
-    """Get model evaluation metrics"""
-    if prediction_model.metrics:
-        return prediction_model.metrics
-    return {"message": "Model metrics not available. Train the model first."}
\ No newline at end of file
+    """Get k-fold cross-validated model metrics (cached per data version)"""
+    return await _model_metrics()
+
+async def _model_metrics():
+    metrics = await model_evaluator.metrics_payload()
+    if metrics:
+        return metrics
+    return {"message": "Model metrics not available. Train the model first."}
+
+@router.get("/overview", response_model=DashboardOverview)
+async def get_dashboard_overview(
+    students_limit: int = Query(OVERVIEW_STUDENTS_LIMIT, ge=0, le=OVERVIEW_STUDENTS_MAX),
+    students_offset: int = Query(0, ge=0),
+    search: Optional[str] = None,
+    level: Optional[int] = None,
+    department: Optional[str] = None,
+    sort_by: Optional[str] = None,
+    descending: bool = False,
+    current_user = Depends(get_current_active_user)  # One authentication for every section
+):
+    """Statistics, model metrics and the first page of students in one response.
+
+    The sections are computed concurrently. A section that fails is returned
+    as null with its error, so the others still render.
+    """
+    sections = ["statistics", "model_metrics", "students"]
+    results = await asyncio.gather(
+        _risk_statistics(),
+        _model_metrics(),
+        _students_with_risk(search, level, department, sort_by, descending, students_offset, students_limit),
+        return_exceptions=True
+    )
+    overview = {"errors": {}}
+    for section, result in zip(sections, results):
+        if isinstance(result, HTTPException):
+            raise result
+        if isinstance(result, Exception):
+            print(f"❌ Dashboard overview section '{section}' failed: {result}")
+            overview[section] = None
+            overview["errors"][section] = str(result)
+        else:
+            overview[section] = result
+    if overview["students"] is not None:
+        total, items = overview["students"]
+        overview["students"] = StudentPage(total=total, offset=students_offset, limit=students_limit, items=items)
+    return overview
+
+def _with_course(summary, course):
+    return {**summary, "course_code": course.get("course_code"), "course_title": course.get("course_title")}
+
+@router.get("/courses", response_model=List[CourseRiskSummary])
+async def get_course_risk_summaries(
+    semester: Optional[str] = None,
+    sort_by: str = "high_risk",
+    descending: bool = True,
+    limit: Optional[int] = Query(None, ge=1),
+    current_user = Depends(get_current_active_user)
+):
+    """Scores, attendance and risk distribution of every course with enrollments, most at-risk first"""
+    if sort_by not in COURSE_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort_by must be one of {COURSE_SORT_FIELDS}")
+    summaries = await course_analytics.all_courses(semester)
+    courses = {
+        str(course["_id"]): course
+        async for course in course_collection.find({}, {"course_code": 1, "course_title": 1})
+    }
+    # Enrollments of deleted courses are left out until compaction removes them
+    result = [_with_course(s, courses[s["course_id"]]) for s in summaries if s["course_id"] in courses]
+    # Courses without a value for the field (no assessments yet) go last
+    result.sort(key=lambda s: s[sort_by] if s[sort_by] is not None else 0, reverse=descending)
+    result.sort(key=lambda s: s[sort_by] is None)
+    return result[:limit]
+
+@router.get("/courses/{course_id}", response_model=CourseRiskSummary)
+async def get_course_risk_summary(
+    course_id: str,
+    semester: Optional[str] = None,
+    current_user = Depends(get_current_active_user)
+):
+    """Scores, attendance and risk distribution of one course's enrolled students"""
+    if not ObjectId.is_valid(course_id):
+        raise HTTPException(status_code=400, detail="Invalid course ID")
+    course = await course_collection.find_one({"_id": ObjectId(course_id)}, {"course_code": 1, "course_title": 1})
+    if not course:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return _with_course(await course_analytics.course(course_id, semester), course)
+
+@router.post("/events/ticket")
+async def create_event_ticket(current_user: TokenData = Depends(get_current_token_user)):
+    """Single-use ticket for opening /events, which EventSource cannot send a token header to"""
+    if not event_hub.enabled:
+        raise HTTPException(status_code=404, detail="Live updates are disabled")
+    ticket = await stream_tickets.issue(current_user)
+    return {"ticket": ticket, "expires_in": STREAM_TICKET_SECONDS}
+
+@router.get("/events")
+async def stream_dashboard_events(request: Request, ticket: Optional[str] = None, last_event_id: Optional[int] = None):
+    """Server-sent events with new predictions and the change they make to the risk statistics.
+
+    Browsers pass a ``ticket`` from POST /events/ticket, other clients may send
+    their bearer token. A client that reconnects with Last-Event-ID (or
+    ``last_event_id`` when it opens a new stream) gets the events it missed,
+    or a ``resync`` event telling it to reload. The stream ends when its token
+    is revoked, expires or its user is disabled.
+    """
+    scheme, _, header_token = request.headers.get("authorization", "").partition(" ")
+    if ticket:
+        claims = await stream_tickets.redeem(ticket)
+        if claims is None:
+            raise credentials_exception
+        username, jti, expires_at = claims["username"], claims["jti"], claims["token_expires_at"]
+    elif scheme.lower() == "bearer" and header_token:
+        token_data = await get_current_token_user(header_token)
+        username, jti, expires_at = token_data.username, token_data.jti, token_data.expires_at
+    else:
+        raise credentials_exception
+    if not await is_still_authorized(username, jti, expires_at):
+        raise credentials_exception
+    if not event_hub.enabled:
+        raise HTTPException(status_code=404, detail="Live updates are disabled")
+    
+    header_id = request.headers.get("last-event-id", "")
+    if header_id.isdigit():
+        last_event_id = int(header_id)
+    await event_hub.resume()
+    subscriber = event_hub.subscribe(last_event_id)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many open event streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        event_hub.stream(subscriber, authorized=lambda: is_still_authorized(username, jti, expires_at)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Also runs when the client goes away before the stream starts
+        background=BackgroundTask(event_hub.unsubscribe, subscriber)
+    )
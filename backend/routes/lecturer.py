@@ -7,12 +7,16 @@ from database import (
     assessment_helper, attendance_helper
 )
 from models import Assessment, Attendance, AssessmentResponse, AttendanceResponse
-from routes.auth import require_role, get_current_active_user
+from routes.auth import require_role, get_current_token_user
+from services.snapshot import cohort_snapshot
+from services.data_version import data_versions, conditional_get
+from services.course_analytics import course_data
+from ml.online import online_trainer
 
 router = APIRouter(prefix="/lecturer", tags=["lecturer"])
 
 # Both admin and lecturer can access
-async def get_current_lecturer_or_admin(current_user = Depends(get_current_active_user)):
+async def get_current_lecturer_or_admin(current_user = Depends(get_current_token_user)):
     if current_user.role not in ["admin", "lecturer"]:
         raise HTTPException(status_code=403, detail="Access denied")
     return current_user
@@ -34,9 +38,12 @@ async def create_assessment(
     assessment_dict = assessment.dict()
     result = await assessment_collection.insert_one(assessment_dict)
     new_assessment = await assessment_collection.find_one({"_id": result.inserted_id})
+    await cohort_snapshot.refresh_student(assessment.student_id)
+    await online_trainer.mark_changed(assessment.student_id)
+    await data_versions.bump("assessments", course_data("assessments", assessment.course_id))
     return assessment_helper(new_assessment)
 
-@router.get("/assessments/", response_model=List[AssessmentResponse])
+@router.get("/assessments/", response_model=List[AssessmentResponse], dependencies=[conditional_get("assessments")])
 async def get_all_assessments():
     assessments = []
     async for assessment in assessment_collection.find():
@@ -59,12 +66,21 @@ async def update_assessment(assessment_id: str, assessment: Assessment):
         raise HTTPException(status_code=400, detail="Invalid assessment ID")
     
     assessment_dict = assessment.dict()
-    result = await assessment_collection.update_one(
+    previous = await assessment_collection.find_one_and_update(
         {"_id": ObjectId(assessment_id)}, {"$set": assessment_dict}
     )
     
-    if result.modified_count == 1:
+    if previous and any(previous.get(k) != v for k, v in assessment_dict.items()):
         updated_assessment = await assessment_collection.find_one({"_id": ObjectId(assessment_id)})
+        # The student may have changed, so refresh both the old and the new one
+        await cohort_snapshot.refresh_student(previous["student_id"])
+        if assessment.student_id != previous["student_id"]:
+            await cohort_snapshot.refresh_student(assessment.student_id)
+        await online_trainer.mark_changed(previous["student_id"], assessment.student_id)
+        # The course may have changed too
+        await data_versions.bump(
+            "assessments", *{course_data("assessments", previous["course_id"]), course_data("assessments", assessment.course_id)}
+        )
         return assessment_helper(updated_assessment)
     
     raise HTTPException(status_code=404, detail="Assessment not found")
@@ -74,8 +90,11 @@ async def delete_assessment(assessment_id: str):
     if not ObjectId.is_valid(assessment_id):
         raise HTTPException(status_code=400, detail="Invalid assessment ID")
     
-    result = await assessment_collection.delete_one({"_id": ObjectId(assessment_id)})
-    if result.deleted_count == 1:
+    deleted = await assessment_collection.find_one_and_delete({"_id": ObjectId(assessment_id)})
+    if deleted:
+        await cohort_snapshot.refresh_student(deleted["student_id"])
+        await online_trainer.mark_changed(deleted["student_id"])
+        await data_versions.bump("assessments", course_data("assessments", deleted["course_id"]))
         return {"message": "Assessment deleted successfully"}
     
     raise HTTPException(status_code=404, detail="Assessment not found")
@@ -95,9 +114,12 @@ async def create_attendance(attendance: Attendance):
     attendance_dict = attendance.dict()
     result = await attendance_collection.insert_one(attendance_dict)
     new_attendance = await attendance_collection.find_one({"_id": result.inserted_id})
+    await cohort_snapshot.refresh_student(attendance.student_id)
+    await online_trainer.mark_changed(attendance.student_id)
+    await data_versions.bump("attendance", course_data("attendance", attendance.course_id))
     return attendance_helper(new_attendance)
 
-@router.get("/attendance/", response_model=List[AttendanceResponse])
+@router.get("/attendance/", response_model=List[AttendanceResponse], dependencies=[conditional_get("attendance")])
 async def get_all_attendance():
     attendances = []
     async for attendance in attendance_collection.find():
@@ -120,12 +142,21 @@ async def update_attendance(attendance_id: str, attendance: Attendance):
         raise HTTPException(status_code=400, detail="Invalid attendance ID")
     
     attendance_dict = attendance.dict()
-    result = await attendance_collection.update_one(
+    previous = await attendance_collection.find_one_and_update(
         {"_id": ObjectId(attendance_id)}, {"$set": attendance_dict}
     )
     
-    if result.modified_count == 1:
+    if previous and any(previous.get(k) != v for k, v in attendance_dict.items()):
         updated_attendance = await attendance_collection.find_one({"_id": ObjectId(attendance_id)})
+        # The student may have changed, so refresh both the old and the new one
+        await cohort_snapshot.refresh_student(previous["student_id"])
+        if attendance.student_id != previous["student_id"]:
+            await cohort_snapshot.refresh_student(attendance.student_id)
+        await online_trainer.mark_changed(previous["student_id"], attendance.student_id)
+        # The course may have changed too
+        await data_versions.bump(
+            "attendance", *{course_data("attendance", previous["course_id"]), course_data("attendance", attendance.course_id)}
+        )
         return attendance_helper(updated_attendance)
     
     raise HTTPException(status_code=404, detail="Attendance not found")
@@ -135,8 +166,11 @@ async def delete_attendance(attendance_id: str):
     if not ObjectId.is_valid(attendance_id):
         raise HTTPException(status_code=400, detail="Invalid attendance ID")
     
-    result = await attendance_collection.delete_one({"_id": ObjectId(attendance_id)})
-    if result.deleted_count == 1:
+    deleted = await attendance_collection.find_one_and_delete({"_id": ObjectId(attendance_id)})
+    if deleted:
+        await cohort_snapshot.refresh_student(deleted["student_id"])
+        await online_trainer.mark_changed(deleted["student_id"])
+        await data_versions.bump("attendance", course_data("attendance", deleted["course_id"]))
         return {"message": "Attendance deleted successfully"}
     
     raise HTTPException(status_code=404, detail="Attendance not found")
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from bson import ObjectId
 from typing import List
 from database import (
@@ -6,33 +6,95 @@ from database import (
     attendance_collection, prediction_collection,
     prediction_helper
 )
-from models import Prediction
+from models import Prediction, ScenarioRequest
 from ml.model import prediction_model
+from ml.evaluation import model_evaluator
+from ml.dataset import load_training_data
+from ml.scenario import simulate
+from ml.online import online_trainer
+from ml.registry import model_registry
+from ml.scoring import score_students, PREDICTED, UNCHANGED
+from services.snapshot import cohort_snapshot
+from services.data_version import data_versions, conditional_get
+from services.pubsub import event_hub
+from services.leases import SingleFlight
+from services import sharding
+from services.metrics import metrics as api_metrics
 from datetime import datetime
 import os
+import asyncio
 
 router = APIRouter(prefix="/prediction", tags=["prediction"])
 
+# Predictions skipped because their inputs and model version had not changed
+fingerprint_stats = {"hits": 0, "misses": 0}
+
+def _is_unchanged(existing, input_hash, model_version):
+    return (
+        existing is not None
+        and existing.get("input_hash") == input_hash
+        and existing.get("model_version") == model_version
+    )
+
+# Predictions replaced per delete_many/insert_many pair during generate-all
+PREDICTION_WRITE_BATCH = int(os.getenv("PREDICTION_WRITE_BATCH", 1000))
+
+# Concurrent train and generate-all requests, on any worker, share one run
+train_flight = SingleFlight("prediction-train")
+# A generate-all nobody waits for any more stops after its current batch; the predictions
+# already written stay, and the next run skips them by their fingerprints
+generate_all_flight = SingleFlight("prediction-generate-all", cancellable=True)
+online_flight = SingleFlight("prediction-train-incremental")
+
+async def _train():
+    # Fit on the stored records when there are any; otherwise fall back to the rules
+    data = await load_training_data()
+    if len(data["y"]):
+        metrics = await asyncio.to_thread(prediction_model.train_model, data["X"], data["y"])
+    else:
+        metrics = prediction_model.train_model()
+    # Workers on every host switch to the new model through MongoDB
+    await model_registry.publish()
+    return {
+        "message": "Model trained successfully",
+        "metrics": metrics,
+        "config": {
+            "samples": int(os.getenv("N_SAMPLES", 1000)),
+            "seed": int(os.getenv("RANDOM_SEED", 42)),
+            "thresholds": {
+                "high": float(os.getenv("HIGH_RISK_THRESHOLD", 0.65)),
+                "medium": float(os.getenv("MEDIUM_RISK_THRESHOLD", 0.45))
+            }
+        }
+    }
+
+async def _reload_trained_model(stored):
+    # Another worker trained and published the model; switch to it now rather than at the next sync
+    await model_registry.sync()
+    return stored
+
 @router.post("/train")
 async def train_model():
     """Train the prediction model"""
     try:
-        metrics = prediction_model.train_model()
-        return {
-            "message": "Model trained successfully",
-            "metrics": metrics,
-            "config": {
-                "samples": int(os.getenv("N_SAMPLES", 1000)),
-                "seed": int(os.getenv("RANDOM_SEED", 42)),
-                "thresholds": {
-                    "high": float(os.getenv("HIGH_RISK_THRESHOLD", 0.65)),
-                    "medium": float(os.getenv("MEDIUM_RISK_THRESHOLD", 0.45))
-                }
-            }
-        }
+        return await train_flight.run(_train, remote_result=_reload_trained_model)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/train/incremental")
+async def train_incremental(compare: bool = False):
+    """Update the online model with the students whose records changed since the last update"""
+    try:
+        return await online_flight.run(lambda: online_trainer.update(compare=compare))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/train/incremental")
+async def get_incremental_status():
+    """Get the online model's progress and its latest comparison with a full retrain"""
+    await online_trainer.load()
+    return online_trainer.status()
+
 @router.get("/thresholds")
 async def get_thresholds():
     """Get current risk thresholds"""
@@ -43,11 +105,45 @@ async def get_thresholds():
 
 @router.get("/metrics")
 async def get_model_metrics():
-    """Get model evaluation metrics"""
-    if prediction_model.metrics:
-        return prediction_model.metrics
+    """Get k-fold cross-validated model metrics (cached per data version)"""
+    metrics = await model_evaluator.metrics_payload()
+    if metrics:
+        return metrics
     return {"message": "Model not trained yet"}
 
+@router.post("/scenario")
+async def simulate_scenario(scenario: ScenarioRequest):
+    """Score a student or cohort over a grid of attendance, test and assignment adjustments"""
+    match = None
+    if scenario.student_ids is not None:
+        if not all(ObjectId.is_valid(s) for s in scenario.student_ids):
+            raise HTTPException(status_code=400, detail="Invalid student ID")
+        match = {"student_id": {"$in": scenario.student_ids}}
+    
+    data = await load_training_data(match)
+    if len(data["student_ids"]) == 0:
+        raise HTTPException(
+            status_code=400,
+            detail="Insufficient data for prediction. Need both assessments and attendance records."
+        )
+    
+    grid = {
+        name: axis.dict()
+        for name, axis in (
+            ("attendance", scenario.attendance),
+            ("test", scenario.test),
+            ("assignment", scenario.assignment)
+        )
+        if axis is not None
+    }
+    try:
+        # Large grids take a noticeable amount of CPU, so keep them off the event loop
+        result = await asyncio.to_thread(simulate, data["X"], grid, scenario.model)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    result["student_ids"] = data["student_ids"] if len(data["student_ids"]) <= 100 else None
+    return result
+
 @router.post("/generate/{student_id}")
 async def generate_prediction(student_id: str):
     """Generate prediction for a specific student"""
@@ -75,6 +171,15 @@ async def generate_prediction(student_id: str):
             detail="Insufficient data for prediction. Need both assessments and attendance records."
         )
     
+    # Nothing to do if the inputs and model are the same as for the stored prediction
+    input_hash = prediction_model.input_fingerprint(assessments, attendances)
+    model_version = prediction_model.version
+    existing = await prediction_collection.find_one({"student_id": student_id}, sort=[("created_at", -1)])
+    if _is_unchanged(existing, input_hash, model_version):
+        fingerprint_stats["hits"] += 1
+        return prediction_helper(existing)
+    fingerprint_stats["misses"] += 1
+    
     # Calculate metrics
     metrics = prediction_model.calculate_student_metrics(student_id, assessments, attendances)
     if not metrics:
@@ -92,7 +197,9 @@ async def generate_prediction(student_id: str):
     prediction = Prediction(
         student_id=student_id,
         predicted_score=prediction_result['predicted_score'],
-        risk_status=prediction_result['risk_status']
+        risk_status=prediction_result['risk_status'],
+        input_hash=input_hash,
+        model_version=model_version
     )
     
     # Delete old predictions for this student
@@ -104,87 +211,177 @@ async def generate_prediction(student_id: str):
     result = await prediction_collection.insert_one(prediction_dict)
     
     new_prediction = await prediction_collection.find_one({"_id": result.inserted_id})
+    cohort_snapshot.set_prediction(student_id, new_prediction["predicted_score"], new_prediction["risk_status"])
+    await data_versions.bump("predictions")
+    await event_hub.publish_predictions([new_prediction], {student_id: existing} if existing else {})
     return prediction_helper(new_prediction)
 
 @router.post("/generate-all")
 async def generate_all_predictions():
     """Generate predictions for all students with sufficient data"""
+    return await generate_all_flight.run(
+        _generate_all,
+        # The prediction list can be large, so other workers re-read it instead
+        store=lambda result: {k: v for k, v in result.items() if k != "predictions"},
+        remote_result=_with_all_predictions
+    )
+
+async def _with_all_predictions(summary):
+    predictions = [prediction_helper(p) async for p in prediction_collection.find()]
+    return {**(summary or {}), "predictions": predictions}
+
+async def _generate_all():
+    api_metrics.generation_started()
+    try:
+        return await _generate_all_students()
+    finally:
+        api_metrics.generation_finished()
+
+async def _group_by_student(collection):
+    grouped = {}
+    async for record in collection.find():
+        grouped.setdefault(record["student_id"], []).append(record)
+    return grouped
+
+async def _save_batch(batch, predictions, existing_predictions):
+    documents = [document for _, document in batch]
+    try:
+        await prediction_collection.delete_many(
+            {"student_id": {"$in": [document["student_id"] for document in documents]}}
+        )
+        result = await prediction_collection.insert_many(documents)
+    except Exception as e:
+        print(f"❌ Error saving {len(documents)} predictions: {str(e)}")
+        return
+    for (position, document), inserted_id in zip(batch, result.inserted_ids):
+        document["_id"] = inserted_id
+        predictions[position] = prediction_helper(document)
+        cohort_snapshot.set_prediction(
+            document["student_id"], document["predicted_score"], document["risk_status"]
+        )
+        api_metrics.students_scored()
+    await data_versions.bump("predictions")
+    await event_hub.publish_predictions(documents, existing_predictions)
+    print(f"✅ Saved {len(documents)} predictions")
+
+async def _generate_all_students():
     predictions = []
+    cached = 0
     students = await student_collection.find().to_list(length=None)
     
+    # Latest stored prediction per student, to skip students whose inputs are unchanged
+    existing_predictions = {}
+    async for existing in prediction_collection.find().sort("created_at", 1):
+        existing_predictions[existing["student_id"]] = existing
+    model_version = prediction_model.version
+    
+    # One query per collection instead of two per student
+    all_assessments = await _group_by_student(assessment_collection)
+    all_attendances = await _group_by_student(attendance_collection)
+    
     print(f"🔍 Generating predictions for {len(students)} students")
     
-    for student in students:
-        student_id = str(student["_id"])
-        student_name = student["name"]
-        
-        print(f"\n📝 Processing student: {student_name} (ID: {student_id})")
-        
-        # Get student's assessments and attendance
-        assessments = []
-        async for assessment in assessment_collection.find({"student_id": student_id}):
-            assessments.append(assessment)
-        
-        attendances = []
-        async for attendance in attendance_collection.find({"student_id": student_id}):
-            attendances.append(attendance)
-        
-        print(f"Found {len(assessments)} assessments and {len(attendances)} attendance records")
-        
-        if assessments and attendances:
-            try:
-                # Calculate metrics
-                metrics = prediction_model.calculate_student_metrics(
-                    student_id, assessments, attendances
-                )
-                
-                print(f"Calculated metrics: {metrics}")
-                
-                if metrics:
-                    # Generate prediction
-                    prediction_result = prediction_model.predict_risk(
-                        metrics['attendance'],
-                        metrics['test_avg'],
-                        metrics['assignment_avg'],
-                        metrics['previous_gpa']
-                    )
-                    
-                    print(f"Prediction result: {prediction_result}")
-                    
-                    # Save prediction
-                    prediction = Prediction(
-                        student_id=student_id,
-                        predicted_score=prediction_result['predicted_score'],
-                        risk_status=prediction_result['risk_status']
-                    )
-                    
-                    # Delete old predictions for this student
-                    await prediction_collection.delete_many({"student_id": student_id})
-                    
-                    # Insert new prediction
-                    prediction_dict = prediction.dict()
-                    prediction_dict['created_at'] = datetime.now()
-                    result = await prediction_collection.insert_one(prediction_dict)
-                    
-                    new_prediction = await prediction_collection.find_one(
-                        {"_id": result.inserted_id}
-                    )
-                    predictions.append(prediction_helper(new_prediction))
-                    
-                    print(f"✅ Saved prediction for {student_name}")
-                    
-            except Exception as e:
-                print(f"❌ Error predicting for student {student_id}: {str(e)}")
+    # Same batch scoring as the shards of a sharded generate-all, off the event loop
+    while True:
+        outcomes, new_documents = await asyncio.to_thread(
+            score_students, [str(student["_id"]) for student in students],
+            all_assessments, all_attendances, existing_predictions, model_version
+        )
+        if prediction_model.version == model_version:
+            break
+        # A new model was synced while scoring; score again so each prediction names the model that made it
+        model_version = prediction_model.version
+    
+    # New predictions are written in batches once scored: (position in predictions, document)
+    pending = []
+    scored = iter(new_documents)
+    for student_id, outcome in outcomes.items():
+        if outcome == UNCHANGED:
+            fingerprint_stats["hits"] += 1
+            cached += 1
+            api_metrics.students_scored(outcome="unchanged")
+            predictions.append(prediction_helper(existing_predictions[student_id]))
+        elif outcome == PREDICTED:
+            fingerprint_stats["misses"] += 1
+            pending.append((len(predictions), next(scored)))
+            predictions.append(None)
         else:
-            print(f"⚠️ Insufficient data for {student_name}")
+            api_metrics.students_scored(outcome="insufficient")
+    print(f"📝 Scored {len(pending)} students, {cached} unchanged, "
+          f"{len(outcomes) - len(pending) - cached} with insufficient data")
+    
+    # Replace the old predictions of the scored students, one batch at a time
+    for start in range(0, len(pending), PREDICTION_WRITE_BATCH):
+        batch = pending[start:start + PREDICTION_WRITE_BATCH]
+        write = asyncio.ensure_future(_save_batch(batch, predictions, existing_predictions))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # Everyone waiting went away: stop between batches, never halfway through one
+            await write
+            print(f"🛑 Generate-all cancelled after {start + len(batch)} of {len(pending)} predictions")
+            raise
+    predictions = [p for p in predictions if p is not None]
     
     print(f"\n✅ Generated predictions for {len(predictions)} students")
     
     return {
         "message": f"Generated predictions for {len(predictions)} students",
+        "unchanged": cached,
         "predictions": predictions
     }
 
+@router.post("/generate-all/sharded")
+async def generate_all_sharded(
+    shards: int = Query(sharding.GENERATION_SHARDS, ge=1, le=sharding.GENERATION_MAX_SHARDS),
+    workers: int = Query(1, ge=0, le=sharding.GENERATION_MAX_WORKERS)
+):
+    """Start a generate-all split into _id-range shards that any worker can claim"""
+    job_id = await sharding.create_job(shards)
+    sharding.start_workers(job_id, workers)
+    return await sharding.job_progress(job_id)
+
+@router.post("/jobs/{job_id}/workers")
+async def join_generation_job(
+    job_id: str, workers: int = Query(1, ge=1, le=sharding.GENERATION_MAX_WORKERS)
+):
+    """Add workers in this process to a sharded generate-all job"""
+    progress = await sharding.job_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    sharding.start_workers(job_id, workers)
+    return progress
+
+@router.post("/jobs/{job_id}/retry")
+async def retry_generation_job(
+    job_id: str, workers: int = Query(1, ge=1, le=sharding.GENERATION_MAX_WORKERS)
+):
+    """Reset the failed shards of a job and work on them again"""
+    if await sharding.job_progress(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    reset = await sharding.retry_failed_shards(job_id)
+    if reset:
+        sharding.start_workers(job_id, workers)
+    return {"reset_shards": reset, **await sharding.job_progress(job_id)}
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(job_id: str):
+    """Get the aggregated progress of a sharded generate-all job"""
+    progress = await sharding.job_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return progress
+
+@router.get("/fingerprint-stats")
+async def get_fingerprint_stats():
+    """Get how often generation was skipped because inputs were unchanged"""
+    total = fingerprint_stats["hits"] + fingerprint_stats["misses"]
+    return {
+        **fingerprint_stats,
+        "hit_ratio": fingerprint_stats["hits"] / total if total else 0.0,
+        "model_version": prediction_model.version
+    }
+
 @router.get("/student/{student_id}")
 async def get_student_prediction(student_id: str):
     """Get the latest prediction for a student"""
@@ -201,7 +398,7 @@ async def get_student_prediction(student_id: str):
     
     raise HTTPException(status_code=404, detail="No prediction found for this student")
 
-@router.get("/all")
+@router.get("/all", dependencies=[conditional_get("predictions")])
 async def get_all_predictions():
     """Get all predictions"""
     predictions = []
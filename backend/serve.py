@@ -0,0 +1,204 @@
+"""Production server: several worker processes sharing one listening socket.
+
+    python serve.py                      # one worker per CPU core
+    WEB_CONCURRENCY=4 python serve.py
+
+The master process imports the app and loads the saved model once, then forks
+the workers, so they share those pages copy-on-write instead of each loading
+its own copy. Startup work that must happen once per launch (seeding the
+default users, training a model when none is saved) runs in one worker
+elected through a MongoDB lease; see run_startup_tasks in main.py.
+
+On SIGTERM or SIGINT every worker reports not ready on /ready for
+DRAIN_DELAY_SECONDS and ends its live update streams (clients reconnect to
+another worker), stops accepting connections, finishes in-flight requests
+for up to GRACEFUL_SHUTDOWN_SECONDS and runs the app's shutdown handler.
+A worker that dies is replaced.
+
+The model each worker serves is the one published in MongoDB (ml/registry.py),
+so workers here and on other hosts switch to a newly trained model within
+MODEL_SYNC_SECONDS; the preloaded file is only the starting point.
+
+Metrics are counted per worker process, and requests to the shared PORT
+reach whichever worker accepts them. Set METRICS_PORT to give worker slot i
+its own scrape target on METRICS_PORT + i, serving only /metrics (a
+replacement worker takes over the slot of the one it replaces). Configure
+one Prometheus target per port and sum across them, e.g.
+sum without (instance) (http_requests_total).
+"""
+import os
+import gc
+import sys
+import time
+import uuid
+import signal
+import threading
+from dotenv import load_dotenv
+import uvicorn
+
+# Load environment variables
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+# Worker processes; the event loop in each one uses a single core
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+# Seconds /ready reports 503 before a stopping worker closes its socket
+DRAIN_DELAY_SECONDS = float(os.getenv("DRAIN_DELAY_SECONDS", 2))
+# Seconds in-flight requests get to finish before they are cancelled
+GRACEFUL_SHUTDOWN_SECONDS = int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", 30))
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+# First of the per-worker /metrics ports (0 = none; /metrics on PORT then shows a random worker)
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+
+
+def preload():
+    """Import the app and load the saved model before the workers are forked"""
+    # One id for all workers of this launch, read by main.py when it is imported
+    os.environ.setdefault("SERVE_LAUNCH_ID", uuid.uuid4().hex)
+    import main
+    if main.prediction_model.load_model():
+        main.startup_state["model_loaded"] = True
+        main.startup_state["model_preloaded"] = True
+    # Keep the collector from touching (and so copying) the shared objects in every worker
+    gc.collect()
+    gc.freeze()
+    return main
+
+
+class WorkerServer(uvicorn.Server):
+    """uvicorn server that reports draining for a while before it stops accepting connections"""
+
+    def __init__(self, config, startup_state, on_drain=None):
+        super().__init__(config)
+        self.startup_state = startup_state
+        self.on_drain = on_drain
+        self.drain_timer = None
+
+    def handle_exit(self, sig, frame):
+        if DRAIN_DELAY_SECONDS <= 0 or self.should_exit:
+            return super().handle_exit(sig, frame)
+        if self.drain_timer is None:
+            self.startup_state["draining"] = True
+            if self.on_drain is not None:
+                self.on_drain()
+            self.drain_timer = threading.Timer(DRAIN_DELAY_SECONDS, super().handle_exit, (sig, frame))
+            self.drain_timer.start()
+        elif sig == signal.SIGINT:
+            # A second Ctrl+C skips the rest of the delay
+            self.drain_timer.cancel()
+            super().handle_exit(sig, frame)
+
+
+class MetricsPortApp:
+    """Serves the app on the shared port and only /metrics on the worker's own port"""
+
+    def __init__(self, app, metrics_port):
+        self.app = app
+        self.metrics_port = metrics_port
+
+    async def __call__(self, scope, receive, send):
+        server = scope.get("server")
+        if (scope["type"] != "lifespan" and server is not None and server[1] == self.metrics_port
+                and scope.get("path") != "/metrics"):
+            if scope["type"] == "http":
+                await send({"type": "http.response.start", "status": 404,
+                            "headers": [(b"content-type", b"text/plain")]})
+                await send({"type": "http.response.body", "body": b"Not Found"})
+            return
+        await self.app(scope, receive, send)
+
+
+def run_worker(main, sock, metrics_sock=None):
+    # Signal handlers installed by the master must not run in the worker
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    app, sockets = main.app, [sock]
+    if metrics_sock is not None:
+        app = MetricsPortApp(main.app, metrics_sock.getsockname()[1])
+        sockets.append(metrics_sock)
+    config = uvicorn.Config(
+        app, timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS, log_level=LOG_LEVEL
+    )
+    # Open event streams never finish on their own, so they are ended when draining starts
+    WorkerServer(config, main.startup_state, on_drain=main.event_hub.close).run(sockets=sockets)
+
+
+def serve(workers=WEB_CONCURRENCY):
+    if not hasattr(os, "fork"):
+        # No fork() on this platform: uvicorn spawns workers that each import and load everything
+        print("⚠️ fork() is not available, workers will not share the preloaded model")
+        uvicorn.run("main:app", host=HOST, port=PORT, workers=workers,
+                    timeout_graceful_shutdown=GRACEFUL_SHUTDOWN_SECONDS, log_level=LOG_LEVEL)
+        return 0
+
+    main = preload()
+    sock = uvicorn.Config(main.app, host=HOST, port=PORT).bind_socket()
+    # One metrics socket per worker slot, bound here so a replacement worker reuses it
+    metrics_socks = [
+        uvicorn.Config(main.app, host=HOST, port=METRICS_PORT + slot).bind_socket() if METRICS_PORT else None
+        for slot in range(workers)
+    ]
+    # pid -> (start time, slot)
+    children = {}
+    stopping = {"deadline": None}
+
+    def spawn(slot):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(main, sock, metrics_socks[slot])
+            except BaseException as e:
+                print(f"❌ Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = (time.monotonic(), slot)
+
+    def stop(sig, frame):
+        # The first signal drains the workers, a second one (another Ctrl+C) stops them without delay
+        forward = signal.SIGTERM if stopping["deadline"] is None else signal.SIGINT
+        if stopping["deadline"] is None:
+            print(f"🛑 Draining {len(children)} workers")
+            stopping["deadline"] = time.monotonic() + DRAIN_DELAY_SECONDS + GRACEFUL_SHUTDOWN_SECONDS + 5
+        for pid in children:
+            os.kill(pid, forward)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for slot in range(workers):
+        spawn(slot)
+    print(f"🌟 {workers} workers serving on {HOST}:{PORT} (master {os.getpid()}, "
+          f"model {'preloaded' if main.startup_state['model_preloaded'] else 'loaded by the workers'})")
+    if METRICS_PORT:
+        print(f"📊 Per-worker metrics on ports {METRICS_PORT}-{METRICS_PORT + workers - 1}")
+
+    while children:
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        if pid == 0:
+            if stopping["deadline"] is not None and time.monotonic() > stopping["deadline"]:
+                print(f"⚠️ Killing {len(children)} workers that did not stop in time")
+                for pid in children:
+                    os.kill(pid, signal.SIGKILL)
+                stopping["deadline"] = float("inf")
+            time.sleep(0.2)
+            continue
+        child = children.pop(pid, None)
+        if child is not None and stopping["deadline"] is None:
+            started, slot = child
+            print(f"⚠️ Worker {pid} exited with code {os.waitstatus_to_exitcode(status)}, starting a replacement")
+            # Do not spin when workers die right after starting
+            if time.monotonic() - started < 1:
+                time.sleep(1)
+            spawn(slot)
+    sock.close()
+    for metrics_sock in metrics_socks:
+        if metrics_sock is not None:
+            metrics_sock.close()
+    print("👋 All workers stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(serve())
@@ -0,0 +1,308 @@
+import os
+import json
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+from services.metrics import metrics
+
+# Load environment variables
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "True").lower() == "true"
+# Requests of a priority class running at once in one worker, and how many may wait for a slot
+INTERACTIVE_CONCURRENCY = int(os.getenv("INTERACTIVE_CONCURRENCY", 64))
+INTERACTIVE_QUEUE = int(os.getenv("INTERACTIVE_QUEUE", 256))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 4))
+BULK_QUEUE = int(os.getenv("BULK_QUEUE", 8))
+# Requests of one bulk route running at once, unless the route sets its own limit
+BULK_ROUTE_CONCURRENCY = int(os.getenv("BULK_ROUTE_CONCURRENCY", 2))
+# Seconds a request may wait for a slot before it is shed
+INTERACTIVE_QUEUE_WAIT_SECONDS = float(os.getenv("INTERACTIVE_QUEUE_WAIT_SECONDS", 5))
+BULK_QUEUE_WAIT_SECONDS = float(os.getenv("BULK_QUEUE_WAIT_SECONDS", 10))
+# Seconds a read request may run before it is cancelled, unless its response has started
+INTERACTIVE_DEADLINE_SECONDS = float(os.getenv("INTERACTIVE_DEADLINE_SECONDS", 15))
+BULK_DEADLINE_SECONDS = float(os.getenv("BULK_DEADLINE_SECONDS", 30))
+# Bulk requests are shed while the event loop lags more than this in consecutive samples
+ADMISSION_MAX_LAG_SECONDS = float(os.getenv("ADMISSION_MAX_LAG_SECONDS", 0.5))
+# One slow request delays a single sample; overload delays several in a row
+ADMISSION_LAG_SAMPLES = int(os.getenv("ADMISSION_LAG_SAMPLES", 2))
+
+# Only these are cancelled when the client goes away or the deadline passes; a write runs to
+# completion unless its route is cancel_on_disconnect
+SAFE_METHODS = ("GET", "HEAD")
+
+
+class Shed(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Limiter:
+    """Concurrency limit with a bounded first-in, first-out queue of waiting requests"""
+
+    def __init__(self, limit, queue):
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiters = deque()
+
+    async def acquire(self, timeout):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        if len(self.waiters) >= self.queue:
+            raise Shed("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise Shed("queue_timeout")
+        except BaseException:
+            # Cancelled after release() had handed us the slot: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+
+    def release(self):
+        # The slot goes straight to the next waiter, so nothing can overtake the queue
+        while self.waiters:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+class PriorityClass:
+    def __init__(self, name, concurrency=None, queue=0, wait=0, deadline=None, retry_after=1, managed=True):
+        self.name = name
+        self.limiter = Limiter(concurrency, queue) if concurrency else None
+        # Seconds a request may wait for a slot before it is shed
+        self.wait = wait
+        self.deadline = deadline
+        self.retry_after = retry_after
+        # Unmanaged classes pass straight through (cheap routes, long-lived streams)
+        self.managed = managed
+
+
+class Route:
+    def __init__(self, method, path, priority, concurrency=None, cancel_on_disconnect=False):
+        self.method = method
+        self.path = path
+        self.priority = priority
+        self.concurrency = concurrency
+        # Cancelled when the client goes away (the handler must stop cleanly); no deadline applies
+        self.cancel_on_disconnect = cancel_on_disconnect
+
+
+PRIORITIES = {
+    "critical": PriorityClass("critical", managed=False),
+    "stream": PriorityClass("stream", managed=False),
+    "interactive": PriorityClass(
+        "interactive", INTERACTIVE_CONCURRENCY, INTERACTIVE_QUEUE,
+        wait=INTERACTIVE_QUEUE_WAIT_SECONDS, deadline=INTERACTIVE_DEADLINE_SECONDS
+    ),
+    "bulk": PriorityClass(
+        "bulk", BULK_CONCURRENCY, BULK_QUEUE, wait=BULK_QUEUE_WAIT_SECONDS, deadline=BULK_DEADLINE_SECONDS, retry_after=10
+    )
+}
+
+# Routes not listed here are interactive
+ROUTES = [
+    # Called by every page, so never queued behind anything
+    Route("GET", "/auth/verify", "critical"),
+    Route("GET", "/auth/me", "critical"),
+    Route("POST", "/auth/token", "critical"),
+    Route("GET", "/health", "critical"),
+    Route("GET", "/ready", "critical"),
+    Route("GET", "/metrics", "critical"),
+    Route("GET", "/dashboard/events", "stream"),
+    # Callers of a running generate-all or train share its result, so they only wait. A generate-all
+    # stops after its current batch once all its callers have gone. Training is not cancelled: the
+    # fit runs in a thread that cannot be interrupted and then replaces this worker's model.
+    Route("POST", "/prediction/generate-all", "bulk", concurrency=BULK_CONCURRENCY, cancel_on_disconnect=True),
+    Route("POST", "/prediction/train", "bulk", concurrency=BULK_CONCURRENCY),
+    Route("POST", "/prediction/train/incremental", "bulk", concurrency=1),
+    Route("POST", "/prediction/scenario", "bulk"),
+    Route("POST", "/admin/maintenance/compact", "bulk", concurrency=1),
+    Route("POST", "/admin/enrollments/backfill", "bulk", concurrency=1),
+    # Unpaginated listings
+    Route("GET", "/prediction/all", "bulk"),
+    Route("GET", "/dashboard/students", "bulk"),
+    Route("GET", "/dashboard/high-risk", "bulk"),
+    Route("GET", "/dashboard/courses", "bulk"),
+    Route("GET", "/lecturer/assessments/", "bulk"),
+    Route("GET", "/lecturer/attendance/", "bulk"),
+    Route("GET", "/admin/students/", "bulk"),
+    Route("GET", "/admin/enrollments/", "bulk")
+]
+
+
+class AdmissionController:
+    """Priority class and concurrency limits of each route"""
+
+    def __init__(self, routes=ROUTES, priorities=PRIORITIES):
+        self.priorities = priorities
+        self.routes = {}
+        self.cancel_on_disconnect = {(r.method, r.path) for r in routes if r.cancel_on_disconnect}
+        for route in routes:
+            priority = priorities[route.priority]
+            concurrency = route.concurrency
+            if concurrency is None and route.priority == "bulk":
+                concurrency = BULK_ROUTE_CONCURRENCY
+            limiter = Limiter(concurrency, priority.limiter.queue) if concurrency and priority.managed else None
+            self.routes[(route.method, route.path)] = (priority, limiter)
+        self.default = (priorities["interactive"], None)
+
+    def classify(self, method, route):
+        return self.routes.get((method, route), self.default)
+
+    def overloaded(self):
+        """Whether bulk work should give way to interactive requests"""
+        interactive = self.priorities["interactive"].limiter
+        lags = list(metrics.recent_event_loop_lag)[-ADMISSION_LAG_SAMPLES:]
+        lagging = len(lags) == ADMISSION_LAG_SAMPLES and min(lags) > ADMISSION_MAX_LAG_SECONDS
+        return bool(interactive.waiters) or lagging
+
+    async def admit(self, priority, limiter):
+        """Take the route's and the class's slots, in that order. Returns what to release."""
+        if priority.name == "bulk" and self.overloaded():
+            raise Shed("overload")
+        acquired = []
+        try:
+            for candidate in (limiter, priority.limiter):
+                if candidate is not None:
+                    await candidate.acquire(priority.wait)
+                    acquired.append(candidate)
+        except BaseException:
+            for candidate in acquired:
+                candidate.release()
+            raise
+        return acquired
+
+    def stats(self):
+        return {
+            name: {"in_flight": p.limiter.active, "queued": len(p.limiter.waiters)}
+            for name, p in self.priorities.items() if p.limiter is not None
+        }
+
+
+async def _send_unavailable(send, retry_after, reason):
+    body = json.dumps({"detail": "Server is busy, please retry later", "reason": reason}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 503,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode())
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying priority classes, concurrency limits and deadlines.
+
+    A request waits in its route's and its class's queue for a free slot and
+    is answered 503 with Retry-After when the queue is full or the wait too
+    long. Bulk requests are also shed while interactive requests are queued
+    or the event loop lags, so the cheap routes stay responsive. A read
+    request is cancelled when the client disconnects, or when its deadline
+    passes before the response has started.
+    """
+
+    def __init__(self, app, controller=None):
+        self.app = app
+        self.controller = controller or admission_controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope["method"]
+        route = metrics.route_for(scope)
+        priority, limiter = self.controller.classify(method, route)
+        if not priority.managed:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            acquired = await self.controller.admit(priority, limiter)
+        except Shed as e:
+            self._count_shed(route, priority, e.reason)
+            await _send_unavailable(send, priority.retry_after, e.reason)
+            return
+        try:
+            if method in SAFE_METHODS:
+                await self._run_cancellable(scope, receive, send, route, priority, priority.deadline)
+            elif (method, route) in self.controller.cancel_on_disconnect:
+                await self._run_cancellable(scope, receive, send, route, priority, None)
+            else:
+                await self.app(scope, receive, send)
+        finally:
+            for candidate in acquired:
+                candidate.release()
+
+    def _count_shed(self, route, priority, reason):
+        metrics.inc("requests_shed_total", help="Requests rejected or cancelled by admission control",
+                    route=route, priority=priority.name, reason=reason)
+
+    async def _run_cancellable(self, scope, receive, send, route, priority, deadline):
+        """Run the request in a task that is cancelled when the client leaves or the deadline passes"""
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+        started = {"response": False}
+
+        async def read():
+            # Only a disconnect can follow the request body, so this ends when the client goes away
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def app_receive():
+            if disconnected.is_set() and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def app_send(message):
+            if message["type"] == "http.response.start":
+                started["response"] = True
+            await send(message)
+
+        reader = asyncio.create_task(read())
+        disconnect = asyncio.create_task(disconnected.wait())
+        task = asyncio.create_task(self.app(scope, app_receive, app_send))
+        try:
+            done, _ = await asyncio.wait({task, disconnect}, timeout=deadline,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if not done and started["response"]:
+                # Cancelling now would cut the body short; only a disconnect stops it from here on
+                done, _ = await asyncio.wait({task, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+            if task in done:
+                await task
+                return
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            if disconnect in done:
+                metrics.inc("requests_cancelled_total", help="Requests cancelled because the client went away",
+                            route=route)
+                return
+            self._count_shed(route, priority, "deadline")
+            await _send_unavailable(send, priority.retry_after, "deadline")
+        finally:
+            for helper in (reader, disconnect, task):
+                helper.cancel()
+            await asyncio.gather(reader, disconnect, task, return_exceptions=True)
+
+
+# Initialize global admission controller instance
+admission_controller = AdmissionController()
@@ -0,0 +1,186 @@
+import os
+import asyncio
+from datetime import datetime
+from bson import ObjectId
+from dotenv import load_dotenv
+from database import (
+    database, student_collection, course_collection,
+    enrollment_collection, assessment_collection,
+    attendance_collection, prediction_collection
+)
+from services.snapshot import cohort_snapshot
+from services.data_version import data_versions
+from services.leases import SingleFlight, lease_collection
+
+# Load environment variables
+load_dotenv()
+
+# How many dependent documents are removed per delete_many call
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 500))
+# Seconds between background orphan compactions (0 disables the job)
+ORPHAN_COMPACTION_INTERVAL = int(os.getenv("ORPHAN_COMPACTION_INTERVAL", 0))
+
+# Collections whose documents reference a student and/or a course by id
+STUDENT_DEPENDENTS = [enrollment_collection, assessment_collection, attendance_collection, prediction_collection]
+COURSE_DEPENDENTS = [enrollment_collection, assessment_collection, attendance_collection]
+
+# Result of the most recent compaction run
+last_compaction_report = None
+
+# One compaction at a time across workers and hosts
+compaction_flight = SingleFlight("orphan-compaction")
+
+
+async def delete_in_batches(collection, query):
+    """Delete every document matching query, CLEANUP_BATCH_SIZE ids at a time"""
+    deleted = 0
+    batch = []
+    async for document in collection.find(query, {"_id": 1}):
+        batch.append(document["_id"])
+        if len(batch) >= CLEANUP_BATCH_SIZE:
+            result = await collection.delete_many({"_id": {"$in": batch}})
+            deleted += result.deleted_count
+            batch = []
+    if batch:
+        result = await collection.delete_many({"_id": {"$in": batch}})
+        deleted += result.deleted_count
+    if deleted:
+        await data_versions.bump(collection.name)
+    return deleted
+
+
+async def cascade_delete_student(student_id):
+    """Remove everything that belongs to a deleted student"""
+    deleted = {}
+    for collection in STUDENT_DEPENDENTS:
+        deleted[collection.name] = await delete_in_batches(collection, {"student_id": student_id})
+    return deleted
+
+
+async def cascade_delete_course(course_id):
+    """Remove everything that belongs to a deleted course"""
+    affected_students = set()
+    for collection in (assessment_collection, attendance_collection):
+        affected_students.update(await collection.distinct("student_id", {"course_id": course_id}))
+
+    deleted = {}
+    for collection in COURSE_DEPENDENTS:
+        deleted[collection.name] = await delete_in_batches(collection, {"course_id": course_id})
+
+    # The averages of students who took the course have changed
+    for student_id in affected_students:
+        await cohort_snapshot.refresh_student(student_id)
+    return deleted
+
+
+async def _average_object_size(collection):
+    try:
+        stats = await database.command("collStats", collection.name)
+        return stats.get("avgObjSize", 0)
+    except Exception:
+        return 0
+
+
+async def _existing_ids(collection, ids):
+    """Those of the string ids in ``ids`` that exist in ``collection`` now"""
+    object_ids = [ObjectId(i) for i in ids if isinstance(i, str) and ObjectId.is_valid(i)]
+    if not object_ids:
+        return set()
+    return {str(d["_id"]) async for d in collection.find({"_id": {"$in": object_ids}}, {"_id": 1})}
+
+
+async def _still_orphaned(batch, checks_course):
+    """Drop the documents of a batch whose student or course was created after the scan began"""
+    students = await _existing_ids(student_collection, {d.get("student_id") for d in batch})
+    courses = await _existing_ids(course_collection, {d.get("course_id") for d in batch}) if checks_course else set()
+    return [
+        d["_id"] for d in batch
+        if d.get("student_id") not in students or (checks_course and d.get("course_id") not in courses)
+    ]
+
+
+async def compact_orphans(dry_run=False):
+    """Find dependent documents whose student or course no longer exists and purge them.
+
+    Returns a report with the number of orphans per collection and an estimate of
+    the reclaimed size (orphan count x average document size of the collection).
+    The parents of each batch are looked up again right before it is deleted,
+    so records of a student or course created during the scan are kept.
+    """
+    global last_compaction_report
+    started = datetime.now()
+
+    student_ids = {str(s["_id"]) async for s in student_collection.find({}, {"_id": 1})}
+    course_ids = {str(c["_id"]) async for c in course_collection.find({}, {"_id": 1})}
+
+    collections = {}
+    total_documents = 0
+    total_bytes = 0
+    for collection in STUDENT_DEPENDENTS:
+        checks_course = collection in COURSE_DEPENDENTS
+        projection = {"_id": 1, "student_id": 1, "course_id": 1}
+        orphans = []
+        async for document in collection.find({}, projection):
+            if document.get("student_id") not in student_ids:
+                orphans.append(document)
+            elif checks_course and document.get("course_id") not in course_ids:
+                orphans.append(document)
+
+        average_size = await _average_object_size(collection)
+        deleted = 0
+        if orphans and not dry_run:
+            for start in range(0, len(orphans), CLEANUP_BATCH_SIZE):
+                batch = await _still_orphaned(orphans[start:start + CLEANUP_BATCH_SIZE], checks_course)
+                if batch:
+                    result = await collection.delete_many({"_id": {"$in": batch}})
+                    deleted += result.deleted_count
+            if deleted:
+                await data_versions.bump(collection.name)
+
+        reclaimed = (len(orphans) if dry_run else deleted) * average_size
+        collections[collection.name] = {
+            "orphans": len(orphans),
+            "deleted": deleted,
+            "estimated_bytes": int(reclaimed)
+        }
+        total_documents += len(orphans) if dry_run else deleted
+        total_bytes += reclaimed
+
+    report = {
+        "dry_run": dry_run,
+        "started_at": started,
+        "duration_seconds": (datetime.now() - started).total_seconds(),
+        "collections": collections,
+        "total_documents": total_documents,
+        "estimated_reclaimed_bytes": int(total_bytes)
+    }
+    if not dry_run:
+        last_compaction_report = report
+    print(f"🧹 Orphan compaction: {total_documents} documents, ~{int(total_bytes)} bytes")
+    return report
+
+
+async def compact_orphans_once():
+    """Compact orphans unless another worker is already doing it, then share its report"""
+    return await compaction_flight.run(compact_orphans)
+
+
+async def _compacted_since(seconds):
+    lease = await lease_collection.find_one({"_id": compaction_flight.name})
+    finished = lease and lease.get("state") == "done" and lease.get("finished_at")
+    return bool(finished) and (datetime.utcnow() - finished).total_seconds() < seconds
+
+
+async def run_compaction_job(interval=ORPHAN_COMPACTION_INTERVAL):
+    """Background loop that compacts orphans every interval seconds.
+
+    Every worker runs the loop; a worker skips its turn when another one
+    compacted within the interval, so there is one compaction per interval.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await _compacted_since(interval):
+                await compact_orphans_once()
+        except Exception as e:
+            print(f"⚠️ Error compacting orphans: {e}")
@@ -0,0 +1,163 @@
+import os
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from database import (
+    enrollment_collection, assessment_collection,
+    attendance_collection, prediction_collection
+)
+from services.cache import TTLCache
+from services.data_version import data_versions
+
+# Load environment variables
+load_dotenv()
+
+COURSE_ANALYTICS_CACHE_SIZE = int(os.getenv("COURSE_ANALYTICS_CACHE_SIZE", 512))
+# Upper bound on the age of a cached entry; changes invalidate entries before that
+COURSE_ANALYTICS_CACHE_TTL = int(os.getenv("COURSE_ANALYTICS_CACHE_TTL", 600))
+
+# Collections whose changes affect every course (a student's prediction counts in all their courses)
+SHARED_COLLECTIONS = ("enrollments", "students", "predictions")
+ALL_COURSES = "*"
+
+
+def course_data(name, course_id):
+    """Data version name of one course's share of a collection, bumped with the collection's own"""
+    return f"{name}:{course_id}"
+
+
+async def ensure_indexes():
+    await enrollment_collection.create_index(
+        [("course_id", ASCENDING), ("student_id", ASCENDING), ("semester", ASCENDING)], unique=True
+    )
+    await enrollment_collection.create_index([("student_id", ASCENDING)])
+    # The analytics look records up by student, then keep those of the course
+    for collection in (assessment_collection, attendance_collection):
+        await collection.create_index([("student_id", ASCENDING), ("course_id", ASCENDING)])
+        await collection.create_index([("course_id", ASCENDING)])
+    await prediction_collection.create_index([("student_id", ASCENDING), ("created_at", ASCENDING)])
+
+
+def _pipeline(course_id=None, semester=None):
+    match = {}
+    if course_id is not None:
+        match["course_id"] = course_id
+    if semester is not None:
+        match["semester"] = semester
+    in_course = lambda field: {
+        "$filter": {"input": field, "as": "record", "cond": {"$eq": ["$$record.course_id", "$_id.course_id"]}}
+    }
+    count_risk = lambda status: {"$sum": {"$cond": [{"$eq": ["$risk_status", status]}, 1, 0]}}
+    return [
+        {"$match": match},
+        # A student enrolled in several semesters counts once
+        {"$group": {"_id": {"course_id": "$course_id", "student_id": "$student_id"}}},
+        {"$lookup": {"from": assessment_collection.name, "localField": "_id.student_id",
+                     "foreignField": "student_id", "as": "assessments"}},
+        {"$lookup": {"from": attendance_collection.name, "localField": "_id.student_id",
+                     "foreignField": "student_id", "as": "attendance"}},
+        {"$lookup": {"from": prediction_collection.name, "localField": "_id.student_id",
+                     "foreignField": "student_id", "as": "predictions"}},
+        {"$project": {
+            "assessments": in_course("$assessments"),
+            "attendance": in_course("$attendance"),
+            "risk_status": {"$arrayElemAt": ["$predictions.risk_status", -1]}
+        }},
+        # Per-student averages first, so every student weighs the same in the course means
+        {"$project": {
+            "risk_status": 1,
+            "assessed": {"$cond": [{"$gt": [{"$size": "$assessments"}, 0]}, 1, 0]},
+            "test_score": {"$avg": "$assessments.test_score"},
+            "assignment_score": {"$avg": "$assessments.assignment_score"},
+            "exam_score": {"$avg": "$assessments.exam_score"},
+            "attendance": {"$avg": "$attendance.attendance_percentage"}
+        }},
+        {"$group": {
+            "_id": "$_id.course_id",
+            "enrolled": {"$sum": 1},
+            "assessed": {"$sum": "$assessed"},
+            "mean_test_score": {"$avg": "$test_score"},
+            "mean_assignment_score": {"$avg": "$assignment_score"},
+            "mean_exam_score": {"$avg": "$exam_score"},
+            "mean_attendance": {"$avg": "$attendance"},
+            "low_risk": count_risk("Low"),
+            "medium_risk": count_risk("Medium"),
+            "high_risk": count_risk("High")
+        }}
+    ]
+
+
+def _summary(group):
+    means = [group["mean_test_score"], group["mean_assignment_score"], group["mean_exam_score"]]
+    scored = group["low_risk"] + group["medium_risk"] + group["high_risk"]
+    return {
+        "course_id": group["_id"],
+        "enrolled": group["enrolled"],
+        "assessed": group["assessed"],
+        "mean_test_score": group["mean_test_score"],
+        "mean_assignment_score": group["mean_assignment_score"],
+        "mean_exam_score": group["mean_exam_score"],
+        # The mean of the per-student totals is the sum of the component means
+        "mean_total_score": sum(means) if None not in means else None,
+        "mean_attendance": group["mean_attendance"],
+        "low_risk": group["low_risk"],
+        "medium_risk": group["medium_risk"],
+        "high_risk": group["high_risk"],
+        "unscored": group["enrolled"] - scored,
+        "high_risk_percentage": group["high_risk"] / scored * 100 if scored else 0
+    }
+
+
+class CourseAnalytics:
+    """Per-course score, attendance and risk summaries, one aggregation per request.
+
+    Results are cached per course under the data versions they were built
+    from: writing an assessment or attendance record bumps its course's
+    version, so only that course's entry goes stale. Enrollment, student and
+    prediction changes affect every course.
+    """
+
+    def __init__(self):
+        self.cache = TTLCache(maxsize=COURSE_ANALYTICS_CACHE_SIZE, ttl=COURSE_ANALYTICS_CACHE_TTL)
+
+    def _stamp(self, course_id):
+        if not data_versions.loaded:
+            return None
+        if course_id == ALL_COURSES:
+            names = ("assessments", "attendance") + SHARED_COLLECTIONS
+        else:
+            names = (course_data("assessments", course_id), course_data("attendance", course_id)) + SHARED_COLLECTIONS
+        return tuple(data_versions.versions.get(name) for name in names)
+
+    async def _cached(self, key, compute):
+        stamp = self._stamp(key[0])
+        entry = self.cache.get(key)
+        if entry is not None and stamp is not None and entry[0] == stamp:
+            return entry[1]
+        result = await compute()
+        if stamp is not None:
+            self.cache.set(key, (stamp, result))
+        return result
+
+    async def course(self, course_id, semester=None):
+        """Summary of one course; a course without enrollments has zero counts"""
+        async def compute():
+            groups = await enrollment_collection.aggregate(_pipeline(course_id, semester)).to_list(length=None)
+            if groups:
+                return _summary(groups[0])
+            return _summary({
+                "_id": course_id, "enrolled": 0, "assessed": 0, "mean_test_score": None,
+                "mean_assignment_score": None, "mean_exam_score": None, "mean_attendance": None,
+                "low_risk": 0, "medium_risk": 0, "high_risk": 0
+            })
+        return await self._cached((course_id, semester), compute)
+
+    async def all_courses(self, semester=None):
+        """Summaries of every course with enrollments"""
+        async def compute():
+            groups = await enrollment_collection.aggregate(_pipeline(semester=semester)).to_list(length=None)
+            return [_summary(group) for group in groups]
+        return await self._cached((ALL_COURSES, semester), compute)
+
+
+# Initialize global course analytics instance
+course_analytics = CourseAnalytics()
@@ -0,0 +1,111 @@
+import os
+import uuid
+import asyncio
+import hashlib
+from dotenv import load_dotenv
+from fastapi import Depends, HTTPException, Request, Response
+from pymongo import ReturnDocument
+from database import database
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between reloads of versions bumped by other workers
+DATA_VERSION_REFRESH_SECONDS = float(os.getenv("DATA_VERSION_REFRESH_SECONDS", 1))
+CONDITIONAL_GET_ENABLED = os.getenv("CONDITIONAL_GET_ENABLED", "True").lower() == "true"
+
+data_version_collection = database.get_collection("data_versions")
+
+
+class DataVersions:
+    """Change counters per collection, persisted in MongoDB and mirrored in memory.
+
+    Every write through the API bumps the counter of the collection it
+    changed, so a response built from some collections is unchanged while
+    their counters are. Each worker keeps the counters in a dict and a
+    background loop reloads them, so building an ETag needs no query. Writes
+    made directly in MongoDB, outside the API, are not seen.
+    """
+
+    def __init__(self):
+        # collection name -> (epoch, version); the epoch changes if the document is recreated
+        self.versions = {}
+        self.loaded = False
+        # Called with (name, (epoch, version)) after this worker bumps a counter
+        self.listeners = []
+
+    async def refresh(self):
+        versions = {}
+        async for entry in data_version_collection.find({}):
+            versions[entry["_id"]] = (entry["epoch"], entry["version"])
+        self.versions = versions
+        self.loaded = True
+
+    async def bump(self, *names):
+        """Record that the named collections changed"""
+        for name in names:
+            try:
+                entry = await data_version_collection.find_one_and_update(
+                    {"_id": name},
+                    {"$inc": {"version": 1}, "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+                self.versions[name] = (entry["epoch"], entry["version"])
+                for listener in self.listeners:
+                    listener(name, self.versions[name])
+            except Exception as e:
+                # Without a reliable version no ETag can be trusted until the next refresh
+                print(f"⚠️ Could not bump data version of {name}: {e}")
+                self.loaded = False
+
+    def etag(self, request, names):
+        """Weak ETag of the response to ``request`` built from the named collections, or None"""
+        if not self.loaded:
+            return None
+        parts = [request.url.path, request.url.query]
+        parts += [f"{name}:{self.versions.get(name, ('', 0))}" for name in names]
+        return f'W/"{hashlib.sha1("|".join(parts).encode()).hexdigest()[:20]}"'
+
+    async def start(self):
+        await self.refresh()
+
+    async def run_refresh_job(self, interval=DATA_VERSION_REFRESH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Error refreshing data versions: {e}")
+
+
+def _matches(if_none_match, etag):
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: W/"x" and "x" are the same tag
+    return etag.removeprefix("W/") in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+
+def conditional_get(*names):
+    """Route dependency answering 304 Not Modified while the named collections are unchanged.
+
+    It runs before the handler, so an unchanged response is neither queried
+    nor serialized again. Otherwise the ETag is added to the response.
+    """
+    async def check(request: Request, response: Response):
+        if not CONDITIONAL_GET_ENABLED:
+            return
+        etag = data_versions.etag(request, names)
+        if etag is None:
+            return
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _matches(if_none_match, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return Depends(check)
+
+
+# Initialize global data versions instance
+data_versions = DataVersions()
@@ -0,0 +1,68 @@
+import contextvars
+from contextlib import contextmanager
+from pymongo import monitoring
+
+# Trackers active in the current context. Motor runs pymongo calls in its
+# executor with a copy of the caller's context, so commands are attributed to
+# the request (or script section) that awaited them.
+_active_trackers = contextvars.ContextVar("mongo_command_trackers", default=())
+
+
+class CommandStats:
+    """MongoDB commands issued while a tracker was active"""
+
+    def __init__(self):
+        self.commands = 0
+        self.failed = 0
+        self.seconds = 0.0
+        self.by_name = {}
+
+    def record(self, name, seconds, failed=False):
+        self.commands += 1
+        self.seconds += seconds
+        if failed:
+            self.failed += 1
+        entry = self.by_name.setdefault(name, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+
+    def to_dict(self):
+        return {
+            "commands": self.commands,
+            "failed": self.failed,
+            "seconds": round(self.seconds, 6),
+            "by_name": {
+                name: {"count": e["count"], "seconds": round(e["seconds"], 6)}
+                for name, e in sorted(self.by_name.items(), key=lambda item: item[1]["seconds"], reverse=True)
+            }
+        }
+
+
+class CommandListener(monitoring.CommandListener):
+    """Feeds command durations reported by pymongo into the active trackers"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        for stats in _active_trackers.get():
+            stats.record(event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        for stats in _active_trackers.get():
+            stats.record(event.command_name, event.duration_micros / 1e6, failed=True)
+
+
+@contextmanager
+def track_commands():
+    """Collect the MongoDB commands issued inside the block (and tasks it awaits)"""
+    stats = CommandStats()
+    token = _active_trackers.set(_active_trackers.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _active_trackers.reset(token)
+
+
+# Initialize global listener, passed to the MongoDB client in database.py
+command_listener = CommandListener()
@@ -0,0 +1,250 @@
+"""Serve the frontend/ pages from the API, precompressed and cache-friendly.
+
+The build step copies every asset under a content-hashed name
+(js/auth.3f2a9c1d0b.js), points the pages at those names and adds gzip and,
+when the optional ``brotli`` package is installed, brotli variants:
+
+    python -m services.frontend            # writes frontend/dist
+
+Hashed assets are cached for a year (``immutable``); pages and the original
+asset names are revalidated with their ETag. Pages are told to call the API
+on their own origin, so the browser makes no CORS preflight requests. When
+frontend/dist has not been built, the same build runs in memory at startup.
+"""
+import os
+import re
+import sys
+import gzip
+import json
+import hashlib
+import mimetypes
+from dotenv import load_dotenv
+from services.compression import brotli, accepted_encodings, COMPRESS_MIN_BYTES, COMPRESSIBLE_TYPES
+
+# Load environment variables
+load_dotenv()
+
+FRONTEND_ENABLED = os.getenv("FRONTEND_ENABLED", "True").lower() == "true"
+FRONTEND_DIR = os.getenv(
+    "FRONTEND_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "frontend")
+)
+FRONTEND_DIST = os.getenv("FRONTEND_DIST", os.path.join(FRONTEND_DIR, "dist"))
+# URL prefix the pages are served under; auth.js redirects to /frontend/login.html
+FRONTEND_PREFIX = "/frontend"
+
+HASHED_EXTENSIONS = {".js", ".css"}
+PAGE_EXTENSIONS = {".html"}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Encodings in order of preference, with the suffix of their precompressed files
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+ASSET_REFERENCE = re.compile(r'''(\b(?:src|href)=["'])([^"':?#]+)(["'])''')
+# Pages served by the API call it on their own origin (see js/config.js)
+API_BASE_META = '<meta name="api-base" content="" />'
+
+
+def _content_type(path):
+    content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type == "application/javascript":
+        content_type += "; charset=utf-8"
+    return content_type
+
+
+def _compress(body, content_type):
+    """Encoded variants that are meaningfully smaller than the original"""
+    variants = {}
+    if len(body) < COMPRESS_MIN_BYTES or not content_type.startswith(COMPRESSIBLE_TYPES):
+        return variants
+    # mtime=0 keeps the output identical between builds
+    candidates = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        candidates["br"] = brotli.compress(body, quality=11)
+    for encoding, encoded in candidates.items():
+        if len(encoded) < len(body) * 0.9:
+            variants[encoding] = encoded
+    return variants
+
+
+class Asset:
+    def __init__(self, path, body, cache_control, variants=None):
+        self.path = path
+        self.body = body
+        self.content_type = _content_type(path)
+        self.cache_control = cache_control
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.variants = _compress(body, self.content_type) if variants is None else variants
+
+    def etag(self, encoding=None):
+        # Each encoding is a different byte sequence, so it needs its own strong ETag
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+    def manifest_entry(self):
+        return {"cache_control": self.cache_control, "encodings": sorted(self.variants)}
+
+
+def _hashed_name(path, body):
+    root, extension = os.path.splitext(path)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:10]}{extension}"
+
+
+def build(source=FRONTEND_DIR):
+    """Read frontend/ and return the assets to serve, keyed by URL path"""
+    files = {}
+    for directory, dirnames, filenames in os.walk(source):
+        # Skip the build output itself
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")
+                       and os.path.abspath(os.path.join(directory, d)) != os.path.abspath(FRONTEND_DIST)]
+        for filename in filenames:
+            full_path = os.path.join(directory, filename)
+            path = os.path.relpath(full_path, source).replace(os.sep, "/")
+            with open(full_path, "rb") as f:
+                files[path] = f.read()
+
+    assets = {}
+    renamed = {}
+    for path, body in files.items():
+        if os.path.splitext(path)[1] in HASHED_EXTENSIONS:
+            renamed[path] = _hashed_name(path, body)
+            assets[renamed[path]] = Asset(renamed[path], body, IMMUTABLE)
+
+    for path, body in files.items():
+        if os.path.splitext(path)[1] in PAGE_EXTENSIONS:
+            body = _rewrite_page(path, body.decode("utf-8"), renamed).encode("utf-8")
+        # Original names stay available for anything that links to them directly
+        assets[path] = Asset(path, body, REVALIDATE)
+    return assets
+
+
+def _rewrite_page(path, html, renamed):
+    base = os.path.dirname(path)
+
+    def hashed(match):
+        reference = os.path.normpath(os.path.join(base, match.group(2))).replace(os.sep, "/")
+        if reference not in renamed:
+            return match.group(0)
+        new_name = os.path.relpath(renamed[reference], base or ".").replace(os.sep, "/")
+        return f"{match.group(1)}{new_name}{match.group(3)}"
+
+    html = ASSET_REFERENCE.sub(hashed, html)
+    return re.sub(r"(<head[^>]*>)", lambda m: f"{m.group(1)}\n    {API_BASE_META}", html, count=1)
+
+
+def write(assets, dist=FRONTEND_DIST):
+    """Write the assets, their precompressed variants and a manifest to ``dist``"""
+    manifest = {}
+    for path, asset in assets.items():
+        target = os.path.join(dist, *path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(asset.body)
+        for encoding, suffix in ENCODINGS:
+            if encoding in asset.variants:
+                with open(target + suffix, "wb") as f:
+                    f.write(asset.variants[encoding])
+        manifest[path] = asset.manifest_entry()
+    with open(os.path.join(dist, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def load(dist=FRONTEND_DIST):
+    """Read a build written by ``write``. Returns None when there is none."""
+    manifest_path = os.path.join(dist, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    assets = {}
+    for path, entry in manifest.items():
+        target = os.path.join(dist, *path.split("/"))
+        with open(target, "rb") as f:
+            body = f.read()
+        variants = {}
+        for encoding, suffix in ENCODINGS:
+            if encoding in entry["encodings"]:
+                with open(target + suffix, "rb") as f:
+                    variants[encoding] = f.read()
+        assets[path] = Asset(path, body, entry["cache_control"], variants)
+    return assets
+
+
+class FrontendApp:
+    """ASGI app serving the built assets from memory"""
+
+    def __init__(self):
+        self.assets = {}
+        self.source = None
+
+    def load(self):
+        """Use frontend/dist when it was built, otherwise build in memory (runs in a thread)"""
+        assets = load()
+        self.source = FRONTEND_DIST
+        if assets is None:
+            assets = build()
+            self.source = "memory"
+        self.assets = assets
+        pages = sum(1 for path in assets if path.endswith(".html"))
+        print(f"🗂️ Frontend: {pages} pages, {len(assets)} files (build: {self.source}, brotli: {brotli is not None})")
+
+    def select(self, asset, accept_encoding):
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, _ in ENCODINGS:
+            if encoding in asset.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        path = scope["path"].lstrip("/")
+        if path == "" or path.endswith("/"):
+            path += "index.html"
+        asset = self.assets.get(path)
+        if scope["method"] not in ("GET", "HEAD"):
+            await self._send(send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed")
+            return
+        if asset is None:
+            await self._send(send, 404, [(b"content-type", b"text/plain; charset=utf-8")], b"Not Found")
+            return
+
+        request_headers = dict(scope["headers"])
+        encoding = self.select(asset, request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        etag = asset.etag(encoding)
+        headers = [
+            (b"etag", etag.encode()),
+            (b"cache-control", asset.cache_control.encode()),
+            (b"content-type", asset.content_type.encode())
+        ]
+        if asset.variants:
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        if_none_match = request_headers.get(b"if-none-match", b"").decode("latin-1")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        ]):
+            await self._send(send, 304, headers, b"")
+            return
+
+        body = asset.variants[encoding] if encoding else asset.body
+        if encoding:
+            headers.append((b"content-encoding", encoding.encode()))
+        await self._send(send, 200, headers, b"" if scope["method"] == "HEAD" else body, len(body))
+
+    async def _send(self, send, status, headers, body, length=None):
+        if status != 304:
+            headers = headers + [(b"content-length", str(len(body) if length is None else length).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+# Initialize global frontend instance, mounted at FRONTEND_PREFIX by main.py
+frontend_app = FrontendApp()
+
+
+if __name__ == "__main__":
+    built = build()
+    write(built, FRONTEND_DIST)
+    original = sum(len(a.body) for a in built.values())
+    smallest = sum(min([len(a.body)] + [len(v) for v in a.variants.values()]) for a in built.values())
+    print(f"✅ Built {len(built)} files into {FRONTEND_DIST}: {original / 1024:.0f} KB, "
+          f"{smallest / 1024:.0f} KB precompressed (brotli: {brotli is not None})")
+    sys.exit(0)
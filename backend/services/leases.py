@@ -0,0 +1,218 @@
+import os
+import uuid
+import socket
+import asyncio
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from fastapi.encoders import jsonable_encoder
+from database import database
+
+# Load environment variables
+load_dotenv()
+
+# A lease not renewed within this many seconds is considered abandoned
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", 60))
+# How often callers waiting on another worker's run check the lease document
+LEASE_POLL_SECONDS = float(os.getenv("LEASE_POLL_SECONDS", 0.5))
+# Results larger than this are not copied into the lease document
+LEASE_MAX_RESULT_BYTES = int(os.getenv("LEASE_MAX_RESULT_BYTES", 4 * 1024 * 1024))
+
+
+def _new_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+# Identifies this process in lease documents
+WORKER_ID = _new_worker_id()
+
+
+def _reset_worker_id():
+    global WORKER_ID
+    WORKER_ID = _new_worker_id()
+
+
+# Workers forked by serve.py after this module was imported need their own id
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_worker_id)
+
+lease_collection = database.get_collection("leases")
+
+
+async def acquire_lease(name, run_id, ttl=LEASE_TTL_SECONDS, owner=None, rerun_done=True):
+    """Take the named lease if it is free or expired. Returns the lease document or None.
+
+    With ``rerun_done=False`` a lease whose run finished is never taken again;
+    one whose run failed or was cancelled is.
+    """
+    now = datetime.utcnow()
+    if rerun_done:
+        available = [{"state": {"$ne": "running"}}, {"expires_at": {"$lt": now}}]
+    else:
+        available = [{"state": {"$in": ["failed", "cancelled"]}}, {"state": "running", "expires_at": {"$lt": now}}]
+    try:
+        return await lease_collection.find_one_and_update(
+            {"_id": name, "$or": available},
+            {"$set": {
+                "owner": owner or WORKER_ID,
+                "run_id": run_id,
+                "state": "running",
+                "started_at": now,
+                "expires_at": now + timedelta(seconds=ttl),
+                "result": None,
+                "error": None
+            }},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # The document exists and is held by a live owner, so the upsert collided
+        return None
+
+
+async def renew_lease(name, run_id, ttl=LEASE_TTL_SECONDS):
+    result = await lease_collection.update_one(
+        {"_id": name, "run_id": run_id, "state": "running"},
+        {"$set": {"expires_at": datetime.utcnow() + timedelta(seconds=ttl)}}
+    )
+    return result.modified_count == 1
+
+
+async def release_lease(name, run_id, state="done", result=None, error=None):
+    await lease_collection.update_one(
+        {"_id": name, "run_id": run_id},
+        {"$set": {
+            "state": state,
+            "finished_at": datetime.utcnow(),
+            "expires_at": datetime.utcnow(),
+            "result": result,
+            "error": error
+        }}
+    )
+
+
+async def keep_lease_alive(name, run_id, ttl=LEASE_TTL_SECONDS):
+    """Renew a lease every third of its TTL until cancelled"""
+    while True:
+        await asyncio.sleep(ttl / 3)
+        if not await renew_lease(name, run_id, ttl):
+            print(f"⚠️ Lost lease '{name}' (run {run_id})")
+            return
+
+
+def _storable(result):
+    from bson import BSON
+    try:
+        if len(BSON.encode({"result": result})) <= LEASE_MAX_RESULT_BYTES:
+            return result
+    except Exception:
+        pass
+    return None
+
+
+class SingleFlight:
+    """Coalesce concurrent runs of one expensive operation across workers.
+
+    Callers in the same process attach to the in-flight task. Across processes
+    and hosts, a lease document in MongoDB elects one runner; the others poll
+    the lease until it finishes and receive the result stored in it. Results
+    too large for the lease document are rebuilt by ``remote_result``.
+    With ``once=True`` a run that finished is never repeated: later callers
+    receive its stored result. With ``cancellable=True`` a run is cancelled
+    once every caller in its process has gone away; ``fn`` decides where it
+    may stop, and workers waiting on the lease take the run over.
+    """
+
+    def __init__(self, name, ttl=LEASE_TTL_SECONDS, once=False, cancellable=False):
+        self.name = name
+        self.ttl = ttl
+        self.once = once
+        self.cancellable = cancellable
+        self.coalesced = 0
+        self._task = None
+        # Callers in this process waiting for the current run
+        self._waiters = 0
+
+    async def run(self, fn, store=None, remote_result=None):
+        """Run ``fn()`` unless a run is already in flight, then return that run's result.
+
+        ``store`` converts the result into what is kept in the lease document
+        (default: the JSON-compatible result); ``remote_result`` turns the stored
+        value back into a result for callers on other workers.
+        """
+        if self._task is not None and not self._task.done():
+            self.coalesced += 1
+        else:
+            self._task = asyncio.ensure_future(self._run_or_attach(fn, store, remote_result))
+        task = self._task
+        self._waiters += 1
+        try:
+            # Shield so a caller that disconnects does not cancel the run for everyone else
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.cancellable and self._waiters == 1 and not task.done():
+                # The last caller went away; a new caller starts a run that waits for this one to stop
+                task.cancel()
+                self._task = None
+            raise
+        finally:
+            self._waiters -= 1
+
+    async def _run_or_attach(self, fn, store, remote_result):
+        retrying = False
+        while True:
+            if retrying:
+                # Another worker may be taking over at the same moment; don't hammer MongoDB
+                await asyncio.sleep(LEASE_POLL_SECONDS)
+            retrying = True
+            run_id = uuid.uuid4().hex
+            if await acquire_lease(self.name, run_id, self.ttl, rerun_done=not self.once):
+                return await self._run(fn, run_id, store)
+            result = await self._wait_for_remote(remote_result)
+            if result is not None:
+                self.coalesced += 1
+                return result
+            # The other run expired, was cancelled or was replaced - try to take over or attach again
+
+    async def _run(self, fn, run_id, store):
+        renewer = asyncio.create_task(keep_lease_alive(self.name, run_id, self.ttl))
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Callers waiting on other workers see the lease end and run it themselves
+            await release_lease(self.name, run_id, state="cancelled")
+            raise
+        except Exception as e:
+            await release_lease(self.name, run_id, state="failed", error=str(e))
+            raise
+        finally:
+            renewer.cancel()
+        stored = store(result) if store else jsonable_encoder(result)
+        await release_lease(self.name, run_id, result=_storable(stored))
+        return result
+
+    async def _wait_for_remote(self, remote_result):
+        run_id = None
+        while True:
+            lease = await lease_collection.find_one({"_id": self.name})
+            if lease is None:
+                return None
+            if run_id is None:
+                run_id = lease.get("run_id")
+            if lease.get("run_id") != run_id:
+                # Another run replaced the one we waited for, and its result went with it;
+                # go back to taking the lease or attaching to the new run
+                return None
+            if lease["state"] == "done":
+                stored = lease.get("result")
+                if remote_result is not None:
+                    return await remote_result(stored)
+                return stored if stored is not None else {"message": f"{self.name} completed on another worker"}
+            if lease["state"] == "failed":
+                raise RuntimeError(lease.get("error") or f"{self.name} failed on another worker")
+            if lease["state"] == "cancelled":
+                return None
+            if lease["expires_at"] < datetime.utcnow():
+                return None
+            await asyncio.sleep(LEASE_POLL_SECONDS)
@@ -0,0 +1,234 @@
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from collections import deque
+from dotenv import load_dotenv
+from starlette.routing import Match
+
+# Load environment variables
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+# How often the event loop lag is sampled, in seconds
+EVENT_LOOP_LAG_INTERVAL = float(os.getenv("EVENT_LOOP_LAG_INTERVAL", 0.5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+# Distinct (method, path) pairs remembered when mapping paths to route templates
+ROUTE_CACHE_SIZE = 10000
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Histogram:
+    """Cumulative histogram in the Prometheus exposition format"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f"{name}_bucket{_labels({**labels, 'le': bound})} {cumulative}"
+        yield f"{name}_bucket{_labels({**labels, 'le': '+Inf'})} {self.count}"
+        yield f"{name}_sum{_labels(labels)} {self.sum}"
+        yield f"{name}_count{_labels(labels)} {self.count}"
+
+
+class MetricsRegistry:
+    """Request metrics recorded by MetricsMiddleware plus application gauges.
+
+    Gauges are registered as callbacks and evaluated when /metrics is scraped,
+    so they always report current values without any bookkeeping on the hot path.
+    """
+
+    def __init__(self):
+        self.requests = {}
+        self.latency = {}
+        self.response_size = {}
+        self.in_flight = {}
+        self.counters = {}
+        self.gauges = {}
+        self.event_loop_lag = Histogram(LAG_BUCKETS)
+        self.last_event_loop_lag = 0.0
+        self.recent_event_loop_lag = deque(maxlen=8)
+        self.generation = {"active": 0, "started": None, "students": 0, "last_rate": 0.0}
+        self._routes = {}
+
+    def route_for(self, scope):
+        """Route template for a request, e.g. /prediction/generate/{student_id}"""
+        key = (scope["method"], scope["path"])
+        route = self._routes.get(key)
+        if route is None:
+            route = "unmatched"
+            app = scope.get("app")
+            for candidate in getattr(app, "routes", []):
+                match, _ = candidate.matches(scope)
+                if match != Match.NONE:
+                    route = candidate.path
+                    if match == Match.FULL:
+                        break
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()
+            self._routes[key] = route
+        return route
+
+    def observe_request(self, method, route, status, seconds, size):
+        key = (method, route, status)
+        self.requests[key] = self.requests.get(key, 0) + 1
+        self.latency.setdefault((method, route), Histogram(LATENCY_BUCKETS)).observe(seconds)
+        self.response_size.setdefault((method, route), Histogram(SIZE_BUCKETS)).observe(size)
+
+    def inc(self, name, amount=1, help="", **labels):
+        """Increment an application counter"""
+        series = self.counters.setdefault(name, {"help": help, "values": {}})
+        key = tuple(sorted(labels.items()))
+        series["values"][key] = series["values"].get(key, 0) + amount
+
+    def register_gauge(self, name, help, callback):
+        """Report ``callback()`` as a gauge. It returns a number or a list of (labels, value)."""
+        self.gauges[name] = (help, callback)
+
+    def generation_started(self):
+        if self.generation["active"] == 0:
+            self.generation["started"] = time.perf_counter()
+            self.generation["students"] = 0
+        self.generation["active"] += 1
+
+    def students_scored(self, count=1, outcome="predicted"):
+        self.generation["students"] += count
+        self.inc("generation_students_total", count, "Students processed by generate-all", outcome=outcome)
+
+    def generation_finished(self):
+        if self.generation["active"] == 1:
+            self.generation["last_rate"] = self.students_per_second()
+        self.generation["active"] = max(0, self.generation["active"] - 1)
+
+    def students_per_second(self):
+        """Rate of the running generate-all, or of the last one when idle"""
+        if not self.generation["active"]:
+            return self.generation["last_rate"]
+        elapsed = time.perf_counter() - self.generation["started"]
+        return self.generation["students"] / elapsed if elapsed > 0 else 0.0
+
+    async def monitor_event_loop(self, interval=EVENT_LOOP_LAG_INTERVAL):
+        """Measure how late the event loop wakes a sleeping task"""
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(0.0, time.perf_counter() - started - interval)
+            self.last_event_loop_lag = lag
+            self.recent_event_loop_lag.append(lag)
+            self.event_loop_lag.observe(lag)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = [
+            "# HELP http_requests_total Requests handled, by route template and status",
+            "# TYPE http_requests_total counter"
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(f"http_requests_total{_labels({'method': method, 'route': route, 'status': status})} {count}")
+
+        lines += ["# HELP http_requests_in_flight Requests currently being handled",
+                  "# TYPE http_requests_in_flight gauge"]
+        for (method, route), count in sorted(self.in_flight.items()):
+            lines.append(f"http_requests_in_flight{_labels({'method': method, 'route': route})} {count}")
+
+        for name, help, histograms in [
+            ("http_request_duration_seconds", "Request latency", self.latency),
+            ("http_response_size_bytes", "Response body size", self.response_size)
+        ]:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+            for (method, route), histogram in sorted(histograms.items()):
+                lines.extend(histogram.lines(name, {"method": method, "route": route}))
+
+        for name, series in sorted(self.counters.items()):
+            lines += [f"# HELP {name} {series['help']}", f"# TYPE {name} counter"]
+            for key, value in sorted(series["values"].items()):
+                lines.append(f"{name}{_labels(dict(key))} {value}")
+
+        lines += ["# HELP event_loop_lag_seconds Delay of the event loop waking a sleeping task",
+                  "# TYPE event_loop_lag_seconds histogram"]
+        lines.extend(self.event_loop_lag.lines("event_loop_lag_seconds", {}))
+        lines += ["# TYPE event_loop_lag_last_seconds gauge",
+                  f"event_loop_lag_last_seconds {self.last_event_loop_lag}",
+                  "# HELP generation_students_per_second Students scored per second by the running or last generate-all",
+                  "# TYPE generation_students_per_second gauge",
+                  f"generation_students_per_second {self.students_per_second()}",
+                  "# TYPE generation_in_progress gauge",
+                  f"generation_in_progress {self.generation['active']}"]
+
+        for name, (help, callback) in sorted(self.gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"⚠️ Metric {name} failed: {e}")
+                continue
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+            if isinstance(value, list):
+                lines.extend(f"{name}{_labels(labels)} {float(v)}" for labels, v in value)
+            elif value is not None:
+                lines.append(f"{name} {float(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording count, latency, size and concurrency per route.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so responses are not
+    buffered and streaming keeps working.
+    """
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.registry = registry or metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        method = scope["method"]
+        route = registry.route_for(scope)
+        key = (method, route)
+        response = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["size"] += len(message.get("body", b""))
+            await send(message)
+
+        registry.in_flight[key] = registry.in_flight.get(key, 0) + 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            registry.in_flight[key] -= 1
+            registry.observe_request(method, route, str(response["status"]), time.perf_counter() - started, response["size"])
+
+
+# Initialize global metrics registry
+metrics = MetricsRegistry()
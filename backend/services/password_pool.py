@@ -0,0 +1,103 @@
+import os
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# bcrypt releases the GIL while hashing, so a small thread pool is enough to keep
+# it off the event loop without the start-up and pickling cost of processes
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Hash jobs allowed to wait for a worker before new ones are rejected
+PASSWORD_HASH_QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE_LIMIT", 32))
+# Login attempts allowed per username within the window
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", 5))
+LOGIN_ATTEMPT_WINDOW = int(os.getenv("LOGIN_ATTEMPT_WINDOW", 60))
+
+
+class PoolSaturated(Exception):
+    """Raised when the hashing queue is full"""
+
+    def __init__(self, retry_after):
+        super().__init__("Password hashing queue is full")
+        self.retry_after = retry_after
+
+
+class PasswordHashPool:
+    """Bounded thread pool for bcrypt with a hard limit on queued work"""
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, queue_limit=PASSWORD_HASH_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def run(self, func, *args):
+        if self.pending >= self.workers + self.queue_limit:
+            self.rejected += 1
+            raise PoolSaturated(retry_after=1)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class LoginThrottle:
+    """Sliding-window limit on login attempts per username"""
+
+    def __init__(self, max_attempts=LOGIN_MAX_ATTEMPTS, window=LOGIN_ATTEMPT_WINDOW, max_users=10000):
+        self.max_attempts = max_attempts
+        self.window = window
+        self.max_users = max_users
+        self.throttled = 0
+        self._attempts = {}
+
+    def check(self, username):
+        """Record an attempt; return seconds to wait if the user is over the limit, else 0"""
+        now = time.monotonic()
+        attempts = self._attempts.get(username)
+        if attempts is None:
+            if len(self._attempts) >= self.max_users:
+                self._prune(now)
+            attempts = self._attempts[username] = deque()
+        while attempts and attempts[0] <= now - self.window:
+            attempts.popleft()
+        if len(attempts) >= self.max_attempts:
+            self.throttled += 1
+            return int(attempts[0] + self.window - now) + 1
+        attempts.append(now)
+        return 0
+
+    def reset(self, username):
+        self._attempts.pop(username, None)
+
+    def _prune(self, now):
+        expired = [u for u, a in self._attempts.items() if not a or a[-1] <= now - self.window]
+        for username in expired:
+            del self._attempts[username]
+        # Still full: drop the oldest half rather than growing without bound
+        if len(self._attempts) >= self.max_users:
+            for username in list(self._attempts)[:self.max_users // 2]:
+                del self._attempts[username]
+
+
+# Initialize global instances
+password_pool = PasswordHashPool()
+login_throttle = LoginThrottle()
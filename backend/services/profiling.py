@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import uuid
+import random
+import threading
+import tracemalloc
+from collections import deque
+from datetime import datetime
+from urllib.parse import parse_qs
+from dotenv import load_dotenv
+from services.db_monitor import track_commands
+
+# Load environment variables
+load_dotenv()
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "True").lower() == "true"
+# Share of all requests profiled automatically (0 = only on request)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0.0))
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+# Completed profiles kept in memory for /admin/profiles
+PROFILE_HISTORY = int(os.getenv("PROFILE_HISTORY", 50))
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "True").lower() == "true"
+
+PROFILE_HEADER = b"x-profile"
+PROFILE_QUERY = "profile"
+MAX_STACK_DEPTH = 64
+TOP_ENTRIES = 25
+
+# Most recent profiles, newest last
+profile_store = deque(maxlen=PROFILE_HISTORY)
+
+
+def _frame_label(frame, with_line=False):
+    code = frame.f_code
+    path = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{path}:{code.co_name}" + (f":{frame.f_lineno}" if with_line else "")
+
+
+class StackSampler:
+    """Samples the call stack of one thread from a background thread.
+
+    The event loop runs every request on one thread, so samples taken while
+    other requests are being served include their frames too; the profile
+    records how many requests were in flight so such results can be judged.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle_samples = 0
+        self.stacks = {}
+        self.self_counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        self.samples += 1
+        # The loop thread blocked in select() is waiting for I/O, not running Python
+        if frame.f_code.co_name == "select" and frame.f_code.co_filename.endswith("selectors.py"):
+            self.idle_samples += 1
+            return
+        leaf = _frame_label(frame, with_line=True)
+        self.self_counts[leaf] = self.self_counts.get(leaf, 0) + 1
+        stack = []
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        key = tuple(reversed(stack))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def report(self):
+        cumulative = {}
+        for stack, count in self.stacks.items():
+            for label in set(stack):
+                # Every sample runs under the event loop machinery, which says nothing
+                if not label.startswith("asyncio/"):
+                    cumulative[label] = cumulative.get(label, 0) + count
+
+        def top(counts):
+            return [
+                {"frame": label, "samples": count, "share": round(count / self.samples, 4)}
+                for label, count in sorted(counts.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]
+            ]
+
+        return {
+            "samples": self.samples,
+            "interval_seconds": self.interval,
+            "loop_idle_share": round(self.idle_samples / self.samples, 4) if self.samples else 0.0,
+            "top_self": top(self.self_counts),
+            "top_cumulative": top(cumulative),
+            # Collapsed stacks (root;...;leaf), the input format of flame graph tools
+            "top_stacks": [
+                {"stack": ";".join(stack), "samples": count}
+                for stack, count in sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)[:TOP_ENTRIES]
+            ]
+        }
+
+
+class _Tracemalloc:
+    """Shares tracemalloc between concurrent profiles and stops it when the last one ends"""
+
+    def __init__(self):
+        self.users = 0
+        self.started_here = False
+
+    def start(self):
+        if self.users == 0:
+            self.started_here = not tracemalloc.is_tracing()
+            if self.started_here:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        self.users += 1
+
+    def stop(self):
+        _, peak = tracemalloc.get_traced_memory()
+        self.users -= 1
+        if self.users == 0 and self.started_here:
+            tracemalloc.stop()
+        return peak
+
+
+_tracemalloc = _Tracemalloc()
+
+
+class RequestProfile:
+    """Wall time of one request split into event-loop CPU, awaited MongoDB time and other waiting"""
+
+    def __init__(self, scope, trigger, in_flight):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.method = scope["method"]
+        self.path = scope["path"]
+        self.query = scope.get("query_string", b"").decode("latin-1")
+        self.in_flight = in_flight
+        self.started_at = datetime.utcnow()
+        self.result = None
+        self.sampler = StackSampler(threading.get_ident())
+        self.mongo = None
+
+    def start(self, mongo):
+        """Start measuring; ``mongo`` collects the request's MongoDB commands"""
+        if PROFILE_TRACEMALLOC:
+            _tracemalloc.start()
+        self.mongo = mongo
+        self.sampler.start()
+        self._wall = time.perf_counter()
+        self._cpu = time.thread_time()
+
+    def finish(self, status):
+        """Stop measuring (idempotent) and store the result"""
+        if self.result is not None:
+            return self.result
+        wall = time.perf_counter() - self._wall
+        cpu = time.thread_time() - self._cpu
+        self.sampler.stop()
+        peak = _tracemalloc.stop() if PROFILE_TRACEMALLOC else None
+
+        self.result = {
+            "id": self.id,
+            "trigger": self.trigger,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "status": status,
+            "started_at": self.started_at,
+            "concurrent_requests": self.in_flight,
+            "wall_seconds": round(wall, 6),
+            "loop_cpu_seconds": round(cpu, 6),
+            "mongo_seconds": round(self.mongo.seconds, 6),
+            # Time spent awaiting anything else: thread pools, other requests, the network
+            "other_wait_seconds": round(max(0.0, wall - cpu - self.mongo.seconds), 6),
+            "mongo": self.mongo.to_dict(),
+            "tracemalloc_peak_bytes": peak,
+            "profile": self.sampler.report()
+        }
+        profile_store.append(self.result)
+        return self.result
+
+    def server_timing(self):
+        r = self.result
+        return (
+            f"total;dur={r['wall_seconds'] * 1000:.2f}, cpu;dur={r['loop_cpu_seconds'] * 1000:.2f}, "
+            f"mongo;dur={r['mongo_seconds'] * 1000:.2f}, wait;dur={r['other_wait_seconds'] * 1000:.2f}"
+        )
+
+
+def get_profile(profile_id):
+    return next((p for p in profile_store if p["id"] == profile_id), None)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests on demand or by sampling.
+
+    Admins request a profile with an ``X-Profile: 1`` header or ``?profile=1``;
+    the response then carries ``X-Profile-Id`` and a ``Server-Timing`` header,
+    and the full profile is available from /admin/profiles/{id}. With
+    PROFILE_SAMPLE_RATE set, a share of all requests is profiled and stored
+    without changing the response. ``role_for`` maps the Authorization header
+    to the caller's role.
+    """
+
+    def __init__(self, app, role_for, sample_rate=PROFILE_SAMPLE_RATE):
+        self.app = app
+        self.role_for = role_for
+        self.sample_rate = sample_rate
+        self.in_flight = 0
+
+    def _trigger(self, scope):
+        headers = dict(scope["headers"])
+        requested = headers.get(PROFILE_HEADER, b"").lower() in (b"1", b"true")
+        if not requested and PROFILE_QUERY.encode() in scope.get("query_string", b""):
+            values = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY, [])
+            requested = any(v.lower() in ("1", "true") for v in values)
+        if requested and self.role_for(headers.get(b"authorization", b"").decode("latin-1")) == "admin":
+            return "requested"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trigger = self._trigger(scope)
+        if trigger is None:
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+            return
+
+        profile = RequestProfile(scope, trigger, self.in_flight)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # The response is computed by now; the body is only being sent
+                status["code"] = message["status"]
+                profile.finish(message["status"])
+                if trigger == "requested":
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"x-profile-id", profile.id.encode()),
+                        (b"server-timing", profile.server_timing().encode())
+                    ]}
+            await send(message)
+
+        self.in_flight += 1
+        try:
+            with track_commands() as mongo:
+                profile.start(mongo)
+                try:
+                    await self.app(scope, receive, send_wrapper)
+                finally:
+                    profile.finish(status["code"])
+        finally:
+            self.in_flight -= 1
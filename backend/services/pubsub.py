@@ -0,0 +1,281 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import datetime
+from dotenv import load_dotenv
+from pymongo import ASCENDING, ReturnDocument
+from database import database
+from services.metrics import metrics
+
+# Load environment variables
+load_dotenv()
+
+EVENTS_ENABLED = os.getenv("EVENTS_ENABLED", "True").lower() == "true"
+# Seconds between reads of the events published by other workers
+EVENT_POLL_SECONDS = float(os.getenv("EVENT_POLL_SECONDS", 0.5))
+# Frames a subscriber may have waiting before it is dropped as too slow
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", 64))
+# Recent frames kept per worker to resume a stream after a reconnect (Last-Event-ID)
+EVENT_HISTORY = int(os.getenv("EVENT_HISTORY", 256))
+EVENT_RETENTION_SECONDS = int(os.getenv("EVENT_RETENTION_SECONDS", 3600))
+EVENT_HEARTBEAT_SECONDS = float(os.getenv("EVENT_HEARTBEAT_SECONDS", 15))
+# Seconds EventSource waits before reconnecting a dropped stream
+EVENT_RETRY_SECONDS = float(os.getenv("EVENT_RETRY_SECONDS", 3))
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", 1000))
+# Predictions per event; a generate-all is split into several events
+EVENT_MAX_PREDICTIONS = int(os.getenv("EVENT_MAX_PREDICTIONS", 500))
+# A sequence number still missing after this long was taken by a publisher that failed to write it
+EVENT_GAP_SECONDS = float(os.getenv("EVENT_GAP_SECONDS", 5))
+
+RISK_FIELDS = {"Low": "low_risk", "Medium": "medium_risk", "High": "high_risk"}
+
+event_collection = database.get_collection("prediction_events")
+sequence_collection = database.get_collection("prediction_event_sequence")
+
+
+def _frame(seq, event_type, data):
+    return f"id: {seq}\nevent: {event_type}\ndata: {json.dumps(data, default=str)}\n\n".encode()
+
+
+HEARTBEAT = b": ping\n\n"
+# First frame of every stream: shows the connection is open and how soon to reconnect
+RETRY = f"retry: {int(EVENT_RETRY_SECONDS * 1000)}\n\n".encode()
+# Put in a subscriber's queue to end its stream
+CLOSE = None
+
+
+class Subscriber:
+    def __init__(self, queue_size=EVENT_QUEUE_SIZE):
+        self.queue = asyncio.Queue(queue_size)
+        self.dropped = False
+
+
+class EventHub:
+    """Prediction events, published through MongoDB and fanned out to the streams of each worker.
+
+    Publishing writes the events under increasing sequence numbers and hands
+    them to this worker's subscribers at once. One relay loop per worker reads
+    the events other workers wrote since the last poll, so the number of open
+    streams does not change the load on MongoDB. A worker without streams
+    does not poll; the first stream to open skips it ahead to the latest event. Each frame is encoded once
+    and put in every subscriber's bounded queue; a subscriber whose queue is
+    full is sent a ``resync`` event and disconnected, and reloads the
+    dashboard instead of holding up the others.
+    """
+
+    def __init__(self):
+        self.enabled = EVENTS_ENABLED
+        self.subscribers = set()
+        self.history = deque(maxlen=EVENT_HISTORY)
+        # Every event up to last_seq was delivered; seen holds the delivered ones after it
+        self.last_seq = 0
+        self.seen = set()
+        # Whether the relay is following other workers' events, and from which one history is complete
+        self.relaying = False
+        self.history_start = 0
+        self.closing = False
+        self._gap_since = None
+        self._loop = None
+
+    async def ensure_indexes(self):
+        await event_collection.create_index([("created_at", ASCENDING)], expireAfterSeconds=EVENT_RETENTION_SECONDS)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.ensure_indexes()
+        await self.resume()
+
+    async def resume(self):
+        """Skip ahead to the latest event if the relay stopped while there were no streams"""
+        if self.relaying:
+            return
+        # Streams start from now; older events are in the dashboard's initial load
+        sequence = await sequence_collection.find_one({"_id": "prediction_events"})
+        self.last_seq = max(self.last_seq, sequence["seq"] if sequence else 0)
+        self.seen.clear()
+        self._gap_since = None
+        # Events skipped meanwhile are not in the history, so older ids cannot be replayed
+        self.history.clear()
+        self.history_start = self.last_seq
+        self.relaying = True
+
+    async def publish(self, event_type, payloads):
+        """Store one event per payload and deliver them to this worker's subscribers"""
+        if not self.enabled or not payloads:
+            return
+        sequence = await sequence_collection.find_one_and_update(
+            {"_id": "prediction_events"},
+            {"$inc": {"seq": len(payloads)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        first = sequence["seq"] - len(payloads) + 1
+        now = datetime.utcnow()
+        events = [
+            {"_id": first + i, "type": event_type, "data": data, "created_at": now}
+            for i, data in enumerate(payloads)
+        ]
+        await event_collection.insert_many(events)
+        for event in events:
+            self._deliver(event)
+        self._advance()
+
+    async def publish_predictions(self, documents, previous):
+        """Publish new prediction documents with the change they make to the risk statistics.
+
+        ``previous`` maps student ids to the prediction documents being
+        replaced; students missing from it had none.
+        """
+        try:
+            payloads = []
+            for start in range(0, len(documents), EVENT_MAX_PREDICTIONS):
+                batch = documents[start:start + EVENT_MAX_PREDICTIONS]
+                delta = {"total_students": 0, "low_risk": 0, "medium_risk": 0, "high_risk": 0}
+                for document in batch:
+                    old = previous.get(document["student_id"])
+                    if old is None:
+                        delta["total_students"] += 1
+                    # A status the statistics don't count changes nothing in them
+                    elif old.get("risk_status") in RISK_FIELDS:
+                        delta[RISK_FIELDS[old["risk_status"]]] -= 1
+                    if document["risk_status"] in RISK_FIELDS:
+                        delta[RISK_FIELDS[document["risk_status"]]] += 1
+                payloads.append({
+                    "predictions": [
+                        {
+                            "student_id": document["student_id"],
+                            "predicted_score": document["predicted_score"],
+                            "risk_status": document["risk_status"]
+                        }
+                        for document in batch
+                    ],
+                    "statistics_delta": delta
+                })
+            await self.publish("predictions", payloads)
+        except Exception as e:
+            # The predictions are saved; dashboards see them on their next load
+            print(f"⚠️ Could not publish prediction events: {e}")
+
+    def _deliver(self, event):
+        if event["_id"] <= self.last_seq or event["_id"] in self.seen:
+            return
+        self.seen.add(event["_id"])
+        frame = _frame(event["_id"], event["type"], event["data"])
+        self.history.append((event["_id"], frame))
+        metrics.inc("events_published_total", help="Events delivered to this worker's streams", type=event["type"])
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(subscriber, event["_id"])
+
+    def _drop(self, subscriber, seq):
+        """Disconnect a subscriber that fell behind, telling it to reload"""
+        self.subscribers.discard(subscriber)
+        subscriber.dropped = True
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        # The id makes a reconnecting client resume after the events it is told to reload
+        subscriber.queue.put_nowait(_frame(seq, "resync", {"reason": "slow consumer"}))
+        subscriber.queue.put_nowait(CLOSE)
+        metrics.inc("event_subscribers_dropped_total", help="Streams disconnected for falling behind")
+
+    def _advance(self):
+        while self.last_seq + 1 in self.seen:
+            self.last_seq += 1
+            self.seen.discard(self.last_seq)
+        if not self.seen:
+            self._gap_since = None
+            return
+        # Numbers are taken before the events are written, so a gap usually fills on the next poll
+        now = time.monotonic()
+        if self._gap_since is None:
+            self._gap_since = now
+        elif now - self._gap_since > EVENT_GAP_SECONDS:
+            self.last_seq = min(self.seen) - 1
+            self._gap_since = None
+            self._advance()
+
+    async def poll(self):
+        """Deliver the events other workers published since the last poll"""
+        async for event in event_collection.find({"_id": {"$gt": self.last_seq}}).sort("_id", 1):
+            self._deliver(event)
+        self._advance()
+
+    async def run_relay_job(self, interval=EVENT_POLL_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.subscribers:
+                # Nobody to deliver to; resume() catches up when a stream opens
+                self.relaying = False
+                continue
+            try:
+                await self.resume()
+                await self.poll()
+            except Exception as e:
+                print(f"⚠️ Error reading prediction events: {e}")
+
+    def subscribe(self, last_event_id=None):
+        """Register a stream, after ``resume()``. Returns None when this worker has no room for another one."""
+        if self.closing or len(self.subscribers) >= EVENT_MAX_SUBSCRIBERS:
+            return None
+        subscriber = Subscriber()
+        if last_event_id is not None:
+            missed = [frame for seq, frame in self.history if seq > last_event_id]
+            if (last_event_id < self.history_start or not self.relaying
+                    or (self.history and self.history[0][0] > last_event_id + 1) or len(missed) >= EVENT_QUEUE_SIZE):
+                # Too much was missed to replay; the client reloads instead
+                missed = [_frame(self.last_seq, "resync", {"reason": "history expired"})]
+            for frame in missed:
+                subscriber.queue.put_nowait(frame)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    async def stream(self, subscriber, authorized=None):
+        """Server-sent event frames for a subscriber, with heartbeats while idle.
+
+        ``authorized`` is awaited every EVENT_HEARTBEAT_SECONDS, busy or idle;
+        the stream ends once it returns False.
+        """
+        try:
+            yield RETRY
+            checked = time.monotonic()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(subscriber.queue.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    frame = HEARTBEAT
+                if frame is CLOSE:
+                    return
+                if authorized is not None and time.monotonic() - checked >= EVENT_HEARTBEAT_SECONDS:
+                    if not await authorized():
+                        metrics.inc("event_streams_revoked_total", help="Streams ended because their token stopped being valid")
+                        return
+                    checked = time.monotonic()
+                yield frame
+        finally:
+            self.unsubscribe(subscriber)
+
+    def close(self):
+        """End every stream so the worker can shut down; safe to call from any thread"""
+        self.closing = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._close_subscribers)
+
+    def _close_subscribers(self):
+        for subscriber in list(self.subscribers):
+            self.unsubscribe(subscriber)
+            try:
+                subscriber.queue.put_nowait(CLOSE)
+            except asyncio.QueueFull:
+                subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait(CLOSE)
+
+
+# Initialize global event hub instance
+event_hub = EventHub()
@@ -0,0 +1,77 @@
+import os
+import asyncio
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from database import database
+
+# Load environment variables
+load_dotenv()
+
+# Seconds between incremental reloads of tokens revoked by other workers
+REVOCATION_REFRESH_SECONDS = float(os.getenv("REVOCATION_REFRESH_SECONDS", 5))
+
+revoked_token_collection = database.get_collection("revoked_tokens")
+
+
+class RevocationList:
+    """Revoked token ids (``jti``), persisted in MongoDB and mirrored in memory.
+
+    MongoDB removes each entry through a TTL index once the token would have
+    expired anyway. Each worker keeps a ``jti -> expiry`` dict, so checking a
+    token is a single hash lookup. A background loop pulls only the entries
+    revoked since the previous refresh.
+    """
+
+    def __init__(self):
+        self.revoked = {}
+        self._last_refresh = None
+
+    def is_revoked(self, jti):
+        return jti is not None and jti in self.revoked
+
+    async def ensure_indexes(self):
+        await revoked_token_collection.create_index([("jti", ASCENDING)], unique=True)
+        await revoked_token_collection.create_index([("revoked_at", ASCENDING)])
+        # Expire each document at its own expires_at
+        await revoked_token_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    async def revoke(self, jti, expires_at):
+        """Revoke a token id until its expiry time (a naive UTC datetime)"""
+        self.revoked[jti] = expires_at
+        await revoked_token_collection.update_one(
+            {"jti": jti},
+            {"$setOnInsert": {"jti": jti, "expires_at": expires_at, "revoked_at": datetime.utcnow()}},
+            upsert=True
+        )
+
+    async def refresh(self):
+        """Load entries revoked since the last refresh and forget expired ones"""
+        started = datetime.utcnow()
+        query = {}
+        if self._last_refresh is not None:
+            # Overlap a little to tolerate clock skew between workers
+            query = {"revoked_at": {"$gte": self._last_refresh - timedelta(seconds=1)}}
+        async for entry in revoked_token_collection.find(query, {"jti": 1, "expires_at": 1}):
+            self.revoked[entry["jti"]] = entry["expires_at"]
+        self._last_refresh = started
+
+        expired = [jti for jti, expires_at in self.revoked.items() if expires_at < started]
+        for jti in expired:
+            del self.revoked[jti]
+
+    async def start(self):
+        await self.ensure_indexes()
+        await self.refresh()
+
+    async def run_refresh_job(self, interval=REVOCATION_REFRESH_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"⚠️ Error refreshing token revocations: {e}")
+
+
+# Initialize global revocation list
+revocation_list = RevocationList()
@@ -0,0 +1,356 @@
+import os
+import sys
+import uuid
+import asyncio
+import argparse
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ReturnDocument
+from database import (
+    database, student_collection, assessment_collection,
+    attendance_collection, prediction_collection
+)
+from ml.model import prediction_model
+from ml.registry import model_registry
+from ml.scoring import score_students, PREDICTED, UNCHANGED, INSUFFICIENT
+from services.snapshot import cohort_snapshot
+from services.data_version import data_versions
+from services.pubsub import event_hub
+from services import leases
+from services.leases import LEASE_TTL_SECONDS
+from services.metrics import metrics
+
+# Load environment variables
+load_dotenv()
+
+# Default number of _id ranges a sharded generate-all is split into
+GENERATION_SHARDS = int(os.getenv("GENERATION_SHARDS", 8))
+# Most shards and local workers one request may ask for
+GENERATION_MAX_SHARDS = int(os.getenv("GENERATION_MAX_SHARDS", 256))
+GENERATION_MAX_WORKERS = int(os.getenv("GENERATION_MAX_WORKERS", 16))
+# A shard that failed this many times is left failed until retried explicitly
+SHARD_MAX_ATTEMPTS = int(os.getenv("SHARD_MAX_ATTEMPTS", 3))
+# A shard whose worker stops renewing its lease for this long is handed to another worker
+SHARD_LEASE_SECONDS = int(os.getenv("SHARD_LEASE_SECONDS", LEASE_TTL_SECONDS))
+
+job_collection = database.get_collection("generation_jobs")
+shard_collection = database.get_collection("generation_shards")
+
+# Worker tasks started by this process, kept so they are not garbage collected
+worker_tasks = set()
+
+
+class ShardLost(Exception):
+    """The shard lease expired and was claimed by another worker"""
+
+
+class ModelChanged(Exception):
+    """The model the job was started with is no longer the published one"""
+
+
+async def _shard_bounds(count):
+    """Split the student _id space into ``count`` ranges of roughly equal size.
+
+    The first range has no lower bound and the last no upper bound, so students
+    added while the job runs still belong to a shard.
+    """
+    ids = [s["_id"] async for s in student_collection.find({}, {"_id": 1}).sort("_id", 1)]
+    count = max(1, min(count, len(ids)))
+    starts = [ids[i * len(ids) // count] for i in range(count)] if ids else [None]
+    return [
+        (starts[i] if i > 0 else None, starts[i + 1] if i + 1 < count else None)
+        for i in range(count)
+    ]
+
+
+async def create_job(shards=GENERATION_SHARDS):
+    """Record a sharded generate-all job and its pending shards"""
+    await shard_collection.create_index([("job_id", 1), ("index", 1)])
+    job_id = uuid.uuid4().hex
+    bounds = await _shard_bounds(shards)
+    now = datetime.utcnow()
+    await job_collection.insert_one({
+        "_id": job_id,
+        "state": "running",
+        "shards": len(bounds),
+        "model_version": prediction_model.version,
+        "created_by": leases.WORKER_ID,
+        "created_at": now,
+        "finished_at": None
+    })
+    await shard_collection.insert_many([
+        {
+            "_id": f"{job_id}:{index}",
+            "job_id": job_id,
+            "index": index,
+            "lower": lower,
+            "upper": upper,
+            "state": "pending",
+            "owner": None,
+            "attempts": 0,
+            "lease_expires_at": None,
+            "students": 0,
+            "predicted": 0,
+            "unchanged": 0,
+            "insufficient": 0,
+            "last_error": None
+        }
+        for index, (lower, upper) in enumerate(bounds)
+    ])
+    print(f"🧩 Created generation job {job_id} with {len(bounds)} shards")
+    return job_id
+
+
+async def claim_shard(job_id, owner=None):
+    """Take the next pending, abandoned or retryable shard of a job, or None"""
+    now = datetime.utcnow()
+    return await shard_collection.find_one_and_update(
+        {
+            "job_id": job_id,
+            "$or": [
+                {"state": "pending"},
+                {"state": "running", "lease_expires_at": {"$lt": now}},
+                {"state": "failed", "attempts": {"$lt": SHARD_MAX_ATTEMPTS}}
+            ]
+        },
+        {
+            "$set": {
+                "state": "running",
+                "owner": owner or leases.WORKER_ID,
+                "started_at": now,
+                "lease_expires_at": now + timedelta(seconds=SHARD_LEASE_SECONDS)
+            },
+            "$inc": {"attempts": 1}
+        },
+        sort=[("index", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _owned(shard):
+    # A shard is only ours while nobody reclaimed it after our lease expired
+    return {"_id": shard["_id"], "owner": shard["owner"], "attempts": shard["attempts"], "state": "running"}
+
+
+async def _renew_shard(shard):
+    result = await shard_collection.update_one(
+        _owned(shard),
+        {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=SHARD_LEASE_SECONDS)}}
+    )
+    return result.modified_count == 1
+
+
+async def _keep_shard_alive(shard):
+    while True:
+        await asyncio.sleep(SHARD_LEASE_SECONDS / 3)
+        if not await _renew_shard(shard):
+            return
+
+
+async def _check_model(model_version):
+    """Make sure this worker scores with the job's model, picking up the published one if needed"""
+    if prediction_model.version != model_version:
+        await model_registry.sync()
+    if prediction_model.version != model_version:
+        raise ModelChanged(
+            f"job scores with {model_version} but the current model is {prediction_model.version}; start a new job"
+        )
+
+
+async def process_shard(shard, model_version):
+    """Fetch, score and write the predictions of every student in one shard"""
+    id_range = {}
+    if shard["lower"] is not None:
+        id_range["$gte"] = shard["lower"]
+    if shard["upper"] is not None:
+        id_range["$lt"] = shard["upper"]
+    query = {"_id": id_range} if id_range else {}
+    student_ids = [str(s["_id"]) async for s in student_collection.find(query, {"_id": 1})]
+    in_shard = {"student_id": {"$in": student_ids}}
+
+    assessments = {}
+    async for a in assessment_collection.find(in_shard, {"student_id": 1, "test_score": 1, "assignment_score": 1}):
+        assessments.setdefault(a["student_id"], []).append(a)
+    attendances = {}
+    async for a in attendance_collection.find(in_shard, {"student_id": 1, "attendance_percentage": 1}):
+        attendances.setdefault(a["student_id"], []).append(a)
+    existing = {}
+    async for p in prediction_collection.find(in_shard).sort("created_at", 1):
+        existing[p["student_id"]] = p
+
+    # Every shard of a job scores with the same model, whichever worker runs it. Scoring runs
+    # in a thread so the loop keeps renewing leases; the model may be swapped meanwhile, so
+    # it is checked again before anything scored with it is written.
+    await _check_model(model_version)
+    outcomes, documents = await asyncio.to_thread(
+        score_students, student_ids, assessments, attendances, existing, model_version
+    )
+    await _check_model(model_version)
+    stats = {"students": len(student_ids), PREDICTED: 0, UNCHANGED: 0, INSUFFICIENT: 0}
+    for outcome in outcomes.values():
+        stats[outcome] += 1
+
+    if documents:
+        # Don't write over a shard another worker has taken over
+        if not await _renew_shard(shard):
+            raise ShardLost(shard["_id"])
+        await prediction_collection.delete_many({"student_id": {"$in": [d["student_id"] for d in documents]}})
+        await prediction_collection.insert_many(documents)
+        for document in documents:
+            cohort_snapshot.set_prediction(document["student_id"], document["predicted_score"], document["risk_status"])
+        await data_versions.bump("predictions")
+        await event_hub.publish_predictions(documents, existing)
+    return stats
+
+
+async def _update_job_state(job_id):
+    """Mark the job finished once no shard can make further progress"""
+    open_shards = await shard_collection.count_documents({
+        "job_id": job_id,
+        "$or": [
+            {"state": {"$in": ["pending", "running"]}},
+            {"state": "failed", "attempts": {"$lt": SHARD_MAX_ATTEMPTS}}
+        ]
+    })
+    if open_shards:
+        return
+    failed = await shard_collection.count_documents({"job_id": job_id, "state": "failed"})
+    await job_collection.update_one(
+        {"_id": job_id, "state": "running"},
+        {"$set": {"state": "failed" if failed else "done", "finished_at": datetime.utcnow()}}
+    )
+
+
+async def run_worker(job_id, owner=None):
+    """Claim and process shards of a job until none are left. Returns the shards processed."""
+    processed = 0
+    job = await job_collection.find_one({"_id": job_id}, {"model_version": 1})
+    if job is None:
+        return processed
+    metrics.generation_started()
+    try:
+        while True:
+            shard = await claim_shard(job_id, owner)
+            if shard is None:
+                break
+            if await _work_on(shard, job["model_version"]):
+                processed += 1
+    finally:
+        metrics.generation_finished()
+    await _update_job_state(job_id)
+    return processed
+
+
+async def _work_on(shard, model_version):
+    """Process one claimed shard and record the outcome. Returns True when it completed."""
+    renewer = asyncio.create_task(_keep_shard_alive(shard))
+    try:
+        stats = await process_shard(shard, model_version)
+    except ShardLost:
+        print(f"⚠️ Lost shard {shard['_id']} to another worker")
+        return False
+    except asyncio.CancelledError:
+        # Shutting down: hand the shard back now instead of when its lease expires
+        await shard_collection.update_one(
+            _owned(shard),
+            {"$set": {"state": "pending", "owner": None}, "$inc": {"attempts": -1}}
+        )
+        raise
+    except Exception as e:
+        print(f"❌ Shard {shard['_id']} failed (attempt {shard['attempts']}): {str(e)}")
+        await shard_collection.update_one(
+            _owned(shard),
+            {"$set": {"state": "failed", "last_error": str(e), "lease_expires_at": datetime.utcnow()}}
+        )
+        return False
+    finally:
+        renewer.cancel()
+
+    await shard_collection.update_one(
+        _owned(shard),
+        {"$set": {**stats, "state": "done", "last_error": None, "finished_at": datetime.utcnow()}}
+    )
+    for outcome in ("predicted", "unchanged", "insufficient"):
+        metrics.students_scored(stats[outcome], outcome=outcome)
+    print(f"✅ Shard {shard['_id']}: {stats['predicted']} predicted, {stats['unchanged']} unchanged")
+    return True
+
+
+def start_workers(job_id, workers=1):
+    """Run worker tasks for a job in this process"""
+    for _ in range(workers):
+        task = asyncio.create_task(run_worker(job_id, f"{leases.WORKER_ID}:{uuid.uuid4().hex[:4]}"))
+        worker_tasks.add(task)
+        task.add_done_callback(worker_tasks.discard)
+
+
+async def retry_failed_shards(job_id):
+    """Give failed shards a fresh set of attempts. Returns how many were reset."""
+    result = await shard_collection.update_many(
+        {"job_id": job_id, "state": "failed"},
+        {"$set": {"state": "pending", "attempts": 0, "owner": None}}
+    )
+    if result.modified_count:
+        await job_collection.update_one({"_id": job_id}, {"$set": {"state": "running", "finished_at": None}})
+    return result.modified_count
+
+
+async def job_progress(job_id):
+    """Aggregated progress of a job across all of its shards and workers"""
+    job = await job_collection.find_one({"_id": job_id})
+    if job is None:
+        return None
+    await _update_job_state(job_id)
+    job = await job_collection.find_one({"_id": job_id})
+
+    shards = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+    totals = {"students": 0, "predicted": 0, "unchanged": 0, "insufficient": 0}
+    failures = []
+    workers = set()
+    async for shard in shard_collection.find({"job_id": job_id}).sort("index", 1):
+        shards[shard["state"]] += 1
+        if shard["owner"]:
+            workers.add(shard["owner"])
+        if shard["state"] == "done":
+            for key in totals:
+                totals[key] += shard[key]
+        elif shard["state"] == "failed":
+            failures.append({"shard": shard["index"], "attempts": shard["attempts"], "error": shard["last_error"]})
+
+    elapsed = ((job["finished_at"] or datetime.utcnow()) - job["created_at"]).total_seconds()
+    return {
+        "job_id": job_id,
+        "state": job["state"],
+        "model_version": job["model_version"],
+        "shards": shards,
+        "progress": shards["done"] / job["shards"] if job["shards"] else 1.0,
+        **totals,
+        "students_per_second": totals["students"] / elapsed if elapsed > 0 else 0.0,
+        "workers": sorted(workers),
+        "failures": failures,
+        "created_at": job["created_at"],
+        "finished_at": job["finished_at"]
+    }
+
+
+async def _main(args):
+    # Standalone worker: pick up the published model (or the local files), then work through the job
+    if not await model_registry.sync():
+        prediction_model.load_model()
+    job_id = args.job or await create_job(args.shards)
+    results = await asyncio.gather(*[
+        run_worker(job_id, f"{leases.WORKER_ID}:{i}") for i in range(args.workers)
+    ])
+    progress = await job_progress(job_id)
+    print(f"🏁 Job {job_id}: processed {sum(results)} shards here, job {progress['state']}, "
+          f"{progress['predicted']} predicted, {progress['unchanged']} unchanged")
+    return 0 if progress["state"] != "failed" else 1
+
+
+if __name__ == "__main__":
+    # Run from backend/: python -m services.sharding --job <job_id> --workers 2
+    parser = argparse.ArgumentParser(description="Work on a sharded generate-all job")
+    parser.add_argument("--job", help="Job to join; a new job is created when omitted")
+    parser.add_argument("--shards", type=int, default=GENERATION_SHARDS, help="Shards for a new job")
+    parser.add_argument("--workers", type=int, default=1, help="Concurrent workers in this process")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
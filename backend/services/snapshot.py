@@ -0,0 +1,353 @@
+import os
+import re
+import asyncio
+import numpy as np
+from dotenv import load_dotenv
+from database import (
+    student_collection, assessment_collection,
+    attendance_collection, prediction_collection
+)
+from services.data_version import data_versions
+
+# Load environment variables
+load_dotenv()
+
+# The snapshot is optional - dashboards fall back to MongoDB when it is off
+COHORT_SNAPSHOT_ENABLED = os.getenv("COHORT_SNAPSHOT_ENABLED", "False").lower() == "true"
+# Seconds between checks for changes made by other workers, which trigger a rebuild
+COHORT_SNAPSHOT_SYNC_SECONDS = float(os.getenv("COHORT_SNAPSHOT_SYNC_SECONDS", 5))
+
+# Data versions of the collections the snapshot is built from
+SNAPSHOT_COLLECTIONS = ("students", "assessments", "attendance", "predictions")
+
+# Risk status is stored as a small integer code so it can be counted with bincount
+RISK_LABELS = ["Low", "Medium", "High"]
+RISK_CODES = {label: code for code, label in enumerate(RISK_LABELS)}
+NO_PREDICTION = -1
+
+# Column name -> dtype. Text columns are object arrays, everything else is numeric.
+COLUMNS = {
+    "student_id": object,
+    "name": object,
+    "matric_no": object,
+    "department": object,
+    "level": np.int64,
+    "attendance_avg": np.float64,
+    "test_avg": np.float64,
+    "assignment_avg": np.float64,
+    "assessment_avg": np.float64,
+    "assessment_count": np.int64,
+    "attendance_count": np.int64,
+    "predicted_score": np.float64,
+    "risk": np.int8,
+}
+
+# Numeric columns that can be sorted on or summarized with percentiles
+NUMERIC_COLUMNS = [name for name, dtype in COLUMNS.items() if dtype is not object]
+SORTABLE_COLUMNS = ["name", "matric_no", "department"] + NUMERIC_COLUMNS
+
+# Aggregations used to build the snapshot and to refresh a single student
+ASSESSMENT_GROUP = {
+    "$group": {
+        "_id": "$student_id",
+        "test_avg": {"$avg": "$test_score"},
+        "assignment_avg": {"$avg": "$assignment_score"},
+        "assessment_avg": {"$avg": {"$add": ["$test_score", "$assignment_score", "$exam_score"]}},
+        "count": {"$sum": 1}
+    }
+}
+ATTENDANCE_GROUP = {
+    "$group": {
+        "_id": "$student_id",
+        "attendance_avg": {"$avg": "$attendance_percentage"},
+        "count": {"$sum": 1}
+    }
+}
+LATEST_PREDICTION = [
+    {"$sort": {"created_at": -1}},
+    {"$group": {
+        "_id": "$student_id",
+        "predicted_score": {"$first": "$predicted_score"},
+        "risk_status": {"$first": "$risk_status"}
+    }}
+]
+
+
+class CohortSnapshot:
+    """Columnar in-memory copy of the joined student, feature and prediction data.
+
+    Each column is a NumPy array and ``index`` maps a student id to its row.
+    Rows are appended into spare capacity and removed by moving the last row
+    into the hole, so patches from the routers are O(1).
+
+    Patches made while ``build()`` is loading are queued and applied to the
+    rows it builds. The snapshot records the data versions it reflects and
+    advances them with this worker's own writes; a change made by another
+    worker leaves them behind, and the sync job rebuilds the snapshot.
+    """
+
+    def __init__(self, enabled=COHORT_SNAPSHOT_ENABLED):
+        self.enabled = enabled
+        self.is_ready = False
+        self.index = {}
+        self.size = 0
+        self.columns = {}
+        self.versions = {}
+        self._building = False
+        self._deferred = []
+        self._allocate(0)
+        data_versions.listeners.append(self._bumped)
+
+    def _allocate(self, capacity):
+        self.columns = {
+            name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()
+        }
+        self.columns["risk"][:] = NO_PREDICTION
+
+    def _grow(self):
+        capacity = max(16, len(self.columns["student_id"]) * 2)
+        for name, array in self.columns.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            if name == "risk":
+                grown[self.size:] = NO_PREDICTION
+            self.columns[name] = grown
+
+    def column(self, name):
+        """Return the live (un-padded) view of a column"""
+        return self.columns[name][:self.size]
+
+    # ------------------------------------------------------------------
+    # Building and patching
+    # ------------------------------------------------------------------
+    async def build(self):
+        """Load the whole cohort with one query per collection"""
+        self._building = True
+        self._deferred = []
+        try:
+            if not data_versions.loaded:
+                await data_versions.refresh()
+            # Taken before the queries, so their results include at least these changes
+            versions = {name: data_versions.versions.get(name) for name in SNAPSHOT_COLLECTIONS}
+            self.versions = dict(versions)
+            students = await student_collection.find().to_list(length=None)
+            assessments = await assessment_collection.aggregate([ASSESSMENT_GROUP]).to_list(length=None)
+            attendances = await attendance_collection.aggregate([ATTENDANCE_GROUP]).to_list(length=None)
+            predictions = await prediction_collection.aggregate(LATEST_PREDICTION).to_list(length=None)
+        except BaseException:
+            self._building = False
+            self._deferred = []
+            raise
+
+        self.index = {}
+        self.size = 0
+        self._allocate(len(students))
+        for student in students:
+            self.upsert_student(student, force=True)
+        for row in assessments:
+            self._set_assessment_aggregate(row["_id"], row)
+        for row in attendances:
+            self._set_attendance_aggregate(row["_id"], row)
+        for row in predictions:
+            self.set_prediction(row["_id"], row["predicted_score"], row["risk_status"], force=True)
+
+        self.is_ready = True
+        self._building = False
+        # Writes that landed during the queries may be missing from their results
+        deferred, self._deferred = self._deferred, []
+        for patch, args in deferred:
+            result = patch(*args)
+            if asyncio.iscoroutine(result):
+                await result
+        print(f"✅ Cohort snapshot built: {self.size} students")
+        return self.size
+
+    def _defer(self, patch, *args):
+        if self._building:
+            self._deferred.append((patch, args))
+
+    def _bumped(self, name, version):
+        """Follow this worker's writes, which were patched in before their bump"""
+        current = self.versions.get(name)
+        if current is not None and version == (current[0], current[1] + 1):
+            self.versions[name] = version
+
+    def is_stale(self):
+        """Whether a collection changed in a way this worker did not patch in"""
+        return any(data_versions.versions.get(name) != self.versions.get(name) for name in SNAPSHOT_COLLECTIONS)
+
+    async def run_sync_job(self, interval=COHORT_SNAPSHOT_SYNC_SECONDS):
+        while True:
+            await asyncio.sleep(interval)
+            if not self.is_ready or self._building or not data_versions.loaded or not self.is_stale():
+                continue
+            try:
+                await self.build()
+            except Exception as e:
+                print(f"⚠️ Error rebuilding cohort snapshot: {e}")
+
+    def upsert_student(self, student, force=False):
+        """Insert or update the descriptive columns of a student document"""
+        if not force:
+            self._defer(self.upsert_student, student)
+        if not (self.is_ready or force):
+            return
+        student_id = str(student["_id"])
+        row = self.index.get(student_id)
+        if row is None:
+            if self.size == len(self.columns["student_id"]):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.index[student_id] = row
+            self.columns["student_id"][row] = student_id
+        self.columns["name"][row] = student["name"]
+        self.columns["matric_no"][row] = student["matric_no"]
+        self.columns["department"][row] = student["department"]
+        self.columns["level"][row] = student["level"]
+
+    def remove_student(self, student_id):
+        """Remove a student by moving the last row into its slot"""
+        self._defer(self.remove_student, student_id)
+        if not self.is_ready:
+            return
+        row = self.index.pop(student_id, None)
+        if row is None:
+            return
+        last = self.size - 1
+        if row != last:
+            for array in self.columns.values():
+                array[row] = array[last]
+            self.index[self.columns["student_id"][row]] = row
+        for name, array in self.columns.items():
+            array[last] = NO_PREDICTION if name == "risk" else array.dtype.type(0)
+        self.columns["student_id"][last] = None
+        self.size = last
+
+    def set_prediction(self, student_id, predicted_score, risk_status, force=False):
+        """Record the latest prediction for a student"""
+        if not force:
+            self._defer(self.set_prediction, student_id, predicted_score, risk_status)
+        if not (self.is_ready or force):
+            return
+        row = self.index.get(student_id)
+        if row is None:
+            return
+        self.columns["predicted_score"][row] = predicted_score
+        self.columns["risk"][row] = RISK_CODES.get(risk_status, NO_PREDICTION)
+
+    def clear_prediction(self, student_id):
+        self._defer(self.clear_prediction, student_id)
+        if not self.is_ready:
+            return
+        row = self.index.get(student_id)
+        if row is not None:
+            self.columns["predicted_score"][row] = 0
+            self.columns["risk"][row] = NO_PREDICTION
+
+    def _set_assessment_aggregate(self, student_id, aggregate):
+        row = self.index.get(student_id)
+        if row is None:
+            return
+        if aggregate is None:
+            aggregate = {"test_avg": 0, "assignment_avg": 0, "assessment_avg": 0, "count": 0}
+        self.columns["test_avg"][row] = aggregate["test_avg"]
+        self.columns["assignment_avg"][row] = aggregate["assignment_avg"]
+        self.columns["assessment_avg"][row] = aggregate["assessment_avg"]
+        self.columns["assessment_count"][row] = aggregate["count"]
+
+    def _set_attendance_aggregate(self, student_id, aggregate):
+        row = self.index.get(student_id)
+        if row is None:
+            return
+        if aggregate is None:
+            aggregate = {"attendance_avg": 0, "count": 0}
+        self.columns["attendance_avg"][row] = aggregate["attendance_avg"]
+        self.columns["attendance_count"][row] = aggregate["count"]
+
+    async def refresh_student(self, student_id):
+        """Recompute a student's assessment and attendance averages after a write"""
+        self._defer(self.refresh_student, student_id)
+        if not self.is_ready or student_id not in self.index:
+            return
+        match = {"$match": {"student_id": student_id}}
+        assessment = await assessment_collection.aggregate([match, ASSESSMENT_GROUP]).to_list(length=1)
+        attendance = await attendance_collection.aggregate([match, ATTENDANCE_GROUP]).to_list(length=1)
+        self._set_assessment_aggregate(student_id, assessment[0] if assessment else None)
+        self._set_attendance_aggregate(student_id, attendance[0] if attendance else None)
+
+    # ------------------------------------------------------------------
+    # Vectorized queries
+    # ------------------------------------------------------------------
+    def filter(self, search=None, level=None, department=None, risk_status=None):
+        """Return the rows of students that have a prediction and match the filters.
+
+        ``search`` and ``department`` are case-insensitive regular expressions,
+        matching the MongoDB ``$regex`` queries used by the dashboard.
+        """
+        mask = self.column("risk") != NO_PREDICTION
+        if risk_status:
+            mask &= self.column("risk") == RISK_CODES.get(risk_status, NO_PREDICTION)
+        if level:
+            mask &= self.column("level") == level
+        if department:
+            mask &= _regex_mask(department, self.column("department"))
+        if search:
+            mask &= (
+                _regex_mask(search, self.column("name"))
+                | _regex_mask(search, self.column("matric_no"))
+            )
+        return np.flatnonzero(mask)
+
+    def sort(self, rows, sort_by, descending=False):
+        """Order rows by a column, keeping the original order for ties"""
+        if sort_by not in SORTABLE_COLUMNS:
+            raise ValueError(f"Cannot sort by '{sort_by}'")
+        keys = self.column(sort_by)[rows]
+        if keys.dtype == object:
+            keys = np.array([str(k).lower() for k in keys])
+        order = np.argsort(-keys if descending and keys.dtype.kind in "if" else keys, kind="stable")
+        if descending and keys.dtype.kind not in "if":
+            order = order[::-1]
+        return rows[order]
+
+    def risk_counts(self):
+        """Number of students per risk status"""
+        risk = self.column("risk")
+        counts = np.bincount(risk[risk != NO_PREDICTION].astype(np.int64), minlength=len(RISK_LABELS))
+        return {label: int(counts[code]) for code, label in enumerate(RISK_LABELS)}
+
+    def percentiles(self, column, q, rows=None):
+        """Percentiles of a numeric column over the given rows (default: all predicted)"""
+        if column not in NUMERIC_COLUMNS:
+            raise ValueError(f"Cannot compute percentiles of '{column}'")
+        if rows is None:
+            rows = self.filter()
+        if len(rows) == 0:
+            return {str(p): None for p in q}
+        values = np.percentile(self.column(column)[rows], q)
+        return {str(p): float(v) for p, v in zip(q, values)}
+
+    def to_detail(self, row):
+        """Convert a row to the StudentRiskDetail shape"""
+        c = self.columns
+        return {
+            "student_id": c["student_id"][row],
+            "student_name": c["name"][row],
+            "matric_no": c["matric_no"][row],
+            "level": int(c["level"][row]),
+            "department": c["department"][row],
+            "predicted_score": float(c["predicted_score"][row]),
+            "risk_status": RISK_LABELS[c["risk"][row]],
+            "attendance_percentage": float(c["attendance_avg"][row]),
+            "assessment_average": float(c["assessment_avg"][row])
+        }
+
+
+def _regex_mask(pattern, values):
+    regex = re.compile(pattern, re.IGNORECASE)
+    return np.fromiter((regex.search(v) is not None for v in values), dtype=bool, count=len(values))
+
+
+# Initialize global snapshot instance
+cohort_snapshot = CohortSnapshot()
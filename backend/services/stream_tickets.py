@@ -0,0 +1,54 @@
+import os
+import secrets
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+from pymongo import ASCENDING
+from database import database
+
+# Load environment variables
+load_dotenv()
+
+# Seconds a client has to open its event stream with a ticket
+STREAM_TICKET_SECONDS = int(os.getenv("STREAM_TICKET_SECONDS", 30))
+
+stream_ticket_collection = database.get_collection("stream_tickets")
+
+
+class StreamTickets:
+    """Single-use tickets for opening a live update stream.
+
+    EventSource cannot send an Authorization header, and a token in the URL
+    ends up in access logs and profiling records. So an authenticated POST
+    swaps the token for a random ticket that opens one stream within
+    STREAM_TICKET_SECONDS and is deleted when used. Tickets are stored in
+    MongoDB because the stream may be opened on another worker; a TTL index
+    removes the unused ones.
+    """
+
+    async def ensure_indexes(self):
+        await stream_ticket_collection.create_index([("expires_at", ASCENDING)], expireAfterSeconds=0)
+
+    async def issue(self, token_data):
+        """Ticket standing in for a validated token's claims"""
+        ticket = secrets.token_urlsafe(32)
+        await stream_ticket_collection.insert_one({
+            "_id": ticket,
+            "username": token_data.username,
+            "role": token_data.role,
+            "jti": token_data.jti,
+            "token_expires_at": token_data.expires_at,
+            "expires_at": datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+        })
+        return ticket
+
+    async def redeem(self, ticket):
+        """Claims of the token a ticket was issued for, or None if it is unknown, used or expired"""
+        entry = await stream_ticket_collection.find_one_and_delete({"_id": ticket})
+        # The TTL monitor runs about once a minute, so expired tickets may still be there
+        if entry is None or entry["expires_at"] < datetime.utcnow():
+            return None
+        return entry
+
+
+# Initialize global stream tickets instance
+stream_tickets = StreamTickets()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+# Tests import the app's modules from backend/, as the server does
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+try:
+    import mongomock_motor  # noqa: F401
+except ImportError:
+    pass
+else:
+    # Point the collections at an in-memory database before any test imports a module that
+    # binds one, so no test depends on a running mongod or on the order the tests run in
+    from benchmarks import environment
+    environment.configure(None, "tests_bench")
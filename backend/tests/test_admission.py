@@ -0,0 +1,183 @@
+"""Limiter hand-off and cancellation, and deadlines in AdmissionMiddleware"""
+import asyncio
+import pytest
+
+from services.admission import Limiter, Shed, PriorityClass, Route, AdmissionController, AdmissionMiddleware
+
+
+async def _settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_hands_the_slot_to_waiters_in_order():
+    async def scenario():
+        limiter = Limiter(1, queue=4)
+        await limiter.acquire(1)
+        order = []
+
+        async def waiter(name):
+            await limiter.acquire(1)
+            order.append(name)
+
+        tasks = [asyncio.create_task(waiter(name)) for name in ("first", "second")]
+        await _settle()
+        assert len(limiter.waiters) == 2 and order == []
+
+        limiter.release()
+        await _settle()
+        # The slot went to the first waiter without becoming free in between
+        assert order == ["first"] and limiter.active == 1
+
+        limiter.release()
+        await _settle()
+        assert order == ["first", "second"] and limiter.active == 1
+        limiter.release()
+        assert limiter.active == 0
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+
+
+def test_new_requests_do_not_overtake_the_queue():
+    async def scenario():
+        limiter = Limiter(1, queue=4)
+        await limiter.acquire(1)
+        queued = asyncio.create_task(limiter.acquire(1))
+        await _settle()
+        limiter.release()
+        # The freed slot is already the queued request's, so a newcomer has to wait
+        with pytest.raises(Shed) as shed:
+            await limiter.acquire(0.01)
+        assert shed.value.reason == "queue_timeout"
+        await queued
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_shed():
+    async def scenario():
+        limiter = Limiter(1, queue=1)
+        await limiter.acquire(1)
+        queued = asyncio.create_task(limiter.acquire(1))
+        await _settle()
+        with pytest.raises(Shed) as shed:
+            await limiter.acquire(1)
+        assert shed.value.reason == "queue_full"
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = Limiter(1, queue=4)
+        await limiter.acquire(1)
+        queued = asyncio.create_task(limiter.acquire(1))
+        await _settle()
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        assert not limiter.waiters
+
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiter_cancelled_after_hand_off_passes_the_slot_on():
+    async def scenario():
+        limiter = Limiter(1, queue=4)
+        await limiter.acquire(1)
+        first = asyncio.create_task(limiter.acquire(1))
+        second = asyncio.create_task(limiter.acquire(1))
+        await _settle()
+
+        # The slot is handed to the first waiter, which is cancelled before it resumes
+        limiter.release()
+        first.cancel()
+        outcome, = await asyncio.gather(first, return_exceptions=True)
+        if not isinstance(outcome, asyncio.CancelledError):
+            # Before Python 3.12 wait_for lets a finished hand-off win over the cancellation
+            limiter.release()
+        await second
+        assert limiter.active == 1 and not limiter.waiters
+
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def _controller(deadline, routes=()):
+    interactive = PriorityClass("interactive", 2, 2, wait=1, deadline=deadline)
+    return AdmissionController(routes=list(routes), priorities={"interactive": interactive})
+
+
+async def _call(middleware, method="GET", disconnect_after=None):
+    sent = []
+    received = asyncio.Event()
+
+    async def receive():
+        if not received.is_set():
+            received.set()
+            return {"type": "http.request", "body": b"", "more_body": False}
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": "/slow", "headers": []}
+    await middleware(scope, receive, send)
+    return sent
+
+
+def test_deadline_does_not_cut_a_started_response():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await asyncio.sleep(0.1)
+        await send({"type": "http.response.body", "body": b"complete"})
+
+    async def scenario():
+        sent = await _call(AdmissionMiddleware(app, _controller(deadline=0.02)))
+        assert [m.get("status") for m in sent if m["type"] == "http.response.start"] == [200]
+        assert sent[-1] == {"type": "http.response.body", "body": b"complete"}
+
+    asyncio.run(scenario())
+
+
+def test_deadline_before_the_response_starts_is_answered_503():
+    async def app(scope, receive, send):
+        await asyncio.sleep(1)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"late"})
+
+    async def scenario():
+        sent = await _call(AdmissionMiddleware(app, _controller(deadline=0.02)))
+        assert [m.get("status") for m in sent if m["type"] == "http.response.start"] == [503]
+
+    asyncio.run(scenario())
+
+
+def test_write_is_cancelled_on_disconnect_only_when_its_route_allows_it():
+    async def scenario(cancel_on_disconnect):
+        finished = []
+
+        async def app(scope, receive, send):
+            await asyncio.sleep(0.1)
+            finished.append(True)
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        routes = [Route("POST", "unmatched", "interactive", cancel_on_disconnect=cancel_on_disconnect)]
+        await _call(AdmissionMiddleware(app, _controller(0.02, routes)), method="POST", disconnect_after=0.01)
+        return bool(finished)
+
+    # No deadline applies to writes, so only the disconnect stops one
+    assert asyncio.run(scenario(cancel_on_disconnect=False)) is True
+    assert asyncio.run(scenario(cancel_on_disconnect=True)) is False
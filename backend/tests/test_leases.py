@@ -0,0 +1,51 @@
+"""SingleFlight take-over of runs that ended without a result"""
+import asyncio
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from services import leases
+
+
+@pytest.fixture
+def lease_collection(monkeypatch):
+    monkeypatch.setattr(leases, "LEASE_POLL_SECONDS", 0.01)
+    return leases.lease_collection
+
+
+def test_cancelled_once_run_is_taken_over(lease_collection):
+    async def scenario():
+        await lease_collection.delete_many({})
+        started = asyncio.Event()
+
+        async def stopped_worker():
+            started.set()
+            await asyncio.sleep(60)
+
+        async def other_worker():
+            return {"worker": "other"}
+
+        # A worker stopped in the middle of a once-per-launch run
+        first = leases.SingleFlight("startup:launch:model", once=True, cancellable=True)
+        caller = asyncio.create_task(first.run(stopped_worker))
+        await started.wait()
+        caller.cancel()
+        await asyncio.gather(caller, return_exceptions=True)
+        for _ in range(100):
+            lease = await lease_collection.find_one({"_id": "startup:launch:model"})
+            if lease["state"] == "cancelled":
+                break
+            await asyncio.sleep(0.01)
+        assert lease["state"] == "cancelled"
+
+        # Another worker of the launch runs it instead of waiting for the cancelled run forever
+        second = leases.SingleFlight("startup:launch:model", once=True)
+        assert await asyncio.wait_for(second.run(other_worker), 5) == {"worker": "other"}
+        lease = await lease_collection.find_one({"_id": "startup:launch:model"})
+        assert lease["state"] == "done"
+
+        # Once it has finished, later callers get the stored result without running it again
+        third = leases.SingleFlight("startup:launch:model", once=True)
+        assert await asyncio.wait_for(third.run(stopped_worker), 5) == {"worker": "other"}
+
+    asyncio.run(scenario())
@@ -0,0 +1,19 @@
+"""Hold every endpoint to its query budget in benchmarks/query_budget.py.
+
+Runs against an in-memory mongomock-motor database, so no mongod is needed.
+Latency budgets depend on the machine and are left to the CLI run. Raise a
+budget only together with the change that needs the extra queries, and say
+why in its commit message.
+"""
+import asyncio
+import pytest
+
+pytest.importorskip("mongomock_motor")
+
+from benchmarks import query_budget
+
+
+def test_endpoints_within_query_budgets():
+    args = query_budget.parse_args(["--scales", "20,80", "--courses", "3", "--repeat", "1", "--skip-latency"])
+    results = asyncio.run(query_budget.measure(args))
+    assert query_budget.check(results, args) == []
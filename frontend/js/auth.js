@@ -1,6 +1,7 @@
 // Helper function to get API base URL
 function getApiBase() {
-    return 'http://localhost:8000';  // Backend on port 8000
+    // API_BASE comes from config.js, which is loaded first
+    return typeof API_BASE !== 'undefined' ? API_BASE : 'http://localhost:8000';  // Backend on port 8000
 }
 
 // Get auth state from localStorage
@@ -133,6 +134,16 @@ async function handleLogin(event) {
 
 // Handle logout
 function logout() {
+    // Revoke the token server-side; the redirect below does not wait for it
+    const token = getAuthToken();
+    if (token) {
+        fetch(`${getApiBase()}/auth/logout`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}` },
+            keepalive: true
+        }).catch(() => {});
+    }
+    
     localStorage.removeItem('authToken');
     localStorage.removeItem('userRole');
     localStorage.removeItem('username');
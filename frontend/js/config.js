@@ -1,6 +1,8 @@
 // Configuration for API endpoints
+// Pages served by the backend itself (at /frontend/) carry an empty api-base: same origin, no CORS
+const apiBaseMeta = document.querySelector('meta[name="api-base"]');
 const CONFIG = {
-    API_BASE: 'http://localhost:8000'  // Backend server on port 8000
+    API_BASE: apiBaseMeta ? apiBaseMeta.content : 'http://localhost:8000'  // Backend server on port 8000
 };
 
 // Make API_BASE globally available
@@ -130,7 +130,7 @@ function updateWarningVisibility() {
 // ---------- Lifecycle ----------
 document.addEventListener("DOMContentLoaded", function () {
   console.log("Dashboard loaded");
-  loadAllData();
+  loadAllData().then(subscribeToUpdates);
 });
 
 // ---------- Data loading ----------
@@ -138,36 +138,132 @@ async function loadAllData() {
   showLoading();
 
   try {
-    const [stats, modelMetrics, studentsData] = await Promise.all([
-      apiCall("/dashboard/statistics").catch((err) => {
-        console.error("Failed to load statistics:", err);
-        return null;
-      }),
-      apiCall("/dashboard/model-metrics").catch((err) => {
-        console.error("Failed to load metrics:", err);
-        return null;
-      }),
-      apiCall("/dashboard/students").catch((err) => {
-        console.error("Failed to load students:", err);
-        return [];
-      }),
-    ]);
-
-    statistics = stats;
-    metrics = modelMetrics;
-    allStudents = Array.isArray(studentsData) ? studentsData : [];
+    // One request for the first paint: statistics, metrics and the first page of students
+    const overview = await apiCall(
+      `/dashboard/overview?students_limit=${rowsPerPage}`
+    ).catch((err) => {
+      console.error("Failed to load dashboard overview:", err);
+      return null;
+    });
+    const errors = (overview && overview.errors) || {};
+    Object.entries(errors).forEach(([section, error]) =>
+      console.error(`Failed to load ${section}:`, error)
+    );
+
+    statistics = overview ? overview.statistics : null;
+    metrics = overview ? overview.model_metrics : null;
+    const page = overview && overview.students;
+    allStudents = page ? page.items : [];
     filteredStudents = [...allStudents];
 
     updateWarningVisibility();
     displayStatistics();
     displayMetrics();
     displayStudents();
+
+    // Filtering and pagination run over the full list, fetched after the first paint
+    if (page && page.total > page.items.length) {
+      await loadAllStudents();
+    }
   } catch (error) {
     console.error("Error loading dashboard data:", error);
     showToast("Failed to load dashboard data", "error");
   }
 }
 
+async function loadAllStudents() {
+  try {
+    const studentsData = await apiCall("/dashboard/students");
+    allStudents = Array.isArray(studentsData) ? studentsData : [];
+    // Keeps the page and filters the user may have picked meanwhile
+    displayStudents();
+  } catch (err) {
+    console.error("Failed to load students:", err);
+  }
+}
+
+// ---------- Live updates ----------
+let eventSource = null;
+let subscribing = false;
+let lastEventId = null;
+let reconnectTimer = null;
+let renderTimer = null;
+let reloadStudentsTimer = null;
+
+async function subscribeToUpdates() {
+  if (!getAuthToken() || typeof EventSource === "undefined" || eventSource || subscribing) return;
+
+  // EventSource cannot send an Authorization header, and a token in the URL would be
+  // logged, so the stream is opened with a single-use ticket instead
+  subscribing = true;
+  let ticket;
+  try {
+    ({ ticket } = await apiCall("/dashboard/events/ticket", "POST"));
+  } catch (err) {
+    console.error("Live updates unavailable:", err);
+    return;
+  } finally {
+    subscribing = false;
+  }
+
+  const params = new URLSearchParams({ ticket });
+  if (lastEventId !== null) params.set("last_event_id", lastEventId);
+  eventSource = new EventSource(`${getApiBase()}/dashboard/events?${params}`);
+  eventSource.addEventListener("predictions", (event) => {
+    lastEventId = event.lastEventId;
+    applyPredictionUpdate(JSON.parse(event.data));
+  });
+  eventSource.addEventListener("resync", (event) => {
+    lastEventId = event.lastEventId;
+    loadAllData();
+  });
+  // The ticket is used up, so a dropped stream is reopened with a new one
+  eventSource.onerror = () => {
+    eventSource.close();
+    eventSource = null;
+    clearTimeout(reconnectTimer);
+    reconnectTimer = setTimeout(subscribeToUpdates, 3000);
+  };
+}
+
+function applyPredictionUpdate({ predictions, statistics_delta: delta }) {
+  const byId = new Map(allStudents.map((student) => [student.student_id, student]));
+  let unknownStudent = false;
+  predictions.forEach((prediction) => {
+    const student = byId.get(prediction.student_id);
+    if (student) {
+      student.predicted_score = prediction.predicted_score;
+      student.risk_status = prediction.risk_status;
+    } else {
+      unknownStudent = true;
+    }
+  });
+
+  if (statistics && delta) {
+    ["total_students", "low_risk", "medium_risk", "high_risk"].forEach((field) => {
+      statistics[field] = (statistics[field] || 0) + delta[field];
+    });
+    const total = statistics.total_students;
+    ["low_risk", "medium_risk", "high_risk"].forEach((field) => {
+      statistics[`${field}_percentage`] = total > 0 ? (statistics[field] / total) * 100 : 0;
+    });
+  }
+
+  // A generate-all arrives as several events; render once they stop coming
+  clearTimeout(renderTimer);
+  renderTimer = setTimeout(() => {
+    updateWarningVisibility();
+    displayStatistics();
+    displayStudents();
+  }, 250);
+
+  // Students added since the page loaded need their full details
+  if (unknownStudent) {
+    clearTimeout(reloadStudentsTimer);
+    reloadStudentsTimer = setTimeout(loadAllStudents, 1000);
+  }
+}
+
 function showLoading() {
   const tbody = document.getElementById("studentsBody");
   if (tbody) {